@@ -0,0 +1,115 @@
+import numpy as np
+
+from SpatialHash import _expand
+
+# Items per leaf, below this splitting further costs more in traversal than it saves in exact tests
+LEAF_SIZE = 4
+# Refitted boxes may grow to this multiple of the area they had when the tree was built before it is rebuilt
+REBUILD_GROWTH = 2.0
+
+
+def _area(lower: np.ndarray, upper: np.ndarray) -> float:
+    return float(np.prod(upper - lower, axis=-1).sum())
+
+
+def overlapping(lower: np.ndarray, upper: np.ndarray, other_lower: np.ndarray, other_upper: np.ndarray) -> np.ndarray:
+    return np.all((lower <= other_upper) & (other_lower <= upper), axis=-1)
+
+
+class AABBTree:
+    """Bounding volume hierarchy over axis-aligned boxes, stored in flat arrays and queried for many boxes at once
+
+    Built top down by splitting each node at the median of its longer axis. Items that move only refit
+    the boxes of the nodes above them, the tree is rebuilt once the refitted boxes have grown too much.
+    """
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray):
+        self.build(lower, upper)
+
+    def build(self, lower: np.ndarray, upper: np.ndarray):
+        self.lower = np.asarray(lower, dtype=np.float64).reshape(-1, 2)
+        self.upper = np.asarray(upper, dtype=np.float64).reshape(-1, 2)
+        count = len(self.lower)
+        # Items sorted so every leaf covers one contiguous range of them
+        self.items = np.arange(count)
+        node_lower, node_upper, children, starts, counts, depths = [], [], [], [], [], []
+        stack = [(0, count, 0, -1, 0)] if count > 0 else []
+        while stack:
+            start, end, depth, parent, side = stack.pop()
+            node = len(starts)
+            if parent >= 0:
+                children[parent][side] = node
+            members = self.items[start:end]
+            low = self.lower[members].min(axis=0)
+            high = self.upper[members].max(axis=0)
+            node_lower.append(low)
+            node_upper.append(high)
+            children.append([-1, -1])
+            starts.append(start)
+            counts.append(end - start)
+            depths.append(depth)
+            if end - start <= LEAF_SIZE:
+                continue
+            centers = self.lower[members] + self.upper[members]
+            axis = int(np.argmax(high - low))
+            self.items[start:end] = members[np.argsort(centers[:, axis], kind="stable")]
+            middle = (start + end) // 2
+            stack.append((middle, end, depth + 1, node, 1))
+            stack.append((start, middle, depth + 1, node, 0))
+
+        self.node_lower = np.array(node_lower, dtype=np.float64).reshape(-1, 2)
+        self.node_upper = np.array(node_upper, dtype=np.float64).reshape(-1, 2)
+        self.children = np.array(children, dtype=np.intp).reshape(-1, 2)
+        self.starts = np.array(starts, dtype=np.intp)
+        self.counts = np.array(counts, dtype=np.intp)
+        # Leaves in item order, so their ranges can be reduced in one reduceat call
+        self.leaves = np.flatnonzero(self.children[:, 0] < 0)
+        self.leaves = self.leaves[np.argsort(self.starts[self.leaves])]
+        # Internal nodes from the deepest level up, each level only depends on the one below it
+        depths = np.array(depths, dtype=np.intp)
+        internal = np.flatnonzero(self.children[:, 0] >= 0)
+        self._levels = [internal[depths[internal] == depth] for depth in np.unique(depths[internal])[::-1]]
+        self._built_area = _area(self.node_lower, self.node_upper)
+
+    def refit(self, lower: np.ndarray, upper: np.ndarray):
+        # Same items in new boxes, the node boxes are recomputed bottom up without changing the tree
+        self.lower = np.asarray(lower, dtype=np.float64).reshape(-1, 2)
+        self.upper = np.asarray(upper, dtype=np.float64).reshape(-1, 2)
+        if len(self.leaves) == 0:
+            return
+        starts = self.starts[self.leaves]
+        self.node_lower[self.leaves] = np.minimum.reduceat(self.lower[self.items], starts)
+        self.node_upper[self.leaves] = np.maximum.reduceat(self.upper[self.items], starts)
+        for level in self._levels:
+            left, right = self.children[level, 0], self.children[level, 1]
+            self.node_lower[level] = np.minimum(self.node_lower[left], self.node_lower[right])
+            self.node_upper[level] = np.maximum(self.node_upper[left], self.node_upper[right])
+        if _area(self.node_lower, self.node_upper) > REBUILD_GROWTH * self._built_area:
+            self.build(self.lower, self.upper)
+
+    def query(self, lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Every (query, item) pair whose boxes overlap, the whole batch walks the tree one level at a time"""
+        found_queries, found_items = [], []
+        queries = np.arange(len(lower))
+        nodes = np.zeros(len(lower), dtype=np.intp)
+        if len(self.starts) == 0:
+            queries = queries[:0]
+        while len(queries) > 0:
+            hit = overlapping(lower[queries], upper[queries], self.node_lower[nodes], self.node_upper[nodes])
+            queries, nodes = queries[hit], nodes[hit]
+            leaf = self.children[nodes, 0] < 0
+
+            leaf_queries, leaf_nodes = queries[leaf], nodes[leaf]
+            rows, columns = _expand(self.starts[leaf_nodes], self.counts[leaf_nodes])
+            items = self.items[columns]
+            pair_queries = leaf_queries[rows]
+            exact = overlapping(lower[pair_queries], upper[pair_queries], self.lower[items], self.upper[items])
+            found_queries.append(pair_queries[exact])
+            found_items.append(items[exact])
+
+            inner_queries, inner_nodes = queries[~leaf], nodes[~leaf]
+            queries = np.concatenate([inner_queries, inner_queries])
+            nodes = np.concatenate([self.children[inner_nodes, 0], self.children[inner_nodes, 1]])
+        if not found_queries:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(found_queries), np.concatenate(found_items)
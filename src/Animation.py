@@ -1,64 +1,328 @@
+import math
 import os
+import queue
+import random
 import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
 
+import numpy as np
 import pygame
 
-from bootstrap import BG_COLOR, BOUNDARY_COLOR, HEIGHT, WIDTH
+import snapshot
+from bootstrap import BG_COLOR, BOUNDARY_COLOR, HEIGHT, TICK_RATE, WIDTH
 from BouncingObject import BouncingCircle, BouncingObject
 from Boundary import BoundaryProtocol
 from CircleBoundary import CircleBoundary
 from CircleBoundaryWithDoor import CircleBoundaryWithDoor
+from ContactSolver import ContactSolver
 
 # from ExitZone import ExitZone
 from helpers import Position, Velocity
+from Pipeline import FrameBuffer, FrameState, FrameView
+from Profiler import FrameProfiler, phase, timed_each
+from Recorder import FrameRecorder
+from Renderer import Renderer
+from SharedState import SharedStateWriter
+from SpatialHash import SpatialHash
+from sweep import swept_bounds
+from Trails import TrailBuffer
+from World import World
+
+
+@dataclass
+class RunResult:
+    frames: int
+    steps: int
+    escaped: bool
+    elapsed: float
 
 
 class AnimationManger:
-    def __init__(self, width: int = 800, height: int = 600, fps: int = 60):
+    def __init__(
+        self,
+        width: int = 800,
+        height: int = 600,
+        fps: int = 60,
+        use_world: bool = False,
+        headless: bool = False,
+        render: bool = True,
+        recorder: FrameRecorder | None = None,
+        substeps: int = 1,
+        physics_rate: float | None = None,
+        interpolate: bool = False,
+        seed: int | None = None,
+        keyframe_interval: int | None = None,
+        renderer: Renderer | None = None,
+        trails: TrailBuffer | None = None,
+        collisions: bool = True,
+        profiler: FrameProfiler | None = None,
+        continuous: bool = False,
+        sleep: bool = False,
+        solver: ContactSolver | None = None,
+        pipelined: bool = False,
+        shared_state: SharedStateWriter | None = None,
+    ):
         self.running = True
         self.width = width
         self.height = height
-        self.screen = pygame.display.set_mode((width, height))
-        pygame.init()
-        pygame.display.set_caption("title")
+        # Headless runs never open a window, they draw offscreen or not at all and are not frame limited
+        self.headless = headless
+        if headless:
+            self.screen = pygame.Surface((width, height)) if render else None
+        else:
+            self.screen = pygame.display.set_mode((width, height))
+            pygame.init()
+            pygame.display.set_caption("title")
 
         self.clock = pygame.time.Clock()
         self.frame_count = 0
         self.bg_color = BG_COLOR
 
         self.fps = fps
+        # Physics runs at a fixed rate independent of how fast frames are rendered
+        self.physics_rate = physics_rate or fps * substeps
+        self.dt = TICK_RATE / self.physics_rate
+        self.interpolate = interpolate
+        self.step_count = 0
+        self._accumulator = 0.0
+        self._previous_positions: list[Position] = []
         self.objects: list[BouncingObject] = []
         self.boundaries: list[BoundaryProtocol] = []
+        # All randomness comes from here, so a seeded scene always plays out the same way
+        self.rng = random.Random(seed)
+        # With a world all objects are stepped together as arrays instead of one by one
+        self.world = (
+            World(seed=seed, collisions=collisions, continuous=continuous, sleep=sleep, solver=solver)
+            if use_world
+            else None
+        )
+        self.collisions = collisions
+        # Swept collision tests keep fast objects from tunneling through walls and each other at large steps
+        self.continuous = continuous
+        # Resting objects are skipped until something hits them or a moving boundary reaches them
+        self.sleep = sleep
+        # Solves all contacts between objects together instead of pair by pair, with positional correction
+        self.solver = solver
+        self.broad_phase = SpatialHash()
+        self.recorder = recorder
+        self.renderer = renderer or Renderer()
+        # Positions are recorded every physics step, the renderer draws them behind the objects
+        self.trails = trails
+        # Snapshots taken every keyframe_interval frames, so seek() can also jump backwards
+        self.keyframe_interval = keyframe_interval
+        self.keyframes: dict[int, bytes] = {}
+        self.profiler = profiler
+        # Physics runs on its own thread one frame ahead of the drawing, which draws a copy of the state
+        self.pipelined = pipelined
+        # Every drawn frame is also published into shared memory for readers in other processes
+        self.shared_state = shared_state
 
     def add_object(self, object: BouncingObject):
+        object.object_id = uuid.UUID(int=self.rng.getrandbits(128), version=4)
+        object.rng = self.rng
+        object.continuous = self.continuous
+        object.sleep = self.sleep
+        if self.world is not None:
+            self.world.add_object(object)
         self.objects.append(object)
 
     def add_boundary(self, boundary: BoundaryProtocol):
         self.boundaries.append(boundary)
 
     def update(self):
-
-        for obj in self.objects:
-            obj.update(self.boundaries, self.objects)
-        for bound in self.boundaries:
-            bound.update()
+        # One fixed physics step of self.dt ticks
+        if self.world is not None:
+            with phase(self.profiler, "world step"):
+                self.world.step(self.boundaries, self.dt)
+        else:
+            if self.interpolate:
+                self._previous_positions = [obj.position.copy() for obj in self.objects]
+            self._collide_objects()
+            for obj in timed_each(self.profiler, self.objects, "update"):
+                obj.update(self.boundaries, [], self.dt)
+        if self.trails is not None:
+            self.trails.record(self.object_positions())
+        self.step_count += 1
+        for bound in timed_each(self.profiler, self.boundaries, "update"):
+            bound.update(self.dt)
             if bound.out_of_boundaries:
                 return False
         return True
 
-    def draw(self):
-        self.screen.fill(self.bg_color)
+    def _max_steps(self) -> int | None:
+        # Windowed runs drop a backlog of more than a few frames of steps, headless runs have no wall clock
+        # to fall behind and always run every step
+        if self.headless:
+            return None
+        return max(16, 4 * math.ceil(self.physics_rate / self.fps))
+
+    def advance(self, elapsed: float, max_steps: int | None = None) -> bool:
+        # Run as many fixed steps as fit into the elapsed seconds, the remainder carries over, at most
+        # max_steps of them when given
+        step_time = 1 / self.physics_rate
+        self._accumulator += elapsed
+        steps = 0
+        while self._accumulator >= step_time * (1 - 1e-9):
+            self._accumulator -= step_time
+            steps += 1
+            if not self.update():
+                return False
+            if max_steps is not None and steps >= max_steps:
+                # Falling too far behind, drop the backlog instead of spiralling
+                self._accumulator = 0.0
+                break
+        return True
+
+    def snapshot(self) -> bytes:
+        return snapshot.dump(self)
+
+    def restore(self, data: bytes):
+        snapshot.load(self, data)
+
+    def _store_keyframe(self):
+        if self.keyframe_interval and self.frame_count % self.keyframe_interval == 0:
+            self.keyframes.setdefault(self.frame_count, self.snapshot())
+
+    def seek(self, frame: int) -> bool:
+        # Fast-forward without drawing, stepping exactly like a headless run
+        if frame < self.frame_count:
+            earlier = [keyframe for keyframe in self.keyframes if keyframe <= frame]
+            if not earlier:
+                raise ValueError(f"Cannot seek back to frame {frame}, no keyframe before it")
+            self.restore(self.keyframes[max(earlier)])
+        while self.frame_count < frame:
+            self._store_keyframe()
+            if not self.advance(1 / self.fps):
+                self.frame_count += 1
+                return False
+            self.frame_count += 1
+        return True
+
+    def object_positions(self) -> np.ndarray:
+        if self.world is not None:
+            return self.world.positions
+        return np.array([(obj.position.x, obj.position.y) for obj in self.objects], dtype=np.float64).reshape(-1, 2)
 
-        for boundary in self.boundaries:
-            boundary.draw(self.screen)
+    def object_velocities(self) -> np.ndarray:
+        if self.world is not None:
+            return self.world.velocities
+        return np.array([obj.velocity.to_tuple() for obj in self.objects], dtype=np.float64).reshape(-1, 2)
 
-        for obj in self.objects:
-            obj.draw(self.screen)
+    def render_positions(self) -> list[Position | None]:
+        if not self.interpolate:
+            return [None] * len(self.objects)
+        alpha = min(self._accumulator * self.physics_rate, 1.0)
+        if self.world is not None:
+            previous = self.world.previous_positions
+            positions = previous + (self.world.positions - previous) * alpha
+            return [Position(x, y) for x, y in positions]
+        if len(self._previous_positions) != len(self.objects):
+            return [None] * len(self.objects)
+        return [
+            previous + (obj.position - previous) * alpha
+            for previous, obj in zip(self._previous_positions, self.objects)
+        ]
 
-        pygame.display.flip()
+    def render_array(self) -> np.ndarray:
+        # Same as render_positions, as one array for renderers that draw all objects at once
+        positions = self.object_positions()
+        if not self.interpolate:
+            return positions
+        alpha = min(self._accumulator * self.physics_rate, 1.0)
+        if self.world is not None:
+            previous = self.world.previous_positions
+        elif len(self._previous_positions) == len(self.objects):
+            previous = np.array([(position.x, position.y) for position in self._previous_positions]).reshape(-1, 2)
+        else:
+            return positions
+        return previous + (positions - previous) * alpha
+
+    def frame_state(self, running: bool = True) -> FrameState:
+        # Copies of everything drawn, taken on the simulation thread after each frame of a pipelined run
+        world = self.world
+        return FrameState(
+            frame=self.frame_count,
+            step=self.step_count,
+            positions=np.array(self.render_array()),
+            velocities=np.array(self.object_velocities()),
+            radii=(
+                world.radii.copy()
+                if world is not None
+                else np.array([obj.radius for obj in self.objects], dtype=np.float64)
+            ),
+            rotations=(
+                world.rotations.copy()
+                if world is not None
+                else np.array([obj.rotation for obj in self.objects], dtype=np.float64)
+            ),
+            boundary_states=tuple(boundary.get_state() for boundary in self.boundaries),
+            trail=self.trails.ordered() if self.trails is not None else None,
+            running=running,
+        )
+
+    def _collide_objects(self):
+        # Broad phase on the object positions, each candidate pair is handed to collide() once
+        if len(self.objects) < 2 or not self.collisions:
+            return
+        positions = self.object_positions()
+        radii = np.array([obj.radius for obj in self.objects], dtype=np.float64)
+        velocities = np.array([obj.velocity.to_tuple() for obj in self.objects], dtype=np.float64)
+        dt = self.dt if self.continuous else 0.0
+        # The solver also keeps apart pairs that are close but not touching yet
+        reach = radii + self.solver.margin / 2 if self.solver is not None else radii
+        if self.continuous:
+            # Around the whole path of each object, so pairs meeting mid-step are candidates too
+            pairs = self.broad_phase.pairs(*swept_bounds(positions, velocities, reach, dt))
+        else:
+            pairs = self.broad_phase.pairs(positions, reach)
+        if self.solver is not None:
+            self._solve_objects(positions, velocities, radii, *pairs)
+            return
+        for i, j in zip(*pairs):
+            self.objects[i].collide(self.objects[j], dt)
+
+    def _solve_objects(self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, i, j):
+        # The solver works on arrays, the results are copied back into the objects
+        sleeping = np.array([obj.sleeping for obj in self.objects], dtype=bool) if self.sleep else None
+        woken = self.solver.resolve(
+            positions, velocities, radii, i, j, self.dt, self.continuous, sleeping, self.boundaries
+        )
+        for obj, position, velocity in zip(self.objects, positions.tolist(), velocities.tolist()):
+            obj.position = Position(*position)
+            obj.velocity = Velocity(*velocity)
+        for index in woken.tolist():
+            self.objects[index].rest_time = 0.0
+
+    def _publish(self, state: FrameState):
+        with phase(self.profiler, "publish"):
+            self.shared_state.publish(
+                state.frame, state.step, state.positions, state.velocities, state.boundary_states, self.screen
+            )
+
+    def draw(self, view: FrameView | None = None):
+        if self.screen is None:
+            return
+        with phase(self.profiler, "draw"):
+            rects = self.renderer.draw(view or self)
+            if self.profiler is not None and self.profiler.hud:
+                hud = self.profiler.draw_hud(self.screen)
+                if rects is not None:
+                    rects.append(hud)
+
+        if not self.headless:
+            with phase(self.profiler, "flip"):
+                if rects is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(rects)
 
     def handle_events(self) -> bool:
+        if self.headless:
+            return True
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return False
@@ -75,26 +339,124 @@ class AnimationManger:
     def _validate(self):
         self._validate_objects()
 
-    def run(self):
-        print("Starting...")
+    def run(self, max_frames: int | None = None) -> RunResult:
+        if not self.headless:
+            print("Starting...")
         self.running = True
         self._validate()
-        while self.running:
-            self.running = self.handle_events()
-            self.running = self.update()
-            self.draw()
-            self.clock.tick(self.fps)
-            # print("Running")
+        start = time.perf_counter()
+        try:
+            if self.pipelined:
+                self._run_pipelined(max_frames)
+            else:
+                self._run_sequential(max_frames)
+        finally:
+            # Also when the run fails, so the recording is finished and the shared memory block removed
+            try:
+                if self.recorder is not None:
+                    self.recorder.stop()
+            finally:
+                if self.shared_state is not None:
+                    self.shared_state.close()
+        result = RunResult(
+            frames=self.frame_count,
+            steps=self.step_count,
+            escaped=any(bound.out_of_boundaries for bound in self.boundaries),
+            elapsed=time.perf_counter() - start,
+        )
+        if self.headless:
+            return result
         print("Ended")
         pygame.quit()
         sys.exit()
 
+    def _run_sequential(self, max_frames: int | None):
+        # Headless runs advance exactly one frame of simulated time per frame, so they are reproducible
+        frame_time = 1 / self.fps
+        while self.running:
+            self._store_keyframe()
+            with phase(self.profiler, "events"):
+                self.running = self.handle_events()
+            with phase(self.profiler, "physics"):
+                self.running = self.running and self.advance(frame_time, self._max_steps())
+            self.draw()
+            if self.recorder is not None and self.screen is not None:
+                with phase(self.profiler, "record"):
+                    self.recorder.capture(self.screen)
+            self.frame_count += 1
+            if self.shared_state is not None:
+                self._publish(self.frame_state())
+            if max_frames is not None and self.frame_count >= max_frames:
+                self.running = False
+            if not self.headless:
+                # Waiting for the frame rate, with vsync the time spent waiting for the display shows up in flip
+                with phase(self.profiler, "tick"):
+                    frame_time = min(self.clock.tick(self.fps) / 1000, 0.25)
+            if self.profiler is not None:
+                self.profiler.end_frame()
+
+    def _simulate(self, requests: queue.Queue, frames: FrameBuffer):
+        # Simulation thread of a pipelined run, one frame for every frame time the render thread asks for
+        try:
+            while (frame_time := requests.get()) is not None:
+                self._store_keyframe()
+                with phase(self.profiler, "physics"):
+                    running = self.advance(frame_time, self._max_steps())
+                self.frame_count += 1
+                frames.publish(self.frame_state(running))
+                if not running:
+                    break
+        except BaseException as error:
+            frames.close(error)
+            return
+        frames.close()
+
+    def _run_pipelined(self, max_frames: int | None):
+        # Same frames as _run_sequential, but the next frame is simulated while this one is drawn. Windowed,
+        # that frame advances by the time the frame before took, one frame later than sequential runs do
+        view = FrameView(self)
+        requests: queue.Queue = queue.Queue()
+        frames = FrameBuffer()
+        thread = threading.Thread(target=self._simulate, args=(requests, frames), name="Simulation", daemon=True)
+        thread.start()
+        frame_time = 1 / self.fps
+        requests.put(frame_time)
+        try:
+            while self.running:
+                with phase(self.profiler, "events"):
+                    self.running = self.handle_events()
+                with phase(self.profiler, "wait"):
+                    state = frames.take()
+                if state is None:
+                    break
+                self.running = self.running and state.running
+                if max_frames is not None and state.frame >= max_frames:
+                    self.running = False
+                if self.running:
+                    requests.put(frame_time)
+                view.load(state)
+                self.draw(view)
+                if self.recorder is not None and self.screen is not None:
+                    with phase(self.profiler, "record"):
+                        self.recorder.capture(self.screen)
+                if self.shared_state is not None:
+                    self._publish(state)
+                if not self.headless:
+                    with phase(self.profiler, "tick"):
+                        frame_time = min(self.clock.tick(self.fps) / 1000, 0.25)
+                if self.profiler is not None:
+                    self.profiler.end_frame()
+        finally:
+            requests.put(None)
+            thread.join()
+        self.running = False
+
 
 if __name__ == "__main__":
     anim = AnimationManger(height=HEIGHT, width=WIDTH)
     starting_position = Position(x=WIDTH / 2 + 30, y=HEIGHT / 2)
     radius = 20
-    ROOT = Path.cwd()
+    ROOT = Path(__file__).parent
 
     # boundary = CircleBoundary(
     #     center=Position(x=WIDTH / 2, y=HEIGHT / 2),
@@ -5,9 +5,78 @@ from typing import Protocol
 
 import pygame.draw
 
-from bootstrap import BOUNCE_DAMPENING, GRAVITY, OBJECT_COLOR
+from bootstrap import BOUNCE_DAMPENING, GRAVITY, OBJECT_COLOR, SLEEP_SPEED, SLEEP_TICKS
 from Boundary import BoundaryProtocol
-from helpers import Position, Velocity
+from helpers import Position, Vector, Velocity
+from SpriteCache import sprites
+from sweep import MAX_IMPACTS, first_contact
+
+
+class _WorldAttribute:
+    # Plain attribute until the object is attached to a world, a view on one of its arrays afterwards
+    def __init__(self, array: str):
+        self.array = array
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if obj.world is not None:
+            return getattr(obj.world, self.array)[obj.index]
+        return getattr(obj, self.name)
+
+    def __set__(self, obj, value):
+        if obj.world is not None:
+            getattr(obj.world, self.array)[obj.index] = value
+        else:
+            setattr(obj, self.name, value)
+
+
+def _world_component(axis: int) -> property:
+    def get(self) -> float:
+        return float(getattr(self._world, self._array)[self._index, axis])
+
+    def set(self, value: float):
+        getattr(self._world, self._array)[self._index, axis] = value
+
+    return property(get, set)
+
+
+class _WorldVector:
+    # Vector whose components are read from and written to the object's row of a world array, so changing
+    # one in place changes the world. Arithmetic and copies give plain vectors
+    __slots__ = ()
+    _plain: type[Vector]
+    x = _world_component(0)
+    y = _world_component(1)
+
+    def __init__(self, world, array: str, index: int):
+        self._world = world
+        self._array = array
+        self._index = index
+
+    def copy(self):
+        return self._plain(self.x, self.y)
+
+    def __add__(self, other):
+        return self._plain(self.x + other.x, self.y + other.y)
+
+    def __mul__(self, factor: float):
+        return self._plain(self.x * factor, self.y * factor)
+
+    __rmul__ = __mul__
+
+
+class _WorldPosition(_WorldVector, Position):
+    __slots__ = ("_world", "_array", "_index")
+    _plain = Position
+
+
+class _WorldVelocity(_WorldVector, Velocity):
+    __slots__ = ("_world", "_array", "_index")
+    _plain = Velocity
 
 
 class BouncingObject(Protocol):
@@ -15,66 +84,107 @@ class BouncingObject(Protocol):
     position: Position
     velocity: Velocity
     initial_position: Position
+    radius: float
 
     @abstractmethod
-    def update(self, boundaries: list[BoundaryProtocol], objects: list["BouncingObject"]): ...
+    def update(self, boundaries: list[BoundaryProtocol], objects: list["BouncingObject"], dt: float = 1.0): ...
 
     @abstractmethod
-    def draw(self, screen): ...
+    def collide(self, object: "BouncingObject", dt: float = 0.0): ...
+
+    @abstractmethod
+    def draw(self, screen, position: Position | None = None, rotation: float | None = None): ...
+
+    @abstractmethod
+    def bounding_rect(self, position: Position | None = None) -> pygame.Rect: ...
 
 
 class BouncingCircle(BouncingObject):
-    def __init__(self, image_path, radius, position: Position, velocity: Velocity):
+    radius = _WorldAttribute("radii")
+    bounce_count = _WorldAttribute("bounce_counts")
+    rotation = _WorldAttribute("rotations")
+    rotation_speed = _WorldAttribute("rotation_speeds")
+    rest_time = _WorldAttribute("rest_times")
+
+    def __init__(self, image_path, radius, position: Position, velocity: Velocity, rotation_speed: float = 0.0):
+        self.world = None
+        self.index = -1
+        self.image_path = image_path
         self.radius = radius
-        self.position = position
-        self.velocity = velocity
+        self.bounce_count = 0
+        self.rotation = 0.0
+        self.rotation_speed = rotation_speed  # degrees per tick
+        self.position = Position.parse(position)
+        self.velocity = Velocity.parse(velocity)
         self.object_id = uuid.uuid4()
-        self.initial_position = position
-
-    def update(self, boundaries: list[BoundaryProtocol], objects: list["BouncingCircle"]):
-        self.velocity.y += GRAVITY
-        new_position = self.position + self.velocity
-        for boundary in boundaries:
-            if not boundary.collision_check(new_position):
-                # Collision detected - calculate bounce
-                normal_position = boundary.get_normal(self.position)
-
-                # Calculate reflection vector
-                dot_product = self.velocity.x * normal_position.x + self.velocity.y * normal_position.y
-
-                self.velocity.x = self.velocity.x - 2 * dot_product * normal_position.x
-                self.velocity.y = self.velocity.y - 2 * dot_product * normal_position.y
-                # Apply dampening
-                self.velocity.x *= BOUNCE_DAMPENING
-                self.velocity.y *= BOUNCE_DAMPENING
-
-                # Add some randomness to make it more interesting
-                self.velocity.x += random.uniform(-2, 2)
-                self.velocity.y += random.uniform(-1, 1)
-
-                # Change rotation on bounce
-                # self.rotation_speed = random.uniform(-8, 8)
-
-                # Count bounce and change glow color
-                # self.bounce_count += 1
-                # if self.bounce_count % 3 == 0:
-                #     self.current_glow = random.choice(self.glow_colors)
-
-                break
+        # Anything with uniform() works, the animation manager hands in its own seeded generator
+        self.rng = random
+        # Sweep over the whole step instead of only checking the end position, set by the animation manager
+        self.continuous = False
+        # Put to sleep after resting for a while, set by the animation manager
+        self.sleep = False
+        self.rest_time = 0.0
+        self.initial_position = self.position.copy()
+
+    def attach(self, world, index: int):
+        # Once attached the world arrays own the state and this object is only a view on them
+        self.world = world
+        self.index = index
+
+    @property
+    def position(self) -> Position:
+        if self.world is not None:
+            return _WorldPosition(self.world, "positions", self.index)
+        return self._position
+
+    @position.setter
+    def position(self, value: Position):
+        if self.world is not None:
+            self.world.positions[self.index] = value.x, value.y
+        else:
+            self._position = value
+
+    @property
+    def velocity(self) -> Velocity:
+        if self.world is not None:
+            return _WorldVelocity(self.world, "velocities", self.index)
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, value: Velocity):
+        if self.world is not None:
+            self.world.velocities[self.index] = value.x, value.y
+        else:
+            self._velocity = value
+
+    @property
+    def sleeping(self) -> bool:
+        return self.rest_time >= SLEEP_TICKS
+
+    def update(self, boundaries: list[BoundaryProtocol], objects: list["BouncingCircle"], dt: float = 1.0):
+        # dt is measured in ticks, see TICK_RATE
+        if self.sleeping:
+            if not any(boundary.disturbs(self.position, self.radius, dt) for boundary in boundaries):
+                return
+            self.rest_time = 0.0
+        self.velocity.y += GRAVITY * dt
+        # Boundaries go last, so no pair impulse can push the ball back through a wall it was just bounced off
         for object in objects:
             if self.object_id != object.object_id:
-                # distance between this object and object is smaller than sum of radiuses then bounce
-                if self.position.distance(object.position) < self.radius + object.radius:
-                    delta_pos = self.position - object.position
-                    delta_vel = self.velocity - object.velocity
-                    distance_squared = delta_pos.x**2 + delta_pos.y**2
-                    if distance_squared > 0:  # Avoid division by zero
-                        dot_product = (delta_vel.x * delta_pos.x + delta_vel.y * delta_pos.y) / distance_squared
-                        self.velocity.x -= dot_product * delta_pos.x
-                        self.velocity.y -= dot_product * delta_pos.y
-                        object.velocity.x += dot_product * delta_pos.x
-                        object.velocity.y += dot_product * delta_pos.y
-        self.position += self.velocity
+                self.collide(object, dt if self.continuous else 0.0)
+        if self.continuous:
+            self._sweep(boundaries, dt)
+        else:
+            new_position = self.position + self.velocity * dt
+            for boundary in boundaries:
+                if not boundary.collision_check(new_position, self.radius):
+                    # Collision detected - calculate bounce
+                    self._bounce(boundary.get_normal(self.position))
+                    break
+            self.position += self.velocity * dt
+        self.rotation = (self.rotation + self.rotation_speed * dt) % 360
+        if self.sleep:
+            self._settle(dt)
 
         # self.position.x += self.position.x_speed
         # self.position.y += self.position.y_speed
@@ -83,6 +193,99 @@ class BouncingCircle(BouncingObject):
         # if self.position.y < 0 or self.position.y > 600:
         #     self.position.y_speed = -self.position.y_speed
 
-    def draw(self, screen):
-        # Load the image and draw it at the current position
-        pygame.draw.circle(screen, OBJECT_COLOR, (self.position.x, self.position.y), self.radius)
+    def _bounce(self, normal_position: Vector, surface: Vector | None = None):
+        # Bounce relative to the boundary surface when it moves
+        if surface is not None:
+            self.velocity -= surface
+        # Calculate reflection vector
+        dot_product = self.velocity.dot(normal_position)
+
+        self.velocity.x = self.velocity.x - 2 * dot_product * normal_position.x
+        self.velocity.y = self.velocity.y - 2 * dot_product * normal_position.y
+        # Apply dampening
+        self.velocity.scale(BOUNCE_DAMPENING)
+
+        # Add some randomness to make it more interesting
+        self.velocity.x += self.rng.uniform(-2, 2)
+        self.velocity.y += self.rng.uniform(-1, 1)
+        if surface is not None:
+            self.velocity += surface
+
+        # Change rotation on bounce
+        # self.rotation_speed = random.uniform(-8, 8)
+
+        # Count bounce and change glow color
+        self.bounce_count += 1
+        # if self.bounce_count % 3 == 0:
+        #     self.current_glow = random.choice(self.glow_colors)
+
+    def _settle(self, dt: float):
+        # Stays where it is once it has been slow for SLEEP_TICKS, until a hit or a moving boundary wakes it
+        if self.velocity.dot(self.velocity) < SLEEP_SPEED * SLEEP_SPEED:
+            self.rest_time += dt
+        else:
+            self.rest_time = 0.0
+        if self.sleeping:
+            self.velocity = Velocity(0.0, 0.0)
+
+    def _sweep(self, boundaries: list[BoundaryProtocol], dt: float):
+        # Moves up to the first boundary contact, bounces and carries on with the rest of the step
+        remaining = dt
+        for _ in range(MAX_IMPACTS):
+            impacts = [
+                boundary.time_of_impact(self.position, self.velocity, self.radius, remaining) for boundary in boundaries
+            ]
+            impact = min(
+                (impact for impact in impacts if impact is not None), key=lambda impact: impact[0], default=None
+            )
+            if impact is None:
+                self.position += self.velocity * remaining
+                return
+            time, normal, surface = impact
+            self.position += self.velocity * (time * remaining)
+            remaining -= time * remaining
+            self._bounce(normal, surface)
+        # Still bouncing after MAX_IMPACTS, the rest of the step is dropped and the ball waits at the last contact
+
+    def collide(self, object: "BouncingCircle", dt: float = 0.0):
+        # With a dt the pair is swept over the next dt ticks and resolved with its offset at the first contact
+        if self.sleeping and object.sleeping:
+            return
+        delta_pos = self.position - object.position
+        delta_vel = self.velocity - object.velocity
+        time = first_contact(delta_pos, delta_vel, self.radius + object.radius, dt)
+        if time is not None:
+            delta_pos += delta_vel * (time * dt)
+            distance_squared = delta_pos.dot(delta_pos)
+            dot_product = delta_vel.dot(delta_pos)
+            # Only resolve while approaching, so the pair is not bounced back when seen from the other side
+            if distance_squared > 0 and dot_product < 0:  # Avoid division by zero
+                if dot_product * dot_product >= SLEEP_SPEED * SLEEP_SPEED * distance_squared:
+                    # Only a hard enough hit wakes a sleeping object, a slow one stops against it like against a wall
+                    for body in (self, object):
+                        if body.sleeping:
+                            body.rest_time = 0.0
+                dot_product /= distance_squared
+                if not self.sleeping:
+                    self.velocity.x -= dot_product * delta_pos.x
+                    self.velocity.y -= dot_product * delta_pos.y
+                if not object.sleeping:
+                    object.velocity.x += dot_product * delta_pos.x
+                    object.velocity.y += dot_product * delta_pos.y
+
+    def bounding_rect(self, position: Position | None = None) -> pygame.Rect:
+        position = position or self.position
+        # Rotated sprites reach out to the diagonal of their square
+        extent = self.radius * (1.5 if self.image_path is not None else 1.0) + 2
+        return pygame.Rect(position.x - extent, position.y - extent, 2 * extent + 1, 2 * extent + 1)
+
+    def draw(self, screen, position: Position | None = None, rotation: float | None = None):
+        # Load the image and draw it at the current position, or at the interpolated one when given, and
+        # likewise turned by the current rotation or the given one
+        position = position or self.position
+        rotation = self.rotation if rotation is None else rotation
+        if self.image_path is None:
+            pygame.draw.circle(screen, OBJECT_COLOR, (position.x, position.y), self.radius)
+            return
+        sprite = sprites.rotated(self.image_path, int(2 * self.radius), rotation)
+        screen.blit(sprite, sprite.get_rect(center=(position.x, position.y)))
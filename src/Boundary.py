@@ -1,6 +1,8 @@
+import copy
 import math
 from abc import ABC, abstractmethod
 
+import numpy as np
 import pygame.draw
 
 from helpers import Position, Vector
@@ -8,15 +10,81 @@ from helpers import Position, Vector
 
 class BoundaryProtocol(ABC):
     out_of_boundaries: bool
+    # Static boundaries always look the same, renderers may draw them once into a cached background
+    static: bool = False
 
     @abstractmethod
     def draw(self, screen): ...
 
     @abstractmethod
-    def collision_check(self, new_position): ...
+    def collision_check(self, new_position, radius: float | None = None): ...
 
     @abstractmethod
     def get_normal(self, position: Position) -> Vector: ...
 
     @abstractmethod
-    def update(self): ...
+    def update(self, dt: float = 1.0): ...
+
+    def collision_check_many(self, positions: np.ndarray, radii: np.ndarray | None = None) -> np.ndarray:
+        # Fallback for boundaries without a vectorized check, one collision_check call per position
+        radii = [None] * len(positions) if radii is None else np.broadcast_to(radii, len(positions)).tolist()
+        return np.fromiter(
+            (self.collision_check(Position(x, y), radius) for (x, y), radius in zip(positions.tolist(), radii)),
+            dtype=bool,
+            count=len(positions),
+        )
+
+    def get_normal_many(self, positions: np.ndarray) -> np.ndarray:
+        normals = [self.get_normal(Position(x, y)).to_tuple() for x, y in positions]
+        return np.array(normals, dtype=np.float64).reshape(-1, 2)
+
+    def time_of_impact_many(
+        self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float = 1.0
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+        """Fraction of the step at which each moving circle first touches the boundary, inf if it does not
+
+        Also returns the normal at the contact and the velocity of the boundary surface there, None for
+        boundaries that stand still. This fallback only checks the end of the step like collision_check
+        does, a hit counts as touching at the start of the step.
+        """
+        inside = self.collision_check_many(positions + velocities * dt, radii)
+        return np.where(inside, np.inf, 0.0), self.get_normal_many(positions), None
+
+    def time_of_impact(
+        self, position: Position, velocity: Vector, radius: float, dt: float = 1.0
+    ) -> tuple[float, Vector, Vector | None] | None:
+        times, normals, surfaces = self.time_of_impact_many(
+            np.array([position.to_tuple()]), np.array([velocity.to_tuple()]), np.array([radius]), dt
+        )
+        if not np.isfinite(times[0]):
+            return None
+        return float(times[0]), Vector(*normals[0]), None if surfaces is None else Vector(*surfaces[0])
+
+    def disturbs_many(self, positions: np.ndarray, radii: np.ndarray, dt: float = 1.0) -> np.ndarray:
+        """Which resting circles the boundary may push during the next dt ticks, they are woken up
+
+        Boundaries that never move leave sleeping circles alone.
+        """
+        return np.zeros(len(positions), dtype=bool)
+
+    def disturbs(self, position: Position, radius: float, dt: float = 1.0) -> bool:
+        return bool(self.disturbs_many(np.array([position.to_tuple()]), np.array([radius]), dt)[0])
+
+    def dirty_rect(self) -> pygame.Rect | None:
+        # Area that may have changed since the last frame, None for anywhere on the screen
+        return None
+
+    def touches(self, rect: pygame.Rect) -> bool:
+        # Whether drawing the boundary can change any pixel inside rect
+        return True
+
+    def get_state(self) -> tuple[float, ...]:
+        # Everything that changes while the simulation runs, used for snapshots
+        return (float(self.out_of_boundaries),)
+
+    def set_state(self, state: tuple[float, ...]):
+        self.out_of_boundaries = bool(state[0])
+
+    def render_copy(self) -> "BoundaryProtocol":
+        # Drawn on the render thread while this one keeps updating, set_state brings it to a later state
+        return copy.copy(self)
@@ -1,24 +1,52 @@
+import copy
 import math
 
+import numpy as np
 import pygame
 
 from Boundary import BoundaryProtocol
+from GlowRing import GlowRing
 from helpers import Position, Vector
+from sweep import contact_points, exit_time, unit
 
 
 class CircleBoundary(BoundaryProtocol):
-    def __init__(self, center: Position, radius, color, thicnkess):
-        self.center = center
+    static = True
+
+    def __init__(
+        self, center: Position, radius, color, thicnkess, glow_colors: list[tuple[int, int, int]] | None = None
+    ):
+        self.center = Position.parse(center)
         self.radius = radius
         self.color = color
         self.thickness = thicnkess
         self.out_of_boundaries = False
+        self.glow = GlowRing(radius, glow_colors) if glow_colors else None
+        # A glowing ring changes color every frame
+        self.static = self.glow is None
 
-    def collision_check(self, position: Position) -> bool:
+    def collision_check(self, position: Position, radius: float | None = None) -> bool:
         dx = position.x - self.center.x
         dy = position.y - self.center.y
         distance_squared = dx * dx + dy * dy
-        return distance_squared < (self.radius - 15) ** 2  # 30px buffer for object size
+        buffer = 15 if radius is None else radius
+        return distance_squared < (self.radius - buffer) ** 2
+
+    def collision_check_many(self, positions: np.ndarray, radii: np.ndarray | None = None) -> np.ndarray:
+        delta = positions - self.center.to_tuple()
+        distance_squared = np.einsum("ij,ij->i", delta, delta)
+        buffer = 15 if radii is None else radii
+        return distance_squared < (self.radius - buffer) ** 2
+
+    def time_of_impact_many(
+        self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float = 1.0
+    ) -> tuple[np.ndarray, np.ndarray, None]:
+        # The center of a ball touches the ring when it is the ball's radius away from it, the ring has no
+        # opening so a ball found outside of it is still pushed back
+        offsets = positions - self.center.to_tuple()
+        displacements = velocities * dt
+        times = exit_time(offsets, displacements, self.radius - radii, np.inf)
+        return times, unit(contact_points(offsets, displacements, times)), None
 
     def get_normal(self, position: Position) -> Vector:
         dx = position.x - self.center.x
@@ -27,10 +55,34 @@ class CircleBoundary(BoundaryProtocol):
         distance = math.sqrt(dx * dx + dy * dy)
 
         if distance == 0:
-            return Position(x=0, y=-1)  # Default normal if at center
-        return Vector(x=dx / distance, y=dy / distance)
+            return Vector(0, -1)  # Default normal if at center
+        return Vector(dx / distance, dy / distance)
+
+    def get_normal_many(self, positions: np.ndarray) -> np.ndarray:
+        return unit(positions - self.center.to_tuple())
 
     def draw(self, screen):
+        if self.glow is not None:
+            self.glow.draw(screen, self.center.to_tuple())
         pygame.draw.circle(screen, self.color, self.center.to_tuple(), self.radius, self.thickness)
 
-    def update(self): ...
+    def dirty_rect(self) -> pygame.Rect | None:
+        return self.glow.rect(self.center.to_tuple()) if self.glow is not None else None
+
+    def get_state(self) -> tuple[float, ...]:
+        return float(self.out_of_boundaries), self.glow.timer if self.glow is not None else 0.0
+
+    def set_state(self, state: tuple[float, ...]):
+        self.out_of_boundaries = bool(state[0])
+        if self.glow is not None:
+            self.glow.timer = state[1]
+
+    def render_copy(self) -> BoundaryProtocol:
+        drawn = copy.copy(self)
+        # The glow timer is part of the state, the pre-rendered surfaces can be shared
+        drawn.glow = copy.copy(self.glow)
+        return drawn
+
+    def update(self, dt: float = 1.0):
+        if self.glow is not None:
+            self.glow.update(dt)
@@ -1,14 +1,28 @@
+import copy
 import math
 
+import numpy as np
 import pygame
 
 from Boundary import BoundaryProtocol
+from GlowRing import GlowRing
 from helpers import Position, Vector
+from sweep import contact_points, entry_time, exit_time, unit
 
 
 class CircleBoundaryWithDoor(BoundaryProtocol):
-    def __init__(self, center: Position, radius, color, thickness, door_angle_start, door_angle_size, rotation_speed):
-        self.center = center
+    def __init__(
+        self,
+        center: Position,
+        radius,
+        color,
+        thickness,
+        door_angle_start,
+        door_angle_size,
+        rotation_speed,
+        glow_colors: list[tuple[int, int, int]] | None = None,
+    ):
+        self.center = Position.parse(center)
         self.radius = radius
         self.color = color
         self.thickness = thickness
@@ -18,9 +32,10 @@ class CircleBoundaryWithDoor(BoundaryProtocol):
         self.rotation_speed = rotation_speed  # How fast the door rotates (degrees per frame)
         self.debug = True
         self.out_of_boundaries = False
+        self.glow = GlowRing(radius, glow_colors) if glow_colors else None
 
     def _is_in_door_angle(self, angle_degrees):
-        """Check if the given angle is within the door opening"""
+        """Check if the given angle, or array of angles, is within the door opening"""
         # Normalize angles to 0-360 range
         door_start = self.door_angle_start % 360
         door_end = (door_start + self.door_angle_size) % 360
@@ -28,17 +43,18 @@ class CircleBoundaryWithDoor(BoundaryProtocol):
 
         # Handle the case where the door crosses the 0/360 boundary
         if door_start <= door_end:
-            return door_start <= angle <= door_end
+            return (door_start <= angle) & (angle <= door_end)
         else:
-            return angle >= door_start or angle <= door_end
+            return (angle >= door_start) | (angle <= door_end)
 
-    def collision_check(self, position: Position) -> bool:
+    def collision_check(self, position: Position, radius: float | None = None) -> bool:
         dx = position.x - self.center.x
         dy = position.y - self.center.y
         distance_squared = dx * dx + dy * dy
+        buffer = 15 if radius is None else radius
 
         # Check if the position is near the boundary
-        if not ((self.radius - 25) ** 2 <= distance_squared <= (self.radius + 5) ** 2):
+        if not ((self.radius - buffer - 10) ** 2 <= distance_squared <= (self.radius + 5) ** 2):
             return True  # Position is either well inside or well outside the circle
 
         # Calculate the angle in degrees
@@ -51,7 +67,70 @@ class CircleBoundaryWithDoor(BoundaryProtocol):
             return True  # No collision in the door area
 
         # Otherwise, treat it as a collision if near the boundary
-        return distance_squared < (self.radius - 15) ** 2
+        return distance_squared < (self.radius - buffer) ** 2
+
+    def collision_check_many(self, positions: np.ndarray, radii: np.ndarray | None = None) -> np.ndarray:
+        delta = positions - self.center.to_tuple()
+        distance_squared = np.einsum("ij,ij->i", delta, delta)
+        buffer = 15 if radii is None else radii
+
+        # Only positions near the boundary need the angle test
+        near = ((self.radius - buffer - 10) ** 2 <= distance_squared) & (distance_squared <= (self.radius + 5) ** 2)
+        angle_degrees = 360 - np.degrees(np.arctan2(delta[:, 1], delta[:, 0])) % 360
+        in_door = near & self._is_in_door_angle(angle_degrees)
+        if in_door.any():
+            self.out_of_boundaries = True
+        return ~near | in_door | (distance_squared < (self.radius - buffer) ** 2)
+
+    def _edges(self) -> list[tuple[float, float]]:
+        # Ends of the arc on both sides of the door, in the middle of the drawn line
+        middle = self.radius - self.thickness / 2
+        return [
+            (middle * math.cos(math.radians(angle)), -middle * math.sin(math.radians(angle)))
+            for angle in (self.door_angle_start, self.door_angle_start + self.door_angle_size)
+        ]
+
+    def time_of_impact_many(
+        self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float = 1.0
+    ) -> tuple[np.ndarray, np.ndarray, None]:
+        # The door is taken where it is at the start of the step, it turns less than a degree per tick
+        offsets = positions - self.center.to_tuple()
+        displacements = velocities * dt
+        times = exit_time(offsets, displacements, self.radius - radii, self.radius)
+        contacts = contact_points(offsets, displacements, times)
+
+        # Reaching the ring inside the door opening is not a collision but an escape
+        angle_degrees = 360 - np.degrees(np.arctan2(contacts[:, 1], contacts[:, 0])) % 360
+        escaping = np.isfinite(times) & self._is_in_door_angle(angle_degrees)
+        escape_times = np.where(escaping, times, np.inf)
+        times[escaping] = np.inf
+        normals = unit(contacts)
+
+        # The ends of the arc stick into the opening, a ball squeezing through bounces off them
+        for edge in self._edges():
+            edge_times = entry_time(offsets - edge, displacements, radii + self.thickness / 2)
+            earlier = edge_times < times
+            if earlier.any():
+                times[earlier] = edge_times[earlier]
+                normals[earlier] = unit(contact_points(offsets - edge, displacements, edge_times)[earlier])
+        if (escape_times < times).any():
+            self.out_of_boundaries = True
+        return times, normals, None
+
+    def disturbs_many(self, positions: np.ndarray, radii: np.ndarray, dt: float = 1.0) -> np.ndarray:
+        # A ball resting against the wall is woken when the opening turns under it or an edge runs into it,
+        # the wall itself is the same circle whatever its rotation
+        if self.rotation_speed == 0:
+            return np.zeros(len(positions), dtype=bool)
+        delta = positions - self.center.to_tuple()
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        near = distance >= self.radius - radii - self.thickness
+        angle_degrees = 360 - np.degrees(np.arctan2(delta[:, 1], delta[:, 0])) % 360
+        middle = self.door_angle_start + self.door_angle_size / 2
+        from_middle = np.abs((angle_degrees - middle + 180) % 360 - 180)
+        # Half the arc a ball covers on the ring, plus how far the door turns in the meantime
+        reach = np.degrees(np.arcsin(np.minimum((radii + self.thickness) / self.radius, 1.0)))
+        return near & (from_middle <= self.door_angle_size / 2 + reach + abs(self.rotation_speed) * dt)
 
     def get_normal(self, position: Position) -> Vector:
         dx = position.x - self.center.x
@@ -60,10 +139,18 @@ class CircleBoundaryWithDoor(BoundaryProtocol):
         distance = math.sqrt(dx * dx + dy * dy)
 
         if distance == 0:
-            return Position(x=0, y=-1)  # Default normal if at center
-        return Vector(x=dx / distance, y=dy / distance)
+            return Vector(0, -1)  # Default normal if at center
+        return Vector(dx / distance, dy / distance)
+
+    def get_normal_many(self, positions: np.ndarray) -> np.ndarray:
+        return unit(positions - self.center.to_tuple())
 
     def draw(self, screen):
+        if self.glow is not None:
+            # Same opening as the arc below, in screen angles
+            gap_end = 360 - self.door_angle_start
+            self.glow.draw(screen, self.center.to_tuple(), (gap_end - self.door_angle_size, gap_end))
+
         # Draw the circle as an arc, leaving a gap for the door
         door_start_radians = math.radians(self.door_angle_start)
         door_end_radians = math.radians((self.door_angle_start + self.door_angle_size) % 360)
@@ -94,5 +181,51 @@ class CircleBoundaryWithDoor(BoundaryProtocol):
             pygame.draw.line(screen, (255, 0, 0), self.center.to_tuple(), (start_x, start_y), 2)
             pygame.draw.line(screen, (0, 255, 0), self.center.to_tuple(), (end_x, end_y), 2)
 
-    def update(self):
-        self.door_angle_start = (self.door_angle_start - self.rotation_speed) % 360
+    def dirty_rect(self) -> pygame.Rect:
+        if self.glow is not None:
+            # The glow changes color all around the ring
+            return self.glow.rect(self.center.to_tuple())
+        # Only the door opening changes while the ring rotates, plus the debug lines from the center
+        steps = int(self.door_angle_size // 10) + 2
+        angles = np.radians(360 - self.door_angle_start - np.linspace(0, self.door_angle_size, steps))
+        xs = self.center.x + self.radius * np.cos(angles)
+        ys = self.center.y + self.radius * np.sin(angles)
+        if self.debug:
+            xs = np.append(xs, self.center.x)
+            ys = np.append(ys, self.center.y)
+        margin = self.thickness + 2
+        left, top = xs.min() - margin, ys.min() - margin
+        return pygame.Rect(left, top, xs.max() + margin - left + 1, ys.max() + margin - top + 1)
+
+    def touches(self, rect: pygame.Rect) -> bool:
+        if self.debug:
+            return True
+        # The ring only covers the annulus between radius - thickness and radius
+        nearest_x = min(max(self.center.x, rect.left), rect.right)
+        nearest_y = min(max(self.center.y, rect.top), rect.bottom)
+        farthest_x = max(abs(rect.left - self.center.x), abs(rect.right - self.center.x))
+        farthest_y = max(abs(rect.top - self.center.y), abs(rect.bottom - self.center.y))
+        nearest = math.hypot(nearest_x - self.center.x, nearest_y - self.center.y)
+        outer = self.glow.extent if self.glow is not None else self.radius + 1
+        return nearest <= outer and math.hypot(farthest_x, farthest_y) >= self.radius - self.thickness - 1
+
+    def get_state(self) -> tuple[float, ...]:
+        glow_timer = self.glow.timer if self.glow is not None else 0.0
+        return float(self.out_of_boundaries), float(self.door_angle_start), glow_timer
+
+    def set_state(self, state: tuple[float, ...]):
+        self.out_of_boundaries = bool(state[0])
+        self.door_angle_start = state[1]
+        if self.glow is not None:
+            self.glow.timer = state[2]
+
+    def render_copy(self) -> BoundaryProtocol:
+        drawn = copy.copy(self)
+        # The glow timer is part of the state, the pre-rendered surfaces can be shared
+        drawn.glow = copy.copy(self.glow)
+        return drawn
+
+    def update(self, dt: float = 1.0):
+        self.door_angle_start = (self.door_angle_start - self.rotation_speed * dt) % 360
+        if self.glow is not None:
+            self.glow.update(dt)
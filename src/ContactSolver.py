@@ -0,0 +1,387 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from bootstrap import BOUNCE_DAMPENING, SLEEP_SPEED
+from Boundary import BoundaryProtocol
+from sweep import contact_points, entry_time, unit
+
+# Contacts closing slower than this, in pixels per tick, do not bounce, so gravity cannot keep a resting pile hopping
+RESTITUTION_SPEED = 1.0
+# Overlap in pixels the positional correction leaves alone, correcting all of it makes resting contacts flicker
+SLOP = 0.5
+# Share of the gap a slow contact may close per step, so it comes to rest against the other side instead of hitting it
+SPECULATIVE = 0.5
+# Most the positional correction moves a contact apart per pass, more could push a ball through a boundary
+MAX_CORRECTION = 2.0
+# Most times the contacts are solved again after impulses turned balls towards others they were not heading for
+ROUNDS = 3
+# Pairs this many pixels apart become contacts too, the impulses of others can still drive them into each other
+MARGIN = 8.0
+
+
+@dataclass
+class Contacts:
+    i: np.ndarray
+    j: np.ndarray
+    normals: np.ndarray  # Unit vectors from j towards i where they touch
+    gaps: np.ndarray  # Distance left to close before they touch, negative while overlapping
+    approach: np.ndarray  # Velocity of i relative to j along the normal, negative while closing in
+    keys: np.ndarray  # Same for the same two sides in every step, to find the impulse of the last one
+    touching: np.ndarray  # Meet within the step at the velocities they start it with, the others are only near
+
+
+def _concatenate(first: Contacts, second: Contacts) -> Contacts:
+    return Contacts(
+        *(np.concatenate([getattr(first, name), getattr(second, name)]) for name in Contacts.__dataclass_fields__)
+    )
+
+
+def _select(contacts: Contacts, selected: np.ndarray) -> Contacts:
+    return Contacts(*(getattr(contacts, name)[selected] for name in Contacts.__dataclass_fields__))
+
+
+def _priorities(count: int) -> np.ndarray:
+    # Pseudo random but fixed order of the contacts, Knuth's multiplicative hash of their index
+    return (np.arange(1, count + 1, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(1 << 32)
+
+
+def batches(i: np.ndarray, j: np.ndarray, count: int) -> list[np.ndarray]:
+    """Contacts split into batches in which no ball appears twice
+
+    Each batch is solved at once with array operations, the batches one after the other, so every
+    contact sees the impulses of the batches before it. A contact joins the current batch when it
+    comes first at both of its balls among the contacts left, in an order scrambled so that chains of
+    contacts sorted along them still fill every batch.
+    """
+    remaining = np.arange(len(i))
+    priorities = _priorities(len(i))
+    result = []
+    while len(remaining) > 0:
+        first = np.full(count, np.iinfo(np.uint64).max, dtype=np.uint64)
+        np.minimum.at(first, i[remaining], priorities[remaining])
+        np.minimum.at(first, j[remaining], priorities[remaining])
+        free = (first[i[remaining]] == priorities[remaining]) & (first[j[remaining]] == priorities[remaining])
+        result.append(remaining[free])
+        remaining = remaining[~free]
+    return result
+
+
+def _swept_moves(
+    boundaries: list[BoundaryProtocol], positions: np.ndarray, moves: np.ndarray, radii: np.ndarray
+) -> np.ndarray:
+    # Where the balls end up moved like over a step, stopping at a wall and sliding along it for the rest
+    fractions = np.ones(len(positions))
+    normals = np.zeros_like(positions)
+    for boundary in boundaries:
+        times, hit_normals, _ = boundary.time_of_impact_many(positions, moves, radii, 1.0)
+        closer = times < fractions
+        fractions[closer], normals[closer] = times[closer], hit_normals[closer]
+    stopped = positions + fractions[:, None] * moves
+    rest = (1 - fractions)[:, None] * moves
+    slides = rest - np.einsum("ij,ij->i", rest, normals)[:, None] * normals
+    slid = np.flatnonzero(fractions < 1)
+    if len(slid) == 0:
+        return stopped
+    # A slide into another wall stops there
+    fractions = np.ones(len(slid))
+    for boundary in boundaries:
+        np.minimum(
+            fractions, boundary.time_of_impact_many(stopped[slid], slides[slid], radii[slid], 1.0)[0], out=fractions
+        )
+    stopped[slid] += fractions[:, None] * slides[slid]
+    return stopped
+
+
+class ContactSolver:
+    """Sequential impulse solver for contacts between balls and of balls with the boundaries
+
+    Every touching pair becomes one contact per step. `iterations` passes over all contacts stop the
+    balls from closing in on each other, starting from the impulses of the last step as a warm start,
+    then a last pass makes the fast contacts bounce apart with restitution. Overlap left after that is
+    pushed apart by moving the balls, which adds no energy. Balls weigh in proportion to their area.
+    Boundaries take part as balls of infinite mass, so a pile resting on a wall is solved as a whole.
+    """
+
+    def __init__(
+        self,
+        iterations: int = 8,
+        restitution: float = BOUNCE_DAMPENING,
+        correction: float = 0.8,
+        warm_start: bool = True,
+        margin: float = MARGIN,
+    ):
+        self.iterations = iterations
+        self.restitution = restitution
+        # Share of the overlap removed per pass of the positional correction
+        self.correction = correction
+        self.warm_start = warm_start
+        # Pairs this far apart are contacts too, the broad phase grows the radii by it to find them
+        self.margin = margin
+        # Accumulated impulse of every resting contact of the last step, sorted by key
+        self.keys = np.empty(0, dtype=np.int64)
+        self.impulses = np.empty(0, dtype=np.float64)
+        # Keys of the pairs the positional correction of the last step pushed apart, sorted
+        self.separated = np.empty(0, dtype=np.int64)
+        # Balls the positional correction of the last step left overlapping deeper than MAX_CORRECTION
+        self.crowded = np.empty(0, dtype=np.intp)
+        self.count = 0
+
+    def reset(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.impulses = np.empty(0, dtype=np.float64)
+        self.separated = np.empty(0, dtype=np.int64)
+        self.crowded = np.empty(0, dtype=np.intp)
+
+    def find_contacts(
+        self,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        i: np.ndarray,
+        j: np.ndarray,
+        dt: float,
+        continuous: bool = True,
+        starting: np.ndarray | None = None,
+    ) -> Contacts:
+        # Candidate pairs that overlap, touch within the step when swept or are within margin of each other,
+        # with the normal where they touch. The approach is measured with starting when given, like below
+        starting = velocities if starting is None else starting
+        delta = positions[i] - positions[j]
+        reach = radii[i] + radii[j]
+        gaps = np.hypot(delta[:, 0], delta[:, 1]) - reach
+        touching = gaps < 0
+        offsets = delta
+        if continuous:
+            displacement = (velocities[i] - velocities[j]) * dt
+            times = entry_time(delta, displacement, reach)
+            touching |= np.isfinite(times)
+            offsets = contact_points(delta, displacement, times)
+        kept = touching | (gaps < self.margin)
+        i, j, offsets = i[kept], j[kept], offsets[kept]
+        normals = unit(offsets)
+        return Contacts(
+            i=i,
+            j=j,
+            normals=normals,
+            gaps=gaps[kept],
+            approach=np.einsum("ij,ij->i", starting[i] - starting[j], normals),
+            keys=np.minimum(i, j) * len(positions) + np.maximum(i, j),
+            touching=touching[kept],
+        )
+
+    def boundary_contacts(
+        self,
+        boundaries: list[BoundaryProtocol],
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        dt: float,
+        balls: np.ndarray,
+        starting: np.ndarray | None = None,
+    ) -> tuple[Contacts, np.ndarray]:
+        """Balls touching a boundary within the step, each against a side of its own
+
+        The balls are swept with velocities, the approach is measured with starting, the velocities
+        of the start of the step, when given. Returns the contacts and the velocity of the boundary
+        surface at each of them. The other side of the k-th contact is numbered len(positions) + k.
+        """
+        count = len(positions)
+        starting = velocities if starting is None else starting
+        found, surfaces = [], []
+        for number, boundary in enumerate(boundaries):
+            times, normals, moving = boundary.time_of_impact_many(positions[balls], velocities[balls], radii[balls], dt)
+            hit = np.flatnonzero(np.isfinite(times))
+            surface = np.zeros((len(hit), 2)) if moving is None else moving[hit]
+            relative = np.einsum("ij,ij->i", velocities[balls[hit]] - surface, normals[hit])
+            # Boundaries differ in which way their normals point, here they point away from the wall
+            normals = normals[hit] * np.where(relative > 0, -1.0, 1.0)[:, None]
+            approach = np.einsum("ij,ij->i", starting[balls[hit]] - surface, normals)
+            ball = balls[hit]
+            gaps = times[hit] * np.abs(relative) * dt
+            keys = count * count + ball * len(boundaries) + number
+            found.append((ball, normals, gaps, approach, keys))
+            surfaces.append(surface)
+        parts = [np.concatenate(part) for part in zip(*found)] if found else [np.empty((0, 2))] * 5
+        ball, normals, gaps, approach, keys = parts
+        return (
+            Contacts(
+                i=ball.astype(np.intp).reshape(-1),
+                j=count + np.arange(len(gaps)),
+                normals=normals.reshape(-1, 2),
+                gaps=gaps.reshape(-1),
+                approach=approach.reshape(-1),
+                keys=keys.astype(np.int64).reshape(-1),
+                touching=np.ones(len(gaps), dtype=bool),
+            ),
+            np.concatenate(surfaces).reshape(-1, 2) if surfaces else np.empty((0, 2)),
+        )
+
+    def resolve(
+        self,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        i: np.ndarray,
+        j: np.ndarray,
+        dt: float,
+        continuous: bool = True,
+        sleeping: np.ndarray | None = None,
+        boundaries: list[BoundaryProtocol] = (),
+    ) -> np.ndarray:
+        """Solves the contacts among the candidate pairs and with the boundaries in place, returns the
+        sleeping balls woken up
+
+        Only a hard enough hit or a deep overlap wakes a sleeping ball, the others weigh infinitely much
+        and stop a slow ball like a wall would.
+        """
+        count = len(positions)
+        if count != self.count:
+            # Balls were added, the keys of the cached impulses no longer line up with them
+            self.count = count
+            self.reset()
+        # The impulses depend on the order the contacts are solved in, the broad phase hands the pairs out
+        # in an order that depends on the frames before, so they are sorted for a restored run to match
+        i, j = np.minimum(i, j), np.maximum(i, j)
+        order = np.lexsort((j, i))
+        i, j = i[order], j[order]
+        contacts = self.find_contacts(positions, velocities, radii, i, j, dt, continuous)
+        inverse_masses = 1.0 / (radii * radii)
+        woken = np.empty(0, dtype=np.intp)
+        if sleeping is not None:
+            # Sinking into a sleeping ball deeper than one pass of the correction pushes out wakes it too. The
+            # balls at the bottom of a pile stay a little more than SLOP apart and must not keep waking it
+            hard = (contacts.touching & (-contacts.approach >= SLEEP_SPEED)) | (contacts.gaps < -MAX_CORRECTION)
+            woken = np.unique(
+                np.concatenate([contacts.i[hard & sleeping[contacts.i]], contacts.j[hard & sleeping[contacts.j]]])
+            )
+            still = sleeping.copy()
+            still[woken] = False
+            inverse_masses = np.where(still, 0.0, inverse_masses)
+        moving = np.flatnonzero(inverse_masses > 0)
+        walls, surfaces = self.boundary_contacts(boundaries, positions, velocities, radii, dt, moving)
+        starting = velocities.copy()
+        for _ in range(ROUNDS):
+            # The boundaries take part as balls of infinite mass, moving like their surface at the contact
+            walls.j = count + np.arange(len(walls.i))
+            extended = np.concatenate([starting, surfaces])
+            self.solve(
+                _concatenate(contacts, walls), extended, np.concatenate([inverse_masses, np.zeros(len(walls.i))]), dt
+            )
+            velocities[:] = extended[:count]
+            # Impulses can turn a ball towards another one or a wall it was not heading for, all contacts are
+            # solved again from the start with those too
+            turned = np.any(velocities != starting, axis=1) & (inverse_masses > 0)
+            candidates = (turned[i] | turned[j]) & ~np.isin(np.minimum(i, j) * count + np.maximum(i, j), contacts.keys)
+            more = self.find_contacts(
+                positions, velocities, radii, i[candidates], j[candidates], dt, continuous, starting
+            )
+            more = _select(more, more.touching)
+            unwalled = np.flatnonzero(turned)
+            unwalled = unwalled[~np.isin(unwalled, walls.i)]
+            more_walls, more_surfaces = self.boundary_contacts(
+                boundaries, positions, velocities, radii, dt, unwalled, starting
+            )
+            if len(more.i) == 0 and len(more_walls.i) == 0:
+                break
+            contacts = _concatenate(contacts, more)
+            walls, surfaces = _concatenate(walls, more_walls), np.concatenate([surfaces, more_surfaces])
+        self.separate(positions, radii, inverse_masses, contacts, boundaries)
+        return woken
+
+    def solve(self, contacts: Contacts, velocities: np.ndarray, inverse_masses: np.ndarray, dt: float):
+        i, j, normals = contacts.i, contacts.j, contacts.normals
+        inverse_i, inverse_j = inverse_masses[i, None], inverse_masses[j, None]
+        total = inverse_masses[i] + inverse_masses[j]
+        effective = np.divide(1.0, total, out=np.zeros_like(total), where=total > 0)
+        # First the contacts only stop the balls from closing in any further, fast ones right away and slow
+        # ones bit by bit as they close the gap left between them. Near pairs may close all of their gap
+        bouncing = contacts.touching & (contacts.approach <= -RESTITUTION_SPEED)
+        # Pairs pushed apart by the last positional correction are resting in a pile, gravity closing them in
+        # again is no hit to bounce off
+        bouncing &= ~np.isin(contacts.keys, self.separated)
+        share = np.where(contacts.touching, SPECULATIVE, 1.0)
+        targets = np.where(bouncing, 0.0, -share * np.maximum(contacts.gaps, 0.0) / dt)
+
+        accumulated = np.zeros(len(i))
+        if self.warm_start and len(self.keys) > 0:
+            found = np.minimum(np.searchsorted(self.keys, contacts.keys), len(self.keys) - 1)
+            known = self.keys[found] == contacts.keys
+            accumulated[known] = self.impulses[found[known]]
+            # Balls with several contacts take all of their impulses at once
+            np.add.at(velocities, i, accumulated[:, None] * inverse_i * normals)
+            np.subtract.at(velocities, j, accumulated[:, None] * inverse_j * normals)
+
+        def relax(groups: list[np.ndarray], targets: np.ndarray):
+            for batch in groups:
+                first, second, batch_normals = i[batch], j[batch], normals[batch]
+                speeds = np.einsum("ij,ij->i", velocities[first] - velocities[second], batch_normals)
+                # Contacts only ever push, the total impulse of each one never drops below zero
+                impulses = np.maximum(accumulated[batch] + (targets[batch] - speeds) * effective[batch], 0.0)
+                change = (impulses - accumulated[batch])[:, None] * batch_normals
+                accumulated[batch] = impulses
+                velocities[first] += change * inverse_i[batch]
+                velocities[second] -= change * inverse_j[batch]
+
+        groups = batches(i, j, len(velocities))
+        for _ in range(self.iterations):
+            relax(groups, targets)
+        # A bounce is over within its step, only resting contacts carry their impulse over to the next one
+        order = np.argsort(contacts.keys)
+        self.keys, self.impulses = contacts.keys[order], np.where(bouncing, 0.0, accumulated)[order]
+        if self.restitution == 0 or not np.any(bouncing):
+            return
+
+        # One pass that makes the fast contacts part as fast as they met, times restitution. Repeating it
+        # would aim every contact of a cluster at its own rebound at once, which adds energy
+        bounces = [batch[bouncing[batch]] for batch in groups]
+        relax([batch for batch in bounces if len(batch) > 0], -self.restitution * contacts.approach)
+        # The rebounds can drive the balls into their other neighbours. More passes keep any contact from
+        # closing in again, with impulses of their own on top, so none of the rebounds is taken back
+        accumulated[:] = 0.0
+        for _ in range(self.iterations):
+            relax(groups, targets)
+
+    def separate(
+        self,
+        positions: np.ndarray,
+        radii: np.ndarray,
+        inverse_masses: np.ndarray,
+        contacts: Contacts,
+        boundaries: list[BoundaryProtocol] = (),
+    ):
+        # Pushes the balls of the pair contacts apart along the line between them, lighter ones
+        # further, until no overlap is deeper than SLOP. Only positions change, so this adds no energy
+        overlapping = contacts.gaps < -SLOP
+        self.separated = np.unique(contacts.keys[overlapping])
+        self.crowded = np.empty(0, dtype=np.intp)
+        if len(self.separated) == 0:
+            return
+        # The near pairs too, pushing a ball out of one overlap can drive it into a neighbour it did not touch
+        i, j = contacts.i, contacts.j
+        inverse_i, inverse_j = inverse_masses[i, None], inverse_masses[j, None]
+        total = inverse_masses[i] + inverse_masses[j]
+        effective = np.divide(1.0, total, out=np.zeros_like(total), where=total > 0)
+        groups = batches(i, j, len(positions))
+        balls = np.unique(np.concatenate([i, j]))
+        for _ in range(self.iterations):
+            start = positions[balls]
+            deepest = 0.0
+            for batch in groups:
+                first, second = i[batch], j[batch]
+                delta = positions[first] - positions[second]
+                depths = radii[first] + radii[second] - np.hypot(delta[:, 0], delta[:, 1])
+                deepest = max(deepest, float(depths.max()))
+                corrections = np.clip(self.correction * (depths - SLOP), 0.0, MAX_CORRECTION)
+                pushes = (corrections * effective[batch])[:, None] * unit(delta)
+                positions[first] += pushes * inverse_i[batch]
+                positions[second] -= pushes * inverse_j[batch]
+            if boundaries:
+                # The next pass sees the balls squeezed against a wall where they stopped
+                positions[balls] = _swept_moves(boundaries, start, positions[balls] - start, radii[balls])
+            if deepest <= SLOP:
+                return
+        # Overlaps this deep wake a sleeping ball, so the balls in them must not fall asleep either
+        delta = positions[i] - positions[j]
+        deep = radii[i] + radii[j] - np.hypot(delta[:, 0], delta[:, 1]) > MAX_CORRECTION
+        self.crowded = np.unique(np.concatenate([i[deep], j[deep]]))
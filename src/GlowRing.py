@@ -0,0 +1,97 @@
+import math
+
+import pygame
+
+
+class GlowRing:
+    """Glow around a circle, pre-rendered once per palette color and blend level into cropped surfaces
+
+    The look follows the glowing boundary prototype in trys/2.py, the colors of the palette fade
+    into each other over time. Instead of compositing four full-screen alpha layers every frame,
+    the blend is quantized to levels and each level is rendered once.
+    """
+
+    def __init__(
+        self,
+        radius: float,
+        colors: list[tuple[int, int, int]],
+        thickness: int = 15,
+        offset: int = 5,
+        layers: int = 4,
+        levels: int = 16,
+        speed: float = 0.02,
+    ):
+        self.radius = radius
+        self.colors = colors
+        self.thickness = thickness
+        self.offset = offset
+        self.layers = layers
+        self.levels = levels
+        self.speed = speed  # radians of the blend cycle per tick
+        self.timer = 0.0
+        # Half the size of the cropped surface, the outermost layer included
+        self.extent = int(math.ceil(radius + offset + (layers - 1) * 3)) + 1
+        self._cache: dict[tuple[int, int], pygame.Surface] = {}
+        self._scratch = None
+
+    def update(self, dt: float = 1.0):
+        self.timer += self.speed * dt
+
+    def _render(self, color: tuple[int, int, int]) -> pygame.Surface:
+        size = 2 * self.extent + 1
+        # Starting from the glow color keeps it from darkening where the alpha layers overlap
+        ring = pygame.Surface((size, size), pygame.SRCALPHA)
+        ring.fill((*color, 0))
+        layer = pygame.Surface((size, size), pygame.SRCALPHA)
+        for i in range(self.layers):
+            layer.fill((0, 0, 0, 0))
+            pygame.draw.circle(
+                layer,
+                (*color, max(180 - i * 40, 0)),
+                (self.extent, self.extent),
+                self.radius + self.offset + i * 3,
+                max(self.thickness - i * 2, 1),
+            )
+            ring.blit(layer, (0, 0))
+        return ring
+
+    def current(self) -> pygame.Surface:
+        blend = abs(math.sin(self.timer))
+        color_index = int(self.timer / math.pi) % len(self.colors)
+        level = round(blend * (self.levels - 1))
+        key = (color_index, level)
+
+        ring = self._cache.get(key)
+        if ring is None:
+            first = self.colors[color_index]
+            second = self.colors[(color_index + 1) % len(self.colors)]
+            weight = level / (self.levels - 1)
+            color = tuple(int(a * (1 - weight) + b * weight) for a, b in zip(first, second))
+            ring = self._cache[key] = self._render(color)
+        return ring
+
+    def _without_gap(self, ring: pygame.Surface, start: float, end: float) -> pygame.Surface:
+        # Copy into a reused scratch surface and cut the wedge between the screen angles start and end
+        if self._scratch is None:
+            self._scratch = pygame.Surface(ring.get_size(), pygame.SRCALPHA)
+        self._scratch.fill((0, 0, 0, 0))
+        self._scratch.blit(ring, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)
+
+        reach = 2 * self.extent
+        steps = int((end - start) // 10) + 2
+        points = [(self.extent, self.extent)]
+        for i in range(steps):
+            angle = math.radians(start + (end - start) * i / (steps - 1))
+            points.append((self.extent + reach * math.cos(angle), self.extent + reach * math.sin(angle)))
+        pygame.draw.polygon(self._scratch, (0, 0, 0, 0), points)
+        return self._scratch
+
+    def draw(self, screen: pygame.Surface, center: tuple[float, float], gap: tuple[float, float] | None = None):
+        ring = self.current()
+        if gap is not None:
+            ring = self._without_gap(ring, *gap)
+        screen.blit(ring, (center[0] - self.extent, center[1] - self.extent))
+
+    def rect(self, center: tuple[float, float]) -> pygame.Rect:
+        size = 2 * self.extent + 1
+        return pygame.Rect(center[0] - self.extent, center[1] - self.extent, size, size)
@@ -0,0 +1,98 @@
+import copy
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from helpers import Position
+
+
+@dataclass(frozen=True)
+class FrameState:
+    """Everything the renderer needs of one simulated frame, copied out so the simulation can move on"""
+
+    frame: int
+    step: int
+    # Where the objects are drawn, already interpolated between the last two steps when enabled
+    positions: np.ndarray
+    velocities: np.ndarray
+    radii: np.ndarray
+    rotations: np.ndarray
+    boundary_states: tuple[tuple[float, ...], ...]
+    trail: np.ndarray | None
+    running: bool
+
+
+class FrameBuffer:
+    """Triple buffer between the simulation and the render thread
+
+    The simulation publishes into the back slot and never waits, the newest complete frame waits in the
+    middle one and take() swaps it to the front for the renderer. A frame that is published before the
+    previous one was taken replaces it.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._middle: FrameState | None = None
+        self._fresh = False
+        self._closed = False
+        self._error: BaseException | None = None
+        self.front: FrameState | None = None
+
+    def publish(self, state: FrameState):
+        with self._condition:
+            self._middle = state
+            self._fresh = True
+            self._condition.notify()
+
+    def close(self, error: BaseException | None = None):
+        # No more frames will come, error is raised from take() in the render thread
+        with self._condition:
+            self._closed = True
+            self._error = error
+            self._condition.notify()
+
+    def take(self) -> FrameState | None:
+        """Waits for a frame newer than the front one, None once the simulation stopped without one"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._fresh or self._closed)
+            if self._error is not None:
+                raise self._error
+            if not self._fresh:
+                return None
+            self.front, self._middle, self._fresh = self._middle, None, False
+            return self.front
+
+
+class FrameView:
+    """Stands in for the AnimationManger when a renderer draws a FrameState on the render thread
+
+    Boundaries and trails are drawn from copies of their own that are set to the state of the frame.
+    Objects are shared but only their image is read from them, their radii and rotations come from the
+    frame state, so a frame looks exactly like it would have sequentially.
+    """
+
+    def __init__(self, anim):
+        self.screen = anim.screen
+        self.bg_color = anim.bg_color
+        self.profiler = anim.profiler
+        self.objects = anim.objects
+        self.boundaries = [boundary.render_copy() for boundary in anim.boundaries]
+        self.trails = copy.copy(anim.trails)
+        # Renderers read radii and rotations of the world, the frame state has copies of both
+        self.world: FrameState | None = None
+        self.state: FrameState | None = None
+
+    def load(self, state: FrameState):
+        self.state = state
+        self.world = state
+        for boundary, boundary_state in zip(self.boundaries, state.boundary_states):
+            boundary.set_state(boundary_state)
+        if self.trails is not None and state.trail is not None:
+            self.trails.load(state.trail)
+
+    def render_array(self) -> np.ndarray:
+        return self.state.positions
+
+    def render_positions(self) -> list[Position]:
+        return [Position(x, y) for x, y in self.state.positions.tolist()]
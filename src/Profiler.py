@@ -0,0 +1,162 @@
+import csv
+import json
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+PERCENTILES = (50, 95, 99)
+_NO_PHASE = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "FrameProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter_ns() - self.start)
+
+
+class FrameProfiler:
+    """Times the phases of every frame and keeps the last `window` frames of each in a ring buffer
+
+    Time spent in a phase is summed over the frame, so several physics steps in one frame add up.
+    With verbose on, every object and boundary update and draw is timed too, grouped by class. Phases
+    may be timed on other threads than the one ending the frames, as the physics of a pipelined run are.
+    """
+
+    def __init__(self, window: int = 600, verbose: bool = False, hud: bool = False, hud_interval: int = 15):
+        self.window = window
+        self.verbose = verbose
+        self.hud = hud
+        # The HUD text is only rendered again every hud_interval frames
+        self.hud_interval = hud_interval
+        self.frames = 0
+        self.history: dict[str, np.ndarray] = {"total": np.zeros(window)}
+        self._current: dict[str, int] = {}
+        # Guards _current, phases of the simulation thread are added while the render thread ends a frame
+        self._lock = threading.Lock()
+        self._phases: dict[str, _Phase] = {}
+        self._last_frame = None
+        self._hud_surface = None
+        self._font = None
+
+    def phase(self, name: str) -> _Phase:
+        timer = self._phases.get(name)
+        if timer is None:
+            timer = self._phases[name] = _Phase(self, name)
+        return timer
+
+    def add(self, name: str, nanoseconds: int):
+        with self._lock:
+            self._current[name] = self._current.get(name, 0) + nanoseconds
+
+    def each(self, items: Iterable, label: str) -> Iterator:
+        # Times the loop body run for each item, the time between handing out one item and asking for the next
+        for item in items:
+            start = time.perf_counter_ns()
+            try:
+                yield item
+            finally:
+                self.add(f"{label} {type(item).__name__}", time.perf_counter_ns() - start)
+
+    def end_frame(self):
+        # The frame time is measured between calls, so it includes whatever no phase covers
+        now = time.perf_counter_ns()
+        slot = self.frames % self.window
+        with self._lock:
+            current, self._current = self._current, {}
+        if self._last_frame is not None:
+            current["total"] = now - self._last_frame
+        self._last_frame = now
+        for name, values in self.history.items():
+            values[slot] = current.pop(name, 0) / 1e6
+        for name, nanoseconds in current.items():
+            # Phase seen for the first time, earlier frames did not spend anything in it
+            values = self.history[name] = np.zeros(self.window)
+            values[slot] = nanoseconds / 1e6
+        self.frames += 1
+
+    def recent(self, name: str) -> np.ndarray:
+        # Milliseconds of the phase in the frames still in the window, oldest first
+        values = self.history[name]
+        if self.frames < self.window:
+            return values[: self.frames]
+        return np.roll(values, -(self.frames % self.window))
+
+    def histogram(self, name: str, bins: int = 20) -> tuple[np.ndarray, np.ndarray]:
+        return np.histogram(self.recent(name), bins=bins)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        stats = {}
+        for name in self.history:
+            values = self.recent(name)
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, PERCENTILES)
+            stats[name] = {
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(values.max()),
+            }
+        return stats
+
+    def to_csv(self, path: str | Path):
+        # One row per frame in the window, one column of milliseconds per phase
+        names = list(self.history)
+        columns = [self.recent(name) for name in names]
+        first = self.frames - len(columns[0])
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", *names])
+            for offset, row in enumerate(zip(*columns)):
+                writer.writerow([first + offset, *(f"{value:.4f}" for value in row)])
+
+    def to_json(self, path: str | Path):
+        with open(path, "w") as file:
+            json.dump({"frames": self.frames, "window": self.window, "phases": self.summary()}, file, indent=2)
+
+    def _render_hud(self) -> pygame.Surface:
+        if self._font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._font = pygame.font.Font(None, 18)
+        lines = [f"{'ms':18}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name[:18]:18}{stats['p50']:7.2f}{stats['p95']:7.2f}{stats['p99']:7.2f}")
+        rendered = [self._font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self._font.get_linesize()
+        surface = pygame.Surface((max(line.get_width() for line in rendered) + 8, line_height * len(lines) + 8))
+        surface.fill((20, 20, 20))
+        for i, line in enumerate(rendered):
+            surface.blit(line, (4, 4 + i * line_height))
+        return surface
+
+    def draw_hud(self, screen: pygame.Surface) -> pygame.Rect:
+        # The font has no fixed width, so the numbers only line up approximately
+        if self._hud_surface is None or self.frames % self.hud_interval == 0:
+            self._hud_surface = self._render_hud()
+        return screen.blit(self._hud_surface, (4, 4))
+
+
+def timed_each(profiler: FrameProfiler | None, items: Iterable, label: str) -> Iterable:
+    # Leaves the loop untouched unless a verbose profiler is attached
+    if profiler is None or not profiler.verbose:
+        return items
+    return profiler.each(items, label)
+
+
+def phase(profiler: FrameProfiler | None, name: str):
+    return _NO_PHASE if profiler is None else profiler.phase(name)
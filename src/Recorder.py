@@ -0,0 +1,167 @@
+import queue
+import subprocess
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pygame
+
+
+def pixel_format(surface: pygame.Surface) -> str:
+    """Raw pixel layout of a 32 bit surface in ffmpeg notation, e.g. bgr0 or rgba"""
+    if surface.get_bytesize() != 4:
+        raise ValueError("Only 32 bit surfaces can be recorded")
+    letters = ["0"] * 4
+    for letter, shift, mask in zip("rgba", surface.get_shifts(), surface.get_masks()):
+        if mask:
+            letters[shift // 8] = letter
+    if sys.byteorder == "big":
+        letters.reverse()
+    return "".join(letters)
+
+
+class FrameSink(ABC):
+    @abstractmethod
+    def open(self, width: int, height: int, pixel_format: str, fps: int): ...
+
+    @abstractmethod
+    def write(self, frame: memoryview): ...
+
+    @abstractmethod
+    def close(self): ...
+
+
+class RawSink(FrameSink):
+    """Writes the frames back to back as raw pixels, in the surface pixel format"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def open(self, width: int, height: int, pixel_format: str, fps: int):
+        self.file = open(self.path, "wb")
+
+    def write(self, frame: memoryview):
+        self.file.write(frame)
+
+    def close(self):
+        self.file.close()
+
+
+class Y4MSink(FrameSink):
+    """Writes a YUV4MPEG2 stream (4:4:4) that video tools can read without knowing the pixel format"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.channels = None
+        self.shape = None
+
+    def open(self, width: int, height: int, pixel_format: str, fps: int):
+        self.channels = [pixel_format.index(letter) for letter in "rgb"]
+        self.shape = (height, width, 4)
+        self.file = open(self.path, "wb")
+        self.file.write(f"YUV4MPEG2 W{width} H{height} F{fps}:1 Ip A1:1 C444\n".encode())
+
+    def write(self, frame: memoryview):
+        pixels = np.frombuffer(frame, dtype=np.uint8).reshape(self.shape).astype(np.float32)
+        r, g, b = (pixels[..., channel] for channel in self.channels)
+        # BT.601 limited range
+        y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+        u = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+        v = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+        self.file.write(b"FRAME\n")
+        self.file.write(np.stack((y, u, v)).round().astype(np.uint8).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+class EncoderSink(FrameSink):
+    """Streams raw frames into the stdin of an external encoder, ffmpeg by default"""
+
+    def __init__(self, output: str, command: list[str] | None = None):
+        self.output = output
+        self.command = command
+        self.process = None
+
+    def open(self, width: int, height: int, pixel_format: str, fps: int):
+        command = self.command or (
+            f"ffmpeg -loglevel error -y -f rawvideo -pix_fmt {pixel_format} -s {width}x{height} -r {fps} -i -".split()
+            + ["-c:v", "libx264", "-pix_fmt", "yuv420p", self.output]
+        )
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame: memoryview):
+        self.process.stdin.write(frame)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"Encoder exited with code {self.process.returncode}")
+
+
+class FrameRecorder:
+    """Copies every captured frame into a pooled buffer and hands it to a writer thread
+
+    The pool holds queue_size buffers. When all of them are waiting to be written, capture()
+    blocks until the writer catches up, or drops the frame if drop_frames is set.
+    """
+
+    def __init__(self, sink: FrameSink, fps: int = 60, queue_size: int = 8, drop_frames: bool = False):
+        self.sink = sink
+        self.fps = fps
+        self.queue_size = queue_size
+        self.drop_frames = drop_frames
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self._free: queue.Queue = queue.Queue()
+        self._pending: queue.Queue = queue.Queue()
+        self._thread = None
+        self._error = None
+
+    def start(self, surface: pygame.Surface):
+        width, height = surface.get_size()
+        self.sink.open(width, height, pixel_format(surface), self.fps)
+        frame_size = width * height * surface.get_bytesize()
+        for _ in range(self.queue_size):
+            self._free.put(bytearray(frame_size))
+        self._thread = threading.Thread(target=self._write_frames, name="FrameRecorder", daemon=True)
+        self._thread.start()
+
+    def capture(self, surface: pygame.Surface) -> bool:
+        if self._thread is None:
+            self.start(surface)
+        if self._error is not None:
+            raise self._error
+        try:
+            buffer = self._free.get(block=not self.drop_frames)
+        except queue.Empty:
+            self.frames_dropped += 1
+            return False
+        # A single copy straight out of the surface pixels, no intermediate bytes objects
+        with memoryview(surface.get_view("1")) as pixels:
+            buffer[:] = pixels
+        self._pending.put(buffer)
+        return True
+
+    def _write_frames(self):
+        while (buffer := self._pending.get()) is not None:
+            try:
+                if self._error is None:
+                    self.sink.write(memoryview(buffer))
+                    self.frames_written += 1
+            except Exception as error:
+                self._error = error
+            self._free.put(buffer)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._pending.put(None)
+        self._thread.join()
+        self._thread = None
+        self.sink.close()
+        if self._error is not None:
+            raise self._error
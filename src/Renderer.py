@@ -0,0 +1,194 @@
+import numpy as np
+import pygame
+
+from bootstrap import OBJECT_COLOR
+from Profiler import timed_each
+from SpriteCache import sprites
+
+
+def _object_arrays(anim) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Radii, rotations and which objects have an image, straight from the world arrays when there is one
+    if anim.world is not None:
+        radii, rotations = anim.world.radii, anim.world.rotations
+    else:
+        radii = np.array([obj.radius for obj in anim.objects], dtype=np.float64)
+        rotations = np.array([obj.rotation for obj in anim.objects], dtype=np.float64)
+    images = np.array([obj.image_path is not None for obj in anim.objects], dtype=bool)
+    return radii, rotations, images
+
+
+def _stamp_circles(screen: pygame.Surface, positions: np.ndarray, radii: np.ndarray, color):
+    # Sets the covered pixels of every circle directly, one fancy index assignment per radius
+    clip = screen.get_clip()
+    value = screen.map_rgb(color)
+    # Truncated towards zero like draw.circle does with its center
+    corners = positions.astype(np.intp)
+    pixels = pygame.surfarray.pixels2d(screen)
+    for radius in np.unique(radii).tolist():
+        dx, dy = sprites.circle_stamp(radius)
+        group = corners[radii == radius]
+        xs = (group[:, 0:1] + dx).ravel()
+        ys = (group[:, 1:2] + dy).ravel()
+        inside = (xs >= clip.left) & (xs < clip.right) & (ys >= clip.top) & (ys < clip.bottom)
+        pixels[xs[inside], ys[inside]] = value
+    del pixels
+
+
+def draw_batch(screen: pygame.Surface, anim, positions: np.ndarray, pixel_radius: float = 0.0):
+    """Draws all objects with one Surface.blits call, in the same order and pixels as one by one
+
+    Circles up to pixel_radius are written into the screen pixels first instead, which skips even the
+    blit, so they end up below larger circles and images.
+    """
+    if len(anim.objects) == 0:
+        return
+    radii, rotations, images = _object_arrays(anim)
+    plain = ~images
+    if pixel_radius > 0 and screen.get_bytesize() != 3:
+        # surfarray has no two dimensional view of 24 bit surfaces
+        tiny = plain & (radii <= pixel_radius)
+        if tiny.any():
+            _stamp_circles(screen, positions[tiny], radii[tiny], OBJECT_COLOR)
+            plain &= ~tiny
+    else:
+        tiny = np.zeros(len(radii), dtype=bool)
+
+    surfaces = np.empty(len(radii), dtype=object)
+    destinations = np.zeros((len(radii), 2), dtype=np.intp)
+    if plain.any():
+        sizes, which = np.unique(radii[plain], return_inverse=True)
+        circles = np.empty(len(sizes), dtype=object)
+        circles[:] = [sprites.circle(radius, OBJECT_COLOR) for radius in sizes.tolist()]
+        offsets = np.array([sprites.circle_offset(radius) for radius in sizes.tolist()], dtype=np.intp)
+        surfaces[plain] = circles[which]
+        destinations[plain] = positions[plain].astype(np.intp) - offsets[which, None]
+    for index in np.flatnonzero(images).tolist():
+        obj = anim.objects[index]
+        sprite = sprites.rotated(obj.image_path, int(2 * radii[index]), rotations[index])
+        surfaces[index] = sprite
+        destinations[index] = sprite.get_rect(center=tuple(positions[index].tolist())).topleft
+    drawn = ~tiny
+    screen.blits(zip(surfaces[drawn].tolist(), destinations[drawn].tolist()), doreturn=False)
+
+
+def batch_rects(anim, positions: np.ndarray) -> list[pygame.Rect]:
+    # BouncingCircle.bounding_rect for all objects at once
+    radii, _, images = _object_arrays(anim)
+    extents = radii * np.where(images, 1.5, 1.0) + 2
+    rows = np.column_stack([positions - extents[:, None], 2 * extents + 1, 2 * extents + 1])
+    return [pygame.Rect(row) for row in rows.tolist()]
+
+
+class Renderer:
+    """Clears and redraws the whole frame every time
+
+    Batched, objects are drawn together by draw_batch from the position arrays instead of one by one.
+    """
+
+    def __init__(self, batched: bool = False, pixel_radius: float = 0.0):
+        self.batched = batched
+        # Only used when batched, plain circles up to this radius are set pixel by pixel instead of blitted
+        self.pixel_radius = pixel_radius
+
+    def _draw_objects(self, anim, positions):
+        if self.batched:
+            draw_batch(anim.screen, anim, positions, self.pixel_radius)
+            return
+        # Rotations passed in, on the render thread the objects may already be a step further
+        _, rotations, _ = _object_arrays(anim)
+        for obj, position, rotation in zip(
+            timed_each(anim.profiler, anim.objects, "draw"), positions, rotations.tolist()
+        ):
+            obj.draw(anim.screen, position, rotation)
+
+    def _positions(self, anim):
+        return anim.render_array() if self.batched else anim.render_positions()
+
+    def draw(self, anim) -> list[pygame.Rect] | None:
+        # Returns the areas that changed, None when the whole screen did
+        screen = anim.screen
+        screen.fill(anim.bg_color)
+
+        for boundary in timed_each(anim.profiler, anim.boundaries, "draw"):
+            boundary.draw(screen)
+
+        if anim.trails is not None:
+            anim.trails.draw(screen)
+        self._draw_objects(anim, self._positions(anim))
+        return None
+
+
+class DirtyRectRenderer(Renderer):
+    """Only erases and redraws the areas around moving objects and changing boundaries
+
+    Static boundaries are drawn once into a cached background, which is also what moving
+    things are erased with.
+    """
+
+    def __init__(self, max_coverage: float = 0.5, batched: bool = False, pixel_radius: float = 0.0):
+        super().__init__(batched, pixel_radius)
+        self.background = None
+        # Above this share of the screen in dirty rects one full redraw is cheaper than many small ones
+        self.max_coverage = max_coverage
+        self.previous_rects: list[pygame.Rect] = []
+        self.previous_areas: list[pygame.Rect] = []
+
+    @staticmethod
+    def _absorb(rects: list[pygame.Rect], areas: list[pygame.Rect]) -> list[pygame.Rect]:
+        # Drops duplicates and rects lying inside a larger area that is redrawn anyway
+        kept = []
+        for rect in map(pygame.Rect, dict.fromkeys(tuple(rect) for rect in rects)):
+            if not any(area != rect and area.contains(rect) for area in areas):
+                kept.append(rect)
+        return kept
+
+    def _build_background(self, anim):
+        self.background = pygame.Surface(anim.screen.get_size())
+        self.background.fill(anim.bg_color)
+        for boundary in anim.boundaries:
+            if boundary.static:
+                boundary.draw(self.background)
+
+    def draw(self, anim) -> list[pygame.Rect] | None:
+        screen = anim.screen
+        full_redraw = self.background is None or self.background.get_size() != screen.get_size()
+        if full_redraw:
+            self._build_background(anim)
+
+        dynamic = [boundary for boundary in anim.boundaries if not boundary.static]
+        positions = self._positions(anim)
+        areas = [boundary.dirty_rect() or screen.get_rect() for boundary in dynamic]
+        if self.batched:
+            rects = areas + batch_rects(anim, positions)
+        else:
+            rects = areas + [obj.bounding_rect(position) for obj, position in zip(anim.objects, positions)]
+        if anim.trails is not None:
+            rects += anim.trails.rects()
+
+        screen_area = screen.get_width() * screen.get_height()
+        if full_redraw:
+            dirty = [screen.get_rect()]
+        else:
+            dirty = self._absorb(self.previous_rects + rects, self.previous_areas + areas)
+            if sum(rect.width * rect.height for rect in dirty) > self.max_coverage * screen_area:
+                full_redraw = True
+                dirty = [screen.get_rect()]
+        for rect in dirty:
+            screen.blit(self.background, rect, rect)
+        # Boundaries are only redrawn inside the erased areas, drawing them again elsewhere would thicken
+        # their outline because rasterization shifts slightly as they rotate
+        for rect in dirty:
+            screen.set_clip(rect)
+            for boundary in timed_each(anim.profiler, dynamic, "draw"):
+                if boundary.touches(rect):
+                    boundary.draw(screen)
+        screen.set_clip(None)
+        # Trails lie within their own rects, which were all erased above
+        if anim.trails is not None:
+            anim.trails.draw(screen)
+        # Every object is redrawn, it may overlap an erased area without having moved itself
+        self._draw_objects(anim, positions)
+
+        self.previous_rects = rects
+        self.previous_areas = areas
+        return None if full_redraw else dirty
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+from Boundary import BoundaryProtocol
+from helpers import Position, Vector
+from sweep import unit
+
+# Steps of conservative advancement per sweep, a ball still short of the wall after these stops where it got
+MARCH_STEPS = 16
+# Elements per chunk of the brute force row pass of the distance transform
+_CHUNK_ELEMENTS = 1 << 22
+
+
+def _column_distances(features: np.ndarray) -> np.ndarray:
+    # Rows to the nearest feature in the same column, scanning down and then up
+    height = len(features)
+    distances = np.where(features, 0.0, np.inf)
+    for row in range(1, height):
+        np.minimum(distances[row], distances[row - 1] + 1, out=distances[row])
+    for row in range(height - 2, -1, -1):
+        np.minimum(distances[row], distances[row + 1] + 1, out=distances[row])
+    return distances
+
+
+def distance_transform(features: np.ndarray) -> np.ndarray:
+    """Exact euclidean distance from every cell to the nearest True cell, in cells
+
+    Separable: distances along columns first, then the nearest of those along each row, which is done
+    by brute force over all pairs of columns in chunks of rows.
+    """
+    columns = _column_distances(features) ** 2
+    width = features.shape[1]
+    offsets = (np.arange(width)[:, None] - np.arange(width)[None, :]).astype(np.float64) ** 2
+    squared = np.empty(features.shape, dtype=np.float64)
+    rows = max(1, _CHUNK_ELEMENTS // (width * width))
+    for start in range(0, len(features), rows):
+        chunk = columns[start : start + rows]
+        squared[start : start + rows] = (offsets[None] + chunk[:, None, :]).min(axis=2)
+    return np.sqrt(squared)
+
+
+class SDFBoundary(BoundaryProtocol):
+    """Arena of any shape, taken from an image and baked once into a signed distance field
+
+    Balls move where the image is opaque, or bright for images without alpha, and bounce off the rest.
+    With invert the shape is an obstacle instead. The field is sampled at cell centers, distances are
+    in pixels and positive inside the arena, normals point from the arena towards the nearest wall.
+    Baked fields are kept in disk_cache, keyed by the hash of the image and the bake settings.
+    """
+
+    static = True
+
+    def __init__(
+        self,
+        image_path: str | Path,
+        center: Position,
+        size: tuple[int, int],
+        color,
+        thickness: int = 4,
+        cell_size: float = 2.0,
+        threshold: float = 0.5,
+        invert: bool = False,
+        disk_cache: str | Path | None = None,
+    ):
+        self.image_path = Path(image_path)
+        self.center = Position.parse(center)
+        self.size = (int(size[0]), int(size[1]))
+        self.color = color
+        self.thickness = thickness
+        self.cell_size = cell_size
+        self.threshold = threshold
+        self.invert = invert
+        self.disk_cache = Path(disk_cache) if disk_cache else None
+        self.out_of_boundaries = False
+        self.origin = np.array([self.center.x - self.size[0] / 2, self.center.y - self.size[1] / 2])
+        self.distances, self.normals = self._load()
+        self._outline = None
+
+    def _disk_path(self) -> Path | None:
+        if self.disk_cache is None:
+            return None
+        settings = json.dumps([self.size, self.cell_size, self.threshold, self.invert])
+        digest = hashlib.sha256(self.image_path.read_bytes() + settings.encode()).hexdigest()[:16]
+        return self.disk_cache / f"{self.image_path.stem}-{digest}.npz"
+
+    def _load(self) -> tuple[np.ndarray, np.ndarray]:
+        cached = self._disk_path()
+        if cached is not None and cached.exists():
+            with np.load(cached) as baked:
+                return baked["distances"], baked["normals"]
+        distances, normals = self._bake()
+        if cached is not None:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            np.savez_compressed(cached, distances=distances, normals=normals)
+        return distances, normals
+
+    def _mask(self) -> np.ndarray:
+        # One cell per cell_size pixels, True inside the arena, indexed [row, column]
+        cells = (max(1, round(self.size[0] / self.cell_size)), max(1, round(self.size[1] / self.cell_size)))
+        # SVGs are rasterized by SDL_image when loaded
+        image = pygame.transform.smoothscale(pygame.image.load(self.image_path), cells)
+        if image.get_flags() & pygame.SRCALPHA:
+            coverage = pygame.surfarray.array_alpha(image) / 255
+        else:
+            coverage = pygame.surfarray.array3d(image).mean(axis=2) / 255
+        return (coverage.T > self.threshold) != self.invert
+
+    def _bake(self) -> tuple[np.ndarray, np.ndarray]:
+        # Beyond the image is wall around an arena and open space around an obstacle
+        inside = np.pad(self._mask(), 1, constant_values=self.invert)
+        # The edge runs between cell centers, half a cell from the nearest cell on the other side
+        distances = np.where(inside, distance_transform(~inside) - 0.5, 0.5 - distance_transform(inside))[1:-1, 1:-1]
+        # Cells are square up to rounding
+        cells_x = self.size[0] / distances.shape[1]
+        cells_y = self.size[1] / distances.shape[0]
+        distances = distances * math.sqrt(cells_x * cells_y)
+        gradient_y, gradient_x = np.gradient(distances, cells_y, cells_x)
+        normals = -unit(np.column_stack([gradient_x.ravel(), gradient_y.ravel()])).reshape(*distances.shape, 2)
+        return distances.astype(np.float32), normals.astype(np.float32)
+
+    def _cells(self, positions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Top-left cell and bilinear weights of every position, clamped to the edge of the grid
+        height, width = self.distances.shape
+        scale = np.array([width / self.size[0], height / self.size[1]])
+        grid = (positions - self.origin) * scale - 0.5
+        grid = np.clip(grid, 0, [width - 1, height - 1])
+        low = np.minimum(grid.astype(np.intp), [width - 2, height - 2]).clip(0)
+        weights = grid - low
+        return low[:, 0], low[:, 1], weights[:, 0:1], weights[:, 1:2]
+
+    def _sample(self, field: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        column, row, wx, wy = self._cells(positions)
+        right = np.minimum(column + 1, field.shape[1] - 1)
+        below = np.minimum(row + 1, field.shape[0] - 1)
+        if field.ndim == 2:
+            wx, wy = wx[:, 0], wy[:, 0]
+        top = field[row, column] * (1 - wx) + field[row, right] * wx
+        bottom = field[below, column] * (1 - wx) + field[below, right] * wx
+        return top * (1 - wy) + bottom * wy
+
+    def _beyond(self, positions: np.ndarray) -> np.ndarray:
+        # Offset of every position from the image, zero inside of it
+        return positions - np.clip(positions, self.origin, self.origin + self.size)
+
+    def distance_many(self, positions: np.ndarray) -> np.ndarray:
+        distances = self._sample(self.distances, positions).astype(np.float64)
+        # Beyond the image only bounds are known, the shape lies somewhere inside of it
+        beyond = self._beyond(positions)
+        gaps = np.hypot(beyond[:, 0], beyond[:, 1])
+        sign = 1.0 if self.invert else -1.0
+        return np.where(gaps > 0, sign * np.maximum(gaps, sign * distances - gaps), distances)
+
+    def collision_check(self, position: Position, radius: float | None = None) -> bool:
+        buffer = 15 if radius is None else radius
+        return bool(self.distance_many(np.array([position.to_tuple()]))[0] > buffer)
+
+    def collision_check_many(self, positions: np.ndarray, radii: np.ndarray | None = None) -> np.ndarray:
+        buffer = 15 if radii is None else radii
+        return self.distance_many(positions) > buffer
+
+    def get_normal(self, position: Position) -> Vector:
+        return Vector(*self.get_normal_many(np.array([position.to_tuple()]))[0])
+
+    def get_normal_many(self, positions: np.ndarray) -> np.ndarray:
+        # Interpolated normals are shorter than one where neighbouring cells disagree
+        normals = self._sample(self.normals, positions).astype(np.float64)
+        # Beyond the image the nearest wall is the image itself for an obstacle, further out for an arena
+        beyond = self._beyond(positions)
+        outside = np.any(beyond != 0, axis=1)
+        normals[outside] = beyond[outside] * (-1.0 if self.invert else 1.0)
+        return unit(normals)
+
+    def time_of_impact_many(
+        self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float = 1.0
+    ) -> tuple[np.ndarray, np.ndarray, None]:
+        # Conservative advancement, a ball can move as far as the distance field says the nearest wall is
+        displacements = velocities * dt
+        lengths = np.hypot(displacements[:, 0], displacements[:, 1])
+        times = np.full(len(positions), np.inf)
+        normals = np.zeros((len(positions), 2))
+
+        gaps = self.distance_many(positions) - radii
+        # Already touching, only a hit while still moving towards the wall
+        touching = np.flatnonzero(gaps <= 0)
+        touching_normals = self.get_normal_many(positions[touching])
+        approaching = np.einsum("ij,ij->i", displacements[touching], touching_normals) > 0
+        times[touching[approaching]] = 0.0
+        normals[touching[approaching]] = touching_normals[approaching]
+
+        # Only balls that could reach a wall within the step are marched
+        marched = active = np.flatnonzero((gaps > 0) & (gaps < lengths))
+        progress = np.zeros(len(active))
+        for _ in range(MARCH_STEPS):
+            if len(active) == 0:
+                break
+            points = positions[active] + progress[:, None] * displacements[active]
+            gaps = self.distance_many(points) - radii[active]
+            arrived = gaps < 0.01
+            times[active[arrived]] = progress[arrived]
+            progress += np.maximum(gaps, 0) / lengths[active]
+            moving = ~arrived & (progress < 1)
+            active, progress = active[moving], progress[moving]
+        # Still closing in on a wall after MARCH_STEPS, counted as touching it where it got to
+        times[active] = progress
+        hit = marched[np.isfinite(times[marched])]
+        normals[hit] = self.get_normal_many(positions[hit] + times[hit, None] * displacements[hit])
+        return times, normals, None
+
+    def _render_outline(self) -> pygame.Surface:
+        # Band around the zero level of the field, antialiased by how far each pixel is from it
+        width, height = self.size
+        xs, ys = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+        pixels = np.column_stack([xs.ravel(), ys.ravel()]) + self.origin
+        distances = np.abs(self.distance_many(pixels)).reshape(height, width)
+        coverage = np.clip(self.thickness / 2 + 0.5 - distances, 0, 1)
+        surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        surface.fill(self.color)
+        pygame.surfarray.pixels_alpha(surface)[:] = (coverage.T * 255).astype(np.uint8)
+        return surface
+
+    def draw(self, screen):
+        if self._outline is None:
+            self._outline = self._render_outline()
+        screen.blit(self._outline, self.origin.tolist())
+
+    def update(self, dt: float = 1.0):
+        pass
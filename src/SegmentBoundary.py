@@ -0,0 +1,271 @@
+import copy
+
+import numpy as np
+import pygame
+
+from AABBTree import AABBTree
+from Boundary import BoundaryProtocol
+from helpers import Position, Vector
+from sweep import nearest_points, segment_entry_time, unit
+
+
+class SegmentBoundary(BoundaryProtocol):
+    """Walls made of line segments, added piece by piece as segments, polylines, polygons and round pegs
+
+    Every segment is a capsule as wide as its line, balls bounce off either side of it, so polygons work
+    the same convex or concave and with balls inside or outside of them. Each piece can rotate around
+    its own pivot. All segments sit in one AABBTree and balls are only tested against the ones near
+    their path. Rotating pieces make the whole boundary dynamic for the renderers, fixed walls are best
+    kept in a boundary of their own so they can be drawn into the cached background.
+    """
+
+    def __init__(self, color, thickness: float = 4):
+        self.color = color
+        self.thickness = thickness
+        self.out_of_boundaries = False
+        # Per segment, relative to the pivot of its piece
+        self._local_starts = np.zeros((0, 2), dtype=np.float64)
+        self._local_ends = np.zeros((0, 2), dtype=np.float64)
+        self._pieces = np.zeros(0, dtype=np.intp)
+        self._half_widths = np.zeros(0, dtype=np.float64)
+        # Per piece, angles and rotation speeds in degrees, clockwise on screen
+        self.pivots = np.zeros((0, 2), dtype=np.float64)
+        self.angles = np.zeros(0, dtype=np.float64)
+        self.rotation_speeds = np.zeros(0, dtype=np.float64)
+        self._ranges: list[tuple[int, int, bool]] = []  # first segment, end segment, closed
+        self.starts = np.zeros((0, 2), dtype=np.float64)
+        self.ends = np.zeros((0, 2), dtype=np.float64)
+        self._tree = None
+        # Fastest any point of a rotating piece moves, in pixels per tick
+        self._surface_speed = 0.0
+
+    def add_polyline(
+        self,
+        points,
+        closed: bool = False,
+        thickness: float | None = None,
+        rotation_speed: float = 0.0,
+        pivot: Position | None = None,
+    ):
+        vertices = np.array([Position.parse(point).to_tuple() for point in points], dtype=np.float64).reshape(-1, 2)
+        if len(vertices) == 0:
+            raise ValueError("A piece needs at least one point")
+        # Rotates around the middle of its vertices unless told otherwise
+        center = np.array(Position.parse(pivot).to_tuple()) if pivot is not None else vertices.mean(axis=0)
+        starts = vertices if closed and len(vertices) > 2 else vertices[:-1]
+        ends = np.roll(vertices, -1, axis=0)[: len(starts)]
+        if len(vertices) == 1:
+            # A single point is a round peg
+            starts = ends = vertices
+
+        first = len(self._pieces)
+        piece = len(self.angles)
+        self._local_starts = np.concatenate([self._local_starts, starts - center])
+        self._local_ends = np.concatenate([self._local_ends, ends - center])
+        self._pieces = np.concatenate([self._pieces, np.full(len(starts), piece)])
+        width = self.thickness if thickness is None else thickness
+        self._half_widths = np.concatenate([self._half_widths, np.full(len(starts), width / 2)])
+        self.pivots = np.concatenate([self.pivots, center[None]])
+        self.angles = np.append(self.angles, 0.0)
+        self.rotation_speeds = np.append(self.rotation_speeds, float(rotation_speed))
+        self._ranges.append((first, len(self._pieces), closed and len(vertices) > 2))
+        self._place()
+        self._tree = None
+        return self
+
+    def add_segment(self, start: Position, end: Position, **kwargs):
+        return self.add_polyline([start, end], **kwargs)
+
+    def add_polygon(self, points, **kwargs):
+        return self.add_polyline(points, closed=True, **kwargs)
+
+    def add_peg(self, center: Position, radius: float, **kwargs):
+        return self.add_polyline([center], thickness=2 * radius, **kwargs)
+
+    @property
+    def static(self) -> bool:
+        return not self.rotation_speeds.any()
+
+    def _place(self):
+        # World coordinates of every segment from the current angle of its piece
+        angles = np.radians(self.angles[self._pieces])
+        cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+        pivots = self.pivots[self._pieces]
+        x, y = self._local_starts[:, 0:1], self._local_starts[:, 1:2]
+        self.starts = pivots + np.hstack([x * cos - y * sin, x * sin + y * cos])
+        x, y = self._local_ends[:, 0:1], self._local_ends[:, 1:2]
+        self.ends = pivots + np.hstack([x * cos - y * sin, x * sin + y * cos])
+
+    def _bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        half_widths = self._half_widths[:, None]
+        return np.minimum(self.starts, self.ends) - half_widths, np.maximum(self.starts, self.ends) + half_widths
+
+    def _index(self) -> AABBTree:
+        if self._tree is None:
+            self._tree = AABBTree(*self._bounds())
+            extent = np.maximum(
+                np.hypot(self._local_starts[:, 0], self._local_starts[:, 1]),
+                np.hypot(self._local_ends[:, 0], self._local_ends[:, 1]),
+            )
+            speeds = np.abs(np.radians(self.rotation_speeds[self._pieces])) * extent
+            self._surface_speed = float(speeds.max(initial=0.0))
+        return self._tree
+
+    def _surface_velocities(self, points: np.ndarray, pieces: np.ndarray) -> np.ndarray:
+        # Every piece turns rigidly, a point moves perpendicular to its offset from the pivot
+        offsets = points - self.pivots[pieces]
+        speeds = np.radians(self.rotation_speeds[pieces])[:, None]
+        return speeds * np.column_stack([-offsets[:, 1], offsets[:, 0]])
+
+    def _distances(self, positions: np.ndarray, margins: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (position, segment) pairs within margin of each other, with the distance between them
+        queries, segments = self._index().query(positions - margins[:, None], positions + margins[:, None])
+        points = positions[queries]
+        nearest = nearest_points(points, self.starts[segments], self.ends[segments])
+        distances = np.hypot(*(points - nearest).T) - self._half_widths[segments]
+        return queries, segments, distances
+
+    def collision_check(self, position: Position, radius: float | None = None) -> bool:
+        return bool(self.collision_check_many(np.array([position.to_tuple()]), None if radius is None else [radius])[0])
+
+    def collision_check_many(self, positions: np.ndarray, radii: np.ndarray | None = None) -> np.ndarray:
+        buffer = np.broadcast_to(15.0 if radii is None else np.asarray(radii, dtype=np.float64), len(positions))
+        clear = np.ones(len(positions), dtype=bool)
+        if len(self._pieces) == 0:
+            return clear
+        queries, _, distances = self._distances(positions, buffer)
+        clear[queries[distances < buffer[queries]]] = False
+        return clear
+
+    def get_normal(self, position: Position) -> Vector:
+        return Vector(*self.get_normal_many(np.array([position.to_tuple()]))[0])
+
+    def get_normal_many(self, positions: np.ndarray) -> np.ndarray:
+        # Away from the nearest segment, searched in a window that doubles until it surely holds it
+        normals = unit(np.zeros((len(positions), 2)))
+        if len(self._pieces) == 0:
+            return normals
+        widest = float(self._half_widths.max())
+        limit = float(np.hypot(*np.ptp(np.concatenate([*self._bounds(), positions]), axis=0))) + widest
+        pending = np.arange(len(positions))
+        reach = widest + 32
+        while len(pending) > 0:
+            queries, segments, distances = self._distances(positions[pending], np.full(len(pending), reach))
+            best = np.full(len(pending), np.inf)
+            np.minimum.at(best, queries, distances)
+            # A segment outside the window is at least reach - widest away
+            settled = (best <= reach - widest) | (reach > limit)
+            chosen = (distances == best[queries]) & settled[queries]
+            points = positions[pending[queries[chosen]]]
+            segments = segments[chosen]
+            normals[pending[queries[chosen]]] = unit(
+                points - nearest_points(points, self.starts[segments], self.ends[segments])
+            )
+            pending = pending[~settled]
+            reach *= 2
+        return normals
+
+    def time_of_impact_many(
+        self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float = 1.0
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+        times = np.full(len(positions), np.inf)
+        normals = np.zeros((len(positions), 2))
+        surfaces = None if self.static else np.zeros((len(positions), 2))
+        if len(self._pieces) == 0:
+            return times, normals, surfaces
+
+        # Box around the path of each ball, grown by how far a rotating wall can move meanwhile
+        displacements = velocities * dt
+        tree = self._index()
+        margin = (radii + self._surface_speed * dt)[:, None]
+        balls, segments = tree.query(
+            np.minimum(positions, positions + displacements) - margin,
+            np.maximum(positions, positions + displacements) + margin,
+        )
+        starts, ends = self.starts[segments], self.ends[segments]
+        points = positions[balls]
+        relative = displacements[balls]
+        if surfaces is not None:
+            # Swept against the wall as if it were standing still, with the ball moving relative to it
+            wall = self._surface_velocities(nearest_points(points, starts, ends), self._pieces[segments])
+            relative = relative - wall * dt
+        pair_times = segment_entry_time(points, relative, starts, ends, radii[balls] + self._half_widths[segments])
+        hit = np.isfinite(pair_times)
+        balls, segments, pair_times = balls[hit], segments[hit], pair_times[hit]
+        starts, ends, points, relative = starts[hit], ends[hit], points[hit], relative[hit]
+
+        np.minimum.at(times, balls, pair_times)
+        first = pair_times == times[balls]
+        contacts = points[first] + pair_times[first, None] * relative[first]
+        on_wall = nearest_points(contacts, starts[first], ends[first])
+        normals[balls[first]] = unit(contacts - on_wall)
+        if surfaces is not None:
+            surfaces[balls[first]] = self._surface_velocities(on_wall, self._pieces[segments[first]])
+        return times, normals, surfaces
+
+    def disturbs_many(self, positions: np.ndarray, radii: np.ndarray, dt: float = 1.0) -> np.ndarray:
+        # Resting balls within reach of a rotating piece are woken up before it runs into them
+        disturbed = np.zeros(len(positions), dtype=bool)
+        if self.static:
+            return disturbed
+        self._index()
+        queries, segments, distances = self._distances(positions, radii + self._surface_speed * dt + 1)
+        rotating = self.rotation_speeds[self._pieces[segments]] != 0
+        disturbed[queries[rotating & (distances < radii[queries] + self._surface_speed * dt + 1)]] = True
+        return disturbed
+
+    def draw(self, screen):
+        for first, end, closed in self._ranges:
+            width = int(round(2 * self._half_widths[first]))
+            points = self.starts[first:end].tolist()
+            if not closed:
+                points.append(self.ends[end - 1].tolist())
+            if closed or len(points) > 2 or points[0] != points[-1]:
+                pygame.draw.lines(screen, self.color, closed, points, width)
+            # Round joints and ends, like the capsules balls bounce off
+            for point in points:
+                pygame.draw.circle(screen, self.color, point, width / 2)
+
+    def dirty_rect(self) -> pygame.Rect | None:
+        rotating = self.rotation_speeds[self._pieces] != 0
+        if not rotating.any():
+            return None
+        lower, upper = self._bounds()
+        left, top = np.floor(lower[rotating].min(axis=0) - 1)
+        right, bottom = np.ceil(upper[rotating].max(axis=0) + 1)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def touches(self, rect: pygame.Rect) -> bool:
+        if len(self._pieces) == 0:
+            return False
+        tree = self._index()
+        # Most rects are nowhere near the walls, the box around all of them settles those without a query
+        (left, top), (right, bottom) = tree.node_lower[0].tolist(), tree.node_upper[0].tolist()
+        if rect.right < left or rect.left - 1 > right or rect.bottom < top or rect.top - 1 > bottom:
+            return False
+        queries, _ = tree.query(np.array([[rect.left - 1, rect.top - 1]]), np.array([[rect.right, rect.bottom]]))
+        return len(queries) > 0
+
+    def get_state(self) -> tuple[float, ...]:
+        return float(self.out_of_boundaries), *self.angles.tolist()
+
+    def set_state(self, state: tuple[float, ...]):
+        self.out_of_boundaries = bool(state[0])
+        self.angles[:] = state[1:]
+        self._place()
+        if self._tree is not None:
+            self._tree.refit(*self._bounds())
+
+    def render_copy(self) -> BoundaryProtocol:
+        drawn = copy.copy(self)
+        # set_state writes the angles in place and refits the tree, neither may be shared
+        drawn.angles = self.angles.copy()
+        drawn._tree = None
+        return drawn
+
+    def update(self, dt: float = 1.0):
+        if self.static:
+            return
+        self.angles = (self.angles + self.rotation_speeds * dt) % 360
+        self._place()
+        self._index().refit(*self._bounds())
@@ -0,0 +1,230 @@
+import os
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pygame
+
+from Recorder import pixel_format
+
+# Header fields, int64 each, followed by the state length of every boundary
+MAGIC, SLOTS, CAPACITY, BOUNDARIES, STATE_SIZE, WIDTH, HEIGHT, PIXEL_BYTES, PIXEL_FORMAT, LATEST, CREATOR = range(11)
+HEADER_SIZE = 11
+# Written last, the header is complete once the block starts with it
+MAGIC_NUMBER = int.from_bytes(b"bbstate2", "little")
+# Fields at the start of every slot, int64 each
+SEQUENCE, FRAME, STEP, COUNT = range(4)
+SLOT_HEADER_SIZE = 4
+
+
+@dataclass
+class SharedFrame:
+    frame: int
+    step: int
+    positions: np.ndarray
+    velocities: np.ndarray
+    boundary_states: list[tuple[float, ...]]
+    # Raw pixels of the rendered frame in pixel_format, None when nothing is drawn
+    pixels: np.ndarray | None
+    width: int
+    height: int
+    pixel_format: str
+
+
+class _Layout:
+    # Views on the shared block, the same for the writer and every reader
+    def __init__(self, buffer, header: np.ndarray):
+        self.header = header
+        slots, capacity, boundaries, state_size, pixel_bytes = (
+            int(header[field]) for field in (SLOTS, CAPACITY, BOUNDARIES, STATE_SIZE, PIXEL_BYTES)
+        )
+        self.state_lengths = np.ndarray(boundaries, dtype=np.int64, buffer=buffer, offset=HEADER_SIZE * 8)
+        offset = (HEADER_SIZE + boundaries) * 8
+        self.slot_headers, self.positions, self.velocities, self.states, self.pixels = [], [], [], [], []
+        for _ in range(slots):
+            for views, shape, dtype in (
+                (self.slot_headers, (SLOT_HEADER_SIZE,), np.int64),
+                (self.positions, (capacity, 2), np.float64),
+                (self.velocities, (capacity, 2), np.float64),
+                (self.states, (state_size,), np.float64),
+                (self.pixels, (pixel_bytes,), np.uint8),
+            ):
+                views.append(np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset))
+                # Every array starts on 8 bytes
+                offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8
+
+    @staticmethod
+    def size(slots: int, capacity: int, boundaries: int, state_size: int, pixel_bytes: int) -> int:
+        slot = SLOT_HEADER_SIZE * 8 + 2 * capacity * 2 * 8 + state_size * 8 + -(-pixel_bytes // 8) * 8
+        return (HEADER_SIZE + boundaries) * 8 + slots * slot
+
+
+class SharedStateWriter:
+    """Publishes every frame into a ring of slots in shared memory, for readers in other processes
+
+    A slot holds the object positions and velocities, the state of every boundary and the pixels of the
+    rendered frame. Its sequence counter is odd while the slot is written, readers copy a slot and keep the
+    copy only if the counter was even and unchanged around it, so neither side ever waits for the other.
+    The block is created on the first publish, sized for the objects and boundaries of that frame, and
+    removed by close().
+    """
+
+    def __init__(self, name: str | None = None, slots: int = 4, pixels: bool = True):
+        self.name = name
+        self.slots = slots
+        # Copying the screen is most of the cost of a publish
+        self.pixels = pixels
+        self.frames_published = 0
+        self._memory = None
+        self._layout = None
+
+    def start(self, capacity: int, state_lengths: list[int], screen: pygame.Surface | None):
+        width, height = screen.get_size() if screen is not None and self.pixels else (0, 0)
+        pixel_bytes = width * height * screen.get_bytesize() if width else 0
+        state_size = sum(state_lengths)
+        size = _Layout.size(self.slots, capacity, len(state_lengths), state_size, pixel_bytes)
+        self._memory = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.name = self._memory.name
+        header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=self._memory.buf)
+        header[:] = 0
+        header[[SLOTS, CAPACITY, BOUNDARIES, STATE_SIZE, WIDTH, HEIGHT, PIXEL_BYTES, CREATOR]] = (
+            self.slots,
+            capacity,
+            len(state_lengths),
+            state_size,
+            width,
+            height,
+            pixel_bytes,
+            os.getpid(),
+        )
+        if pixel_bytes:
+            header[PIXEL_FORMAT] = int.from_bytes(pixel_format(screen).encode(), "little")
+        self._layout = _Layout(self._memory.buf, header)
+        self._layout.state_lengths[:] = state_lengths
+        header[MAGIC] = MAGIC_NUMBER
+
+    def publish(
+        self,
+        frame: int,
+        step: int,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        boundary_states: list[tuple[float, ...]],
+        screen: pygame.Surface | None = None,
+    ):
+        if self._memory is None:
+            self.start(len(positions), [len(state) for state in boundary_states], screen)
+        layout = self._layout
+        count = len(positions)
+        if count > len(layout.positions[0]):
+            raise ValueError(f"{count} objects do not fit the {len(layout.positions[0])} the shared state was made for")
+        slot = frame % self.slots
+        slot_header = layout.slot_headers[slot]
+        slot_header[SEQUENCE] += 1
+        slot_header[FRAME] = frame
+        slot_header[STEP] = step
+        slot_header[COUNT] = count
+        layout.positions[slot][:count] = positions
+        layout.velocities[slot][:count] = velocities
+        if len(layout.states[slot]):
+            layout.states[slot][:] = np.concatenate(boundary_states)
+        if len(layout.pixels[slot]) and screen is not None:
+            with memoryview(screen.get_view("1")) as pixels:
+                layout.pixels[slot][:] = np.frombuffer(pixels, dtype=np.uint8)
+        slot_header[SEQUENCE] += 1
+        layout.header[LATEST] = frame
+        self.frames_published += 1
+
+    def close(self):
+        if self._memory is None:
+            return
+        self._layout = None
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+
+class SharedStateReader:
+    """Reads the frames a SharedStateWriter publishes, from any process, without locking"""
+
+    def __init__(self, name: str, retries: int = 100, timeout: float = 1.0):
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, track=False)
+            registered = False
+        except TypeError:
+            # Before Python 3.13 attaching registers the block too
+            self._memory = shared_memory.SharedMemory(name=name)
+            registered = True
+        self.retries = retries
+        header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=self._memory.buf)
+        # The writer may still be filling in the header of a block it just created
+        deadline = time.monotonic() + timeout
+        while header[MAGIC] != MAGIC_NUMBER:
+            if time.monotonic() > deadline:
+                del header
+                if registered:
+                    resource_tracker.unregister(self._memory._name, "shared_memory")
+                self._memory.close()
+                raise ValueError(f"{name} is not shared state of a SharedStateWriter")
+            time.sleep(0.001)
+        if registered and int(header[CREATOR]) != os.getpid():
+            # The tracker of another process would remove the block when that process exits, although the
+            # writer still owns it. In the writer's own process it is the same registration, which the
+            # writer drops itself when it removes the block
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+        self._layout = _Layout(self._memory.buf, header)
+        self.slots = int(header[SLOTS])
+        self.width, self.height = int(header[WIDTH]), int(header[HEIGHT])
+        self.pixel_format = int(header[PIXEL_FORMAT]).to_bytes(4, "little").decode() if header[PIXEL_BYTES] else ""
+        self._splits = np.cumsum(self._layout.state_lengths)[:-1]
+        self._boundaries = int(header[BOUNDARIES])
+
+    @property
+    def latest_frame(self) -> int:
+        return int(self._layout.header[LATEST])
+
+    def read(self, frame: int | None = None) -> SharedFrame | None:
+        """The given frame, by default the latest one, None if it was overwritten or is being written"""
+        wanted = frame
+        frame = self.latest_frame if frame is None else frame
+        if frame <= 0:
+            return None
+        layout = self._layout
+        slot = frame % self.slots
+        slot_header = layout.slot_headers[slot]
+        for _ in range(self.retries):
+            before = int(slot_header[SEQUENCE])
+            if before % 2:
+                continue
+            count = int(slot_header[COUNT])
+            copied = SharedFrame(
+                frame=int(slot_header[FRAME]),
+                step=int(slot_header[STEP]),
+                positions=layout.positions[slot][:count].copy(),
+                velocities=layout.velocities[slot][:count].copy(),
+                boundary_states=[tuple(state.tolist()) for state in np.split(layout.states[slot], self._splits)][
+                    : self._boundaries
+                ],
+                pixels=layout.pixels[slot].copy() if len(layout.pixels[slot]) else None,
+                width=self.width,
+                height=self.height,
+                pixel_format=self.pixel_format,
+            )
+            if int(slot_header[SEQUENCE]) == before:
+                # The writer may have gone round the ring since, the latest frame is then an even later one
+                return copied if wanted is None or copied.frame == wanted else None
+        return None
+
+    def wait(self, after: int, timeout: float | None = None, interval: float = 0.001) -> SharedFrame | None:
+        # Polls until a frame later than after is published, then reads the latest one
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.latest_frame <= after:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(interval)
+        return self.read()
+
+    def close(self):
+        self._layout = None
+        self._memory.close()
@@ -0,0 +1,109 @@
+import numpy as np
+
+# Half of the 3x3 neighbourhood, so every pair of neighbouring cells is visited from one side only
+NEIGHBOUR_OFFSETS = ((1, -1), (1, 0), (1, 1), (0, 1))
+FULL_NEIGHBOURHOOD = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Turn per-row (start, count) ranges into flat (row, column) index pairs without a Python loop
+    total = int(counts.sum())
+    rows = np.repeat(np.arange(len(starts)), counts)
+    columns = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return rows, columns
+
+
+class SpatialHash:
+    """Uniform grid broad phase that reports every candidate contact pair exactly once
+
+    Objects of very different sizes are split into levels of power-of-two cell sizes, so one large object
+    does not blow up the cells of all the small ones. Each level is paired with itself and with every
+    smaller level.
+    """
+
+    def __init__(self, cell_size: float | None = None):
+        # Without a fixed cell size the grid is sized from the radii on every rebuild
+        self.cell_size = cell_size
+        self._order = np.empty(0, dtype=np.intp)
+
+    def _sort(self, keys: np.ndarray) -> np.ndarray:
+        # Objects rarely change cell between steps, so sorting the previous order is almost linear
+        if len(self._order) != len(keys):
+            self._order = np.argsort(keys, kind="stable")
+        else:
+            self._order = self._order[np.argsort(keys[self._order], kind="stable")]
+        return self._order
+
+    @staticmethod
+    def _keys(cells: np.ndarray, height: int) -> np.ndarray:
+        return cells[:, 0] * height + cells[:, 1]
+
+    @staticmethod
+    def _neighbours(
+        sorted_keys: np.ndarray, queries: np.ndarray, height: int, offsets
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # Every (query, sorted position) pair whose cells are offset by one of offsets
+        first, second = [], []
+        for dx, dy in offsets:
+            target = queries + dx * height + dy
+            start = np.searchsorted(sorted_keys, target, side="left")
+            end = np.searchsorted(sorted_keys, target, side="right")
+            rows, columns = _expand(start, end - start)
+            first.append(rows)
+            second.append(columns)
+        return np.concatenate(first), np.concatenate(second)
+
+    def _grid_pairs(self, keys: np.ndarray, height: int, order: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        sorted_keys = keys[order]
+        index = np.arange(len(sorted_keys))
+
+        # Pairs inside the same cell, each object only looks at the ones sorted after it
+        cell_end = np.searchsorted(sorted_keys, sorted_keys, side="right")
+        rows, columns = _expand(index + 1, cell_end - index - 1)
+        neighbour_rows, neighbour_columns = self._neighbours(sorted_keys, sorted_keys, height, NEIGHBOUR_OFFSETS)
+        return order[np.concatenate([rows, neighbour_rows])], order[np.concatenate([columns, neighbour_columns])]
+
+    def pairs(self, positions: np.ndarray, radii: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if len(positions) < 2:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        smallest = self.cell_size or max(2 * float(radii.min()), 1.0)
+        # Level of the cell size smallest * 2**level an object fits in, with a fixed cell size there is one level
+        levels = np.zeros(len(radii), dtype=np.int64)
+        if self.cell_size is None:
+            levels = np.maximum(np.ceil(np.log2(np.maximum(2 * radii, smallest) / smallest)), 0).astype(np.int64)
+        low = positions.min(axis=0)
+
+        if levels.max() == 0:
+            cells = np.floor((positions - low) / smallest).astype(np.int64) + 1
+            # Pad by one cell on every side so neighbour keys never wrap into another column
+            height = int(cells[:, 1].max()) + 2
+            keys = self._keys(cells, height)
+            i, j = self._grid_pairs(keys, height, self._sort(keys))
+            return np.minimum(i, j), np.maximum(i, j)
+
+        first, second = [], []
+        for level in np.unique(levels).tolist():
+            cell_size = smallest * 2**level
+            members = np.flatnonzero(levels == level)
+            smaller = np.flatnonzero(levels < level)
+            cells = np.floor((positions - low) / cell_size).astype(np.int64) + 1
+            height = int(cells[:, 1].max()) + 2
+            keys = self._keys(cells, height)
+
+            member_keys = keys[members]
+            order = np.argsort(member_keys, kind="stable")
+            i, j = self._grid_pairs(member_keys, height, order)
+            first.append(members[i])
+            second.append(members[j])
+            if len(smaller) > 0:
+                # Smaller objects are looked up from the larger side in the whole 3x3 neighbourhood
+                smaller_keys = keys[smaller]
+                smaller_order = np.argsort(smaller_keys, kind="stable")
+                rows, columns = self._neighbours(smaller_keys[smaller_order], member_keys, height, FULL_NEIGHBOURHOOD)
+                first.append(members[rows])
+                second.append(smaller[smaller_order[columns]])
+
+        i = np.concatenate(first)
+        j = np.concatenate(second)
+        return np.minimum(i, j), np.maximum(i, j)
@@ -0,0 +1,102 @@
+import hashlib
+import math
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+
+class SpriteCache:
+    """Rasterizes every (path, size) once and serves quantized rotations of it from an LRU cache"""
+
+    def __init__(self, rotation_steps: int = 360, max_rotations: int = 4096, disk_cache: str | Path | None = None):
+        self.rotation_steps = rotation_steps
+        self.max_rotations = max_rotations
+        # Optional folder for rasterized images, so SVGs are only rendered once across runs
+        self.disk_cache = Path(disk_cache) if disk_cache else None
+        self._images: dict[tuple[str, int], pygame.Surface] = {}
+        self._rotations: OrderedDict[tuple[str, int, int], pygame.Surface] = OrderedDict()
+        self._circles: dict[tuple[float, tuple[int, ...]], pygame.Surface] = {}
+        self._stamps: dict[float, tuple[np.ndarray, np.ndarray]] = {}
+
+    def _disk_path(self, path: str, size: int) -> Path | None:
+        if self.disk_cache is None:
+            return None
+        digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+        return self.disk_cache / f"{Path(path).stem}-{digest}-{size}.png"
+
+    def _load(self, path: str, size: int) -> pygame.Surface:
+        cached = self._disk_path(path, size)
+        if cached is not None and cached.exists():
+            image = pygame.image.load(cached)
+        else:
+            # SVGs are rasterized by SDL_image when loaded
+            image = pygame.transform.smoothscale(pygame.image.load(path), (size, size))
+            if cached is not None:
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                pygame.image.save(image, cached)
+        # Matching the display pixel format makes every later blit cheaper, headless runs have no display
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        return image
+
+    def image(self, path: str, size: int) -> pygame.Surface:
+        key = (str(path), int(size))
+        image = self._images.get(key)
+        if image is None:
+            image = self._images[key] = self._load(*key)
+        return image
+
+    def rotated(self, path: str, size: int, angle: float) -> pygame.Surface:
+        step = round(angle % 360 * self.rotation_steps / 360) % self.rotation_steps
+        key = (str(path), int(size), step)
+        surface = self._rotations.get(key)
+        if surface is not None:
+            self._rotations.move_to_end(key)
+            return surface
+
+        surface = pygame.transform.rotate(self.image(path, size), step * 360 / self.rotation_steps)
+        self._rotations[key] = surface
+        if len(self._rotations) > self.max_rotations:
+            self._rotations.popitem(last=False)
+        return surface
+
+    @staticmethod
+    def circle_offset(radius: float) -> int:
+        # Circle sprites are drawn around this pixel, blitted that far up and left of the center truncated to
+        # whole pixels they match draw.circle
+        return math.ceil(radius)
+
+    def circle(self, radius: float, color) -> pygame.Surface:
+        key = (float(radius), tuple(color))
+        surface = self._circles.get(key)
+        if surface is None:
+            offset = self.circle_offset(radius)
+            surface = pygame.Surface((2 * offset + 1, 2 * offset + 1))
+            # Any color other than the circle's works as the transparent one
+            key_color = (0, 0, 0) if tuple(color[:3]) != (0, 0, 0) else (255, 255, 255)
+            surface.fill(key_color)
+            pygame.draw.circle(surface, color, (offset, offset), radius)
+            surface.set_colorkey(key_color, pygame.RLEACCEL)
+            self._circles[key] = surface
+        return surface
+
+    def circle_stamp(self, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        # Pixels covered by a circle, as offsets from its center truncated to whole pixels
+        stamp = self._stamps.get(float(radius))
+        if stamp is None:
+            offset = self.circle_offset(radius)
+            # White on black, the black background is the only zero in the pixels
+            xs, ys = np.nonzero(pygame.surfarray.array2d(self.circle(radius, (255, 255, 255))))
+            stamp = self._stamps[float(radius)] = xs - offset, ys - offset
+        return stamp
+
+    def precompute(self, path: str, size: int):
+        # Builds the whole rotation atlas up front instead of lazily during the first turn
+        for step in range(self.rotation_steps):
+            self.rotated(path, size, step * 360 / self.rotation_steps)
+
+
+# Shared by all objects, so every image is loaded and rotated only once per process
+sprites = SpriteCache()
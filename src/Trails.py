@@ -0,0 +1,100 @@
+import numpy as np
+import pygame
+
+
+class TrailBuffer:
+    """Recent positions of all objects in one fixed-size ring buffer, drawn in a few alpha bands
+
+    The trail of the prototype in trys/2.py fades in alpha and width along its length. Here the
+    length is split into bands of constant alpha and width, all bands are drawn onto one black layer
+    with their color premultiplied by their alpha, which is then added onto the screen in one blit.
+    """
+
+    def __init__(
+        self,
+        length: int = 20,
+        color: tuple[int, int, int] = (230, 0, 115),
+        width: float = 8,
+        bands: int = 4,
+        max_alpha: int = 85,
+    ):
+        self.length = length
+        self.color = color
+        self.width = width
+        self.bands = min(bands, length - 1)
+        self.max_alpha = max_alpha
+        self.count = 0
+        self.head = 0
+        self.filled = 0
+        self.history = np.zeros((length, 0, 2), dtype=np.float64)
+        self._layer = None
+
+    def clear(self):
+        self.head = 0
+        self.filled = 0
+
+    def record(self, positions: np.ndarray):
+        if len(positions) != self.count:
+            # Objects were added, the old history no longer lines up with them
+            self.count = len(positions)
+            self.history = np.zeros((self.length, self.count, 2), dtype=np.float64)
+            self.clear()
+        self.history[self.head] = positions
+        self.head = (self.head + 1) % self.length
+        self.filled = min(self.filled + 1, self.length)
+
+    def load(self, points: np.ndarray):
+        # Replaces the recorded positions with points as ordered() returns them, oldest first
+        self.count = points.shape[1]
+        self.filled = len(points)
+        self.head = self.filled % self.length
+        self.history = np.zeros((self.length, self.count, 2), dtype=np.float64)
+        self.history[: self.filled] = points
+
+    def ordered(self) -> np.ndarray:
+        # Oldest first, only the recorded part
+        start = (self.head - self.filled) % self.length
+        indices = (start + np.arange(self.filled)) % self.length
+        return self.history[indices]
+
+    def rects(self) -> list[pygame.Rect]:
+        # One rect per object around its whole trail, for the dirty-rect renderer
+        if self.filled < 2:
+            return []
+        points = self.ordered()
+        low = np.floor(points.min(axis=0) - self.width).astype(int)
+        high = np.ceil(points.max(axis=0) + self.width).astype(int)
+        return [pygame.Rect(x0, y0, x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in zip(low.tolist(), high.tolist())]
+
+    def _layer_for(self, screen: pygame.Surface) -> pygame.Surface:
+        if self._layer is None or self._layer.get_size() != screen.get_size():
+            self._layer = pygame.Surface(screen.get_size())
+        return self._layer
+
+    def draw(self, screen: pygame.Surface):
+        if self.filled < 3 or self.count == 0:
+            return
+        points = self.ordered()
+        layer = self._layer_for(screen)
+        area = pygame.Rect(
+            *np.floor(points.min(axis=(0, 1)) - self.width).astype(int).tolist(),
+            *np.ceil(np.ptp(points, axis=(0, 1)) + 2 * self.width + 1).astype(int).tolist(),
+        ).clip(layer.get_rect())
+        if area.width == 0 or area.height == 0:
+            return
+
+        layer.fill((0, 0, 0), area)
+        segments = self.filled - 1
+        for band in range(self.bands):
+            first = band * segments // self.bands
+            last = (band + 1) * segments // self.bands
+            # Fade like the prototype, by the position of the band along the trail
+            fade = (first + last) / 2 / self.filled
+            width = int(self.width * fade)
+            if last <= first or width <= 0:
+                continue
+            color = [int(c * self.max_alpha * fade / 255) for c in self.color]
+            for line in points[first : last + 1].transpose(1, 0, 2).tolist():
+                pygame.draw.lines(layer, color, False, line, width)
+        # Adding is blending onto the background without per-pixel alpha, black adds nothing
+        screen.blit(layer, area, area, special_flags=pygame.BLEND_RGB_ADD)
@@ -0,0 +1,352 @@
+import numpy as np
+
+from bootstrap import BOUNCE_DAMPENING, GRAVITY, SLEEP_SPEED, SLEEP_TICKS
+from Boundary import BoundaryProtocol
+from ContactSolver import RESTITUTION_SPEED, ContactSolver
+from SpatialHash import SpatialHash
+from sweep import MAX_IMPACTS, contact_points, entry_time, swept_bounds
+
+
+class World:
+    """Structure-of-arrays physics engine, all objects are stepped together"""
+
+    def __init__(
+        self,
+        capacity: int = 64,
+        seed: int | None = None,
+        collisions: bool = True,
+        continuous: bool = False,
+        sleep: bool = False,
+        solver: ContactSolver | None = None,
+    ):
+        self.count = 0
+        self.collisions = collisions
+        # Sweep balls over the whole step instead of only checking where they end up, so fast ones cannot tunnel.
+        # Several times slower with many balls, scenes that need it opt in
+        self.continuous = continuous
+        # Balls resting for SLEEP_TICKS are skipped by the step until a hit or a moving boundary wakes them
+        self.sleep = sleep
+        # Without a solver every ball only bounces off the first ball it meets in a step and overlaps are left
+        self.solver = solver
+        self._positions = np.zeros((capacity, 2), dtype=np.float64)
+        self._velocities = np.zeros((capacity, 2), dtype=np.float64)
+        self._radii = np.zeros(capacity, dtype=np.float64)
+        self._previous_positions = np.zeros((capacity, 2), dtype=np.float64)
+        self._bounce_counts = np.zeros(capacity, dtype=np.int64)
+        self._rotations = np.zeros(capacity, dtype=np.float64)
+        self._rotation_speeds = np.zeros(capacity, dtype=np.float64)
+        self._rest_times = np.zeros(capacity, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+        self.broad_phase = SpatialHash()
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions[: self.count]
+
+    @property
+    def velocities(self) -> np.ndarray:
+        return self._velocities[: self.count]
+
+    @property
+    def previous_positions(self) -> np.ndarray:
+        return self._previous_positions[: self.count]
+
+    @property
+    def bounce_counts(self) -> np.ndarray:
+        return self._bounce_counts[: self.count]
+
+    @property
+    def rotations(self) -> np.ndarray:
+        return self._rotations[: self.count]
+
+    @property
+    def rotation_speeds(self) -> np.ndarray:
+        return self._rotation_speeds[: self.count]
+
+    @property
+    def radii(self) -> np.ndarray:
+        return self._radii[: self.count]
+
+    @property
+    def rest_times(self) -> np.ndarray:
+        # Ticks each ball has been slower than SLEEP_SPEED for
+        return self._rest_times[: self.count]
+
+    @property
+    def sleeping(self) -> np.ndarray:
+        return self.rest_times >= SLEEP_TICKS
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self._radii))
+        self._positions = np.resize(self._positions, (capacity, 2))
+        self._velocities = np.resize(self._velocities, (capacity, 2))
+        self._radii = np.resize(self._radii, capacity)
+        self._previous_positions = np.resize(self._previous_positions, (capacity, 2))
+        self._bounce_counts = np.resize(self._bounce_counts, capacity)
+        self._rotations = np.resize(self._rotations, capacity)
+        self._rotation_speeds = np.resize(self._rotation_speeds, capacity)
+        self._rest_times = np.resize(self._rest_times, capacity)
+
+    def add_object(self, obj) -> int:
+        if self.count == len(self._radii):
+            self._grow()
+        index = self.count
+        self._positions[index] = obj.position.x, obj.position.y
+        self._velocities[index] = obj.velocity.x, obj.velocity.y
+        self._radii[index] = obj.radius
+        self._previous_positions[index] = self._positions[index]
+        self._bounce_counts[index] = obj.bounce_count
+        self._rotations[index] = obj.rotation
+        self._rotation_speeds[index] = obj.rotation_speed
+        self._rest_times[index] = obj.rest_time
+        self.count += 1
+        obj.attach(self, index)
+        return index
+
+    def step(self, boundaries: list[BoundaryProtocol], dt: float = 1.0):
+        # dt is measured in ticks, see TICK_RATE
+        positions = self.positions
+        velocities = self.velocities
+        self.previous_positions[:] = positions
+        # Indices of the balls to step, or all of them as a slice while nothing sleeps
+        awake = self._awake(boundaries, dt) if self.sleep else slice(None)
+        if not isinstance(awake, slice) and len(awake) == 0:
+            return
+
+        velocities[awake, 1] += GRAVITY * dt
+        # Boundaries go last, so no pair impulse can push a ball back through a wall it was just bounced off
+        if self.collisions:
+            if self.solver is None:
+                woken = self._collide(positions, velocities, dt, awake)
+            else:
+                woken = self._solve(boundaries, positions, velocities, dt, awake)
+            if len(woken) > 0:
+                awake = np.union1d(awake, woken)
+        # The solver stops slow balls at the walls by their swept contacts, so the walls are swept too
+        if self.continuous or self.solver is not None:
+            self._sweep(boundaries, positions, velocities, dt, awake)
+        else:
+            self._bounce(boundaries, positions, velocities, dt, awake)
+            positions[awake] += velocities[awake] * dt
+        self.rotations[awake] = (self.rotations[awake] + self.rotation_speeds[awake] * dt) % 360
+        if self.sleep:
+            self._settle(velocities, awake, dt)
+
+    def _awake(self, boundaries: list[BoundaryProtocol], dt: float) -> np.ndarray | slice:
+        sleeping = np.flatnonzero(self.sleeping)
+        if len(sleeping) == 0:
+            return slice(None)
+        for boundary in boundaries:
+            disturbed = boundary.disturbs_many(self.positions[sleeping], self.radii[sleeping], dt)
+            self.rest_times[sleeping[disturbed]] = 0.0
+        return np.flatnonzero(~self.sleeping)
+
+    def _settle(self, velocities: np.ndarray, awake: np.ndarray | slice, dt: float):
+        # Balls that stayed slow for SLEEP_TICKS are put to sleep where they are
+        index = np.arange(self.count)[awake]
+        speed_squared = np.einsum("ij,ij->i", velocities[index], velocities[index])
+        resting = speed_squared < SLEEP_SPEED * SLEEP_SPEED
+        if self.solver is not None:
+            # Still being pushed out of a deep overlap, it would wake the other ball again as soon as one moved
+            resting &= ~np.isin(index, self.solver.crowded)
+        rest_times = np.where(resting, self.rest_times[index] + dt, 0.0)
+        self.rest_times[index] = rest_times
+        velocities[index[rest_times >= SLEEP_TICKS]] = 0.0
+
+    def _reflect(
+        self, hit: np.ndarray, normals: np.ndarray, velocities: np.ndarray, surfaces: np.ndarray | None = None
+    ):
+        # Reflect velocity around the normal and apply dampening, relative to the surface if it moves
+        bounce = velocities[hit]
+        if surfaces is not None:
+            bounce -= surfaces
+        dot_product = np.einsum("ij,ij->i", bounce, normals)
+        # With a solver a ball hitting the wall slower than RESTITUTION_SPEED comes to rest against it, like
+        # it would against another ball, only its velocity into the wall is taken away
+        resting = np.abs(dot_product) < RESTITUTION_SPEED if self.solver is not None else np.zeros(len(hit), dtype=bool)
+        bounce -= np.where(resting, 1.0, 2.0)[:, None] * dot_product[:, None] * normals
+        bounce[~resting] *= BOUNCE_DAMPENING
+
+        # Add some randomness to make it more interesting
+        bouncing = np.flatnonzero(~resting)
+        bounce[bouncing, 0] += self.rng.uniform(-2, 2, len(bouncing))
+        bounce[bouncing, 1] += self.rng.uniform(-1, 1, len(bouncing))
+
+        if surfaces is not None:
+            bounce += surfaces
+        velocities[hit] = bounce
+        self.bounce_counts[hit[bouncing]] += 1
+
+    def _bounce(
+        self,
+        boundaries: list[BoundaryProtocol],
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        dt: float,
+        awake: np.ndarray | slice = slice(None),
+    ):
+        # Only checks where each ball would end up, the first boundary in the list wins
+        index = np.arange(self.count)[awake]
+        new_positions = positions[index] + velocities[index] * dt
+        bounced = np.zeros(len(index), dtype=bool)
+        for boundary in boundaries:
+            inside = boundary.collision_check_many(new_positions, self.radii[index])
+            hit = np.flatnonzero(~inside & ~bounced)
+            if len(hit) > 0:
+                self._reflect(index[hit], boundary.get_normal_many(positions[index[hit]]), velocities)
+                bounced[hit] = True
+
+    def _sweep(
+        self,
+        boundaries: list[BoundaryProtocol],
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        dt: float,
+        awake: np.ndarray | slice = slice(None),
+    ):
+        # Moves every ball through the step, a ball hitting a boundary moves up to the contact, bounces and
+        # carries on with the rest of the step, up to MAX_IMPACTS times
+        active = np.arange(self.count)[awake]
+        remaining = np.full(self.count, dt)
+        for _ in range(MAX_IMPACTS):
+            times = np.full(len(active), np.inf)
+            normals = np.zeros((len(active), 2))
+            surfaces = None
+            # Velocities scaled by what is left of each ball's step, so times are fractions of that
+            left = velocities[active] * (remaining[active] / dt)[:, None]
+            for boundary in boundaries:
+                boundary_times, boundary_normals, boundary_surfaces = boundary.time_of_impact_many(
+                    positions[active], left, self.radii[active], dt
+                )
+                earlier = boundary_times < times
+                times[earlier] = boundary_times[earlier]
+                normals[earlier] = boundary_normals[earlier]
+                if boundary_surfaces is not None or surfaces is not None:
+                    if surfaces is None:
+                        surfaces = np.zeros((len(active), 2))
+                    surfaces[earlier] = 0.0 if boundary_surfaces is None else boundary_surfaces[earlier]
+
+            hit = np.isfinite(times)
+            moved = np.where(hit, times, 1.0) * remaining[active]
+            positions[active] += velocities[active] * moved[:, None]
+            remaining[active] -= moved
+            active = active[hit]
+            if len(active) == 0:
+                return
+            self._reflect(active, normals[hit], velocities, None if surfaces is None else surfaces[hit])
+        # Still bouncing after MAX_IMPACTS, the rest of their step is dropped and they wait at the last contact
+
+    def _candidate_pairs(
+        self,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        dt: float,
+        awake: np.ndarray | slice,
+        margin: float = 0.0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # Radii grown by margin also find the pairs that only come close
+        radii = self.radii + margin / 2 if margin else self.radii
+        if isinstance(awake, slice):
+            if not self.continuous:
+                return self.broad_phase.pairs(positions, radii)
+            # Around the whole path of each ball, so the broad phase also finds pairs meeting mid-step
+            return self.broad_phase.pairs(*swept_bounds(positions, velocities, radii, dt))
+
+        # Sleeping balls do not move, only the ones inside the area the awake balls can reach are candidates
+        centers, reach = swept_bounds(positions[awake], velocities[awake], radii[awake], dt)
+        low = (centers - reach[:, None]).min(axis=0, initial=np.inf)
+        high = (centers + reach[:, None]).max(axis=0, initial=-np.inf)
+        sleeping = np.flatnonzero(self.sleeping)
+        sleeping_radii = radii[sleeping][:, None]
+        near = sleeping[
+            np.all(
+                (positions[sleeping] + sleeping_radii >= low) & (positions[sleeping] - sleeping_radii <= high), axis=1
+            )
+        ]
+        candidates = np.concatenate([awake, near])
+        i, j = self.broad_phase.pairs(np.concatenate([centers, positions[near]]), np.concatenate([reach, radii[near]]))
+        i, j = candidates[i], candidates[j]
+        either_awake = ~(self.sleeping[i] & self.sleeping[j])
+        return i[either_awake], j[either_awake]
+
+    def _find_pairs(
+        self, positions: np.ndarray, velocities: np.ndarray, dt: float, awake: np.ndarray | slice = slice(None)
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Pairs in contact during the step and their offset at the moment they touch
+        i, j = self._candidate_pairs(positions, velocities, dt, awake)
+        if not self.continuous:
+            delta = positions[i] - positions[j]
+            reach = self.radii[i] + self.radii[j]
+            touching = np.einsum("ij,ij->i", delta, delta) < reach * reach
+            return i[touching], j[touching], delta[touching]
+
+        delta = positions[i] - positions[j]
+        displacement = (velocities[i] - velocities[j]) * dt
+        times = entry_time(delta, displacement, self.radii[i] + self.radii[j])
+        touching = np.flatnonzero(np.isfinite(times))
+        touching = touching[np.argsort(times[touching], kind="stable")]
+        i, j, times, delta, displacement = (
+            i[touching],
+            j[touching],
+            times[touching],
+            delta[touching],
+            displacement[touching],
+        )
+
+        # Every ball only takes part in its earliest contact of the step. Summing the impulses of all pairs
+        # a fast ball sweeps through would overshoot and feed energy back into the broad phase radii
+        order = np.arange(len(i))
+        first = np.full(self.count, len(i))
+        np.minimum.at(first, i, order)
+        np.minimum.at(first, j, order)
+        earliest = (first[i] == order) & (first[j] == order)
+        return i[earliest], j[earliest], contact_points(delta[earliest], displacement[earliest], times[earliest])
+
+    def _collide(
+        self, positions: np.ndarray, velocities: np.ndarray, dt: float = 1.0, awake: np.ndarray | slice = slice(None)
+    ) -> np.ndarray:
+        # Returns the sleeping balls woken up by a hit
+        woken = np.empty(0, dtype=np.intp)
+        i, j, delta_pos = self._find_pairs(positions, velocities, dt, awake)
+        if len(i) == 0:
+            return woken
+        delta_vel = velocities[i] - velocities[j]
+        distance_squared = np.einsum("ij,ij->i", delta_pos, delta_pos)
+        approach = np.einsum("ij,ij->i", delta_vel, delta_pos)
+        # Each pair is resolved once and only while the objects move towards each other
+        valid = (distance_squared > 0) & (approach < 0)
+        if not valid.any():
+            return woken
+        i, j, delta_pos = i[valid], j[valid], delta_pos[valid]
+        approach, distance_squared = approach[valid], distance_squared[valid]
+        impulse = (approach / distance_squared)[:, None] * delta_pos
+
+        if not isinstance(awake, slice):
+            # Only a hard enough hit wakes a sleeping ball, a slow one stops against it like against a wall
+            hard = -approach >= SLEEP_SPEED * np.sqrt(distance_squared)
+            sleeping = self.sleeping
+            woken = np.unique(np.concatenate([i[hard & sleeping[i]], j[hard & sleeping[j]]]))
+            self.rest_times[woken] = 0.0
+            sleeping = self.sleeping
+            i_moves, j_moves = ~sleeping[i], ~sleeping[j]
+            np.subtract.at(velocities, i[i_moves], impulse[i_moves])
+            np.add.at(velocities, j[j_moves], impulse[j_moves])
+            return woken
+        np.subtract.at(velocities, i, impulse)
+        np.add.at(velocities, j, impulse)
+        return woken
+
+    def _solve(
+        self,
+        boundaries: list[BoundaryProtocol],
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        dt: float = 1.0,
+        awake: np.ndarray | slice = slice(None),
+    ) -> np.ndarray:
+        # All contacts of the step at once, slow ones against the boundaries too, corrected in place
+        i, j = self._candidate_pairs(positions, velocities, dt, awake, self.solver.margin)
+        sleeping = None if isinstance(awake, slice) else self.sleeping
+        woken = self.solver.resolve(positions, velocities, self.radii, i, j, dt, self.continuous, sleeping, boundaries)
+        self.rest_times[woken] = 0.0
+        return woken
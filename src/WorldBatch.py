@@ -0,0 +1,228 @@
+import numpy as np
+
+import kernels
+from bootstrap import BOUNCE_DAMPENING, GRAVITY
+from sweep import MAX_IMPACTS, contact_points, entry_time, exit_time, unit
+
+
+class WorldBatch:
+    """Many independent door scenes stepped together, the scene is the first axis of every array
+
+    Every scene holds the same number of balls inside a CircleBoundaryWithDoor of its own, with its own
+    door, rotation speed and step length. A step moves the scenes like a continuous World: gravity, the
+    earliest contact of every ball with another ball of its scene, then a sweep against the ring that
+    bounces off the wall and the door edges. A ball reaching the ring inside the opening marks its scene
+    as escaped, escaped scenes are left out of later steps and keep their final state.
+
+    The random kick of every bounce is drawn from one generator for the whole batch, so a scene plays out
+    like a seeded AnimationManger run would, but not with the same kicks. The kicks of a step are drawn up
+    front, the same for every backend: numpy steps with the array code here, numba and python with the
+    scalar kernels of the kernels module, by default the one kernels.default_backend picks.
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        centers: np.ndarray,
+        ring_radii: np.ndarray,
+        thickness: np.ndarray,
+        door_angle_start: np.ndarray,
+        door_angle_size: np.ndarray,
+        rotation_speed: np.ndarray,
+        dt: np.ndarray | float = 1.0,
+        seed: int | None = None,
+        backend: str | None = None,
+    ):
+        # Balls as (scenes, balls, 2) and (scenes, balls), everything about the rings as (scenes,)
+        self.positions = np.array(positions, dtype=np.float64)
+        scenes, balls = self.positions.shape[:2]
+        self.velocities = np.array(velocities, dtype=np.float64).reshape(scenes, balls, 2)
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (scenes, balls)).copy()
+        self.previous_positions = self.positions.copy()
+        self.bounce_counts = np.zeros((scenes, balls), dtype=np.int64)
+        self.centers = np.broadcast_to(np.asarray(centers, dtype=np.float64), (scenes, 2)).copy()
+        self.ring_radii, self.thickness, self.door_angle_start, self.door_angle_size, self.rotation_speed, self.dt = (
+            np.broadcast_to(np.asarray(values, dtype=np.float64), scenes).copy()
+            for values in (ring_radii, thickness, door_angle_start, door_angle_size, rotation_speed, dt)
+        )
+        self.escaped = np.zeros(scenes, dtype=bool)
+        self.steps = np.zeros(scenes, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+        self.backend = kernels.default_backend() if backend is None else kernels.check_backend(backend)
+        # Every pair of balls of a scene, the same for all scenes
+        self._pairs = np.triu_indices(balls, 1)
+
+    @property
+    def scenes(self) -> int:
+        return len(self.positions)
+
+    def step(self, scenes: np.ndarray | None = None):
+        """Steps the given scenes, by default every one that has not escaped yet, by their own dt"""
+        index = np.flatnonzero(~self.escaped) if scenes is None else np.asarray(scenes, dtype=np.intp)
+        if len(index) == 0:
+            return
+        # Kick of every possible bounce of the step, drawn whether or not the ball bounces
+        kicks = self.rng.uniform([-2, -1], [2, 1], size=(MAX_IMPACTS, len(index), self.positions.shape[1], 2))
+        if self.backend != "numpy":
+            step_scenes = kernels.step_scenes if self.backend == "numba" else kernels.step_scenes_python
+            step_scenes(
+                index,
+                self.positions,
+                self.velocities,
+                self.radii,
+                self.previous_positions,
+                self.bounce_counts,
+                self.centers,
+                self.ring_radii,
+                self.thickness,
+                self.door_angle_start,
+                self.door_angle_size,
+                self.rotation_speed,
+                self.dt,
+                self.escaped,
+                self.steps,
+                kicks,
+            )
+            return
+        # Working copies of the stepped scenes, written back at the end
+        positions = self.positions[index]
+        velocities = self.velocities[index]
+        radii = self.radii[index]
+        dt = self.dt[index]
+        self.previous_positions[index] = positions
+
+        velocities[:, :, 1] += GRAVITY * dt[:, None]
+        self._collide(positions, velocities, radii, dt)
+        self._sweep(index, positions, velocities, radii, dt, kicks.reshape(MAX_IMPACTS, -1, 2))
+
+        self.positions[index] = positions
+        self.velocities[index] = velocities
+        self.door_angle_start[index] = (self.door_angle_start[index] - self.rotation_speed[index] * dt) % 360
+        self.steps[index] += 1
+
+    def _collide(self, positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: np.ndarray):
+        # World._find_pairs and World._collide for all pairs of every scene, balls numbered across scenes
+        scenes, balls = radii.shape
+        first, second = self._pairs
+        if len(first) == 0:
+            return
+        offset = (np.arange(scenes) * balls)[:, None]
+        i, j = (first + offset).ravel(), (second + offset).ravel()
+        flat_positions, flat_velocities = positions.reshape(-1, 2), velocities.reshape(-1, 2)
+        delta = flat_positions[i] - flat_positions[j]
+        displacement = (flat_velocities[i] - flat_velocities[j]) * np.repeat(dt, len(first))[:, None]
+        times = entry_time(delta, displacement, radii.ravel()[i] + radii.ravel()[j])
+        touching = np.flatnonzero(np.isfinite(times))
+        if len(touching) == 0:
+            return
+        touching = touching[np.argsort(times[touching], kind="stable")]
+        i, j, times, delta, displacement = (
+            i[touching],
+            j[touching],
+            times[touching],
+            delta[touching],
+            displacement[touching],
+        )
+
+        # Every ball only takes part in its earliest contact of the step
+        order = np.arange(len(i))
+        earliest_of = np.full(scenes * balls, len(i))
+        np.minimum.at(earliest_of, i, order)
+        np.minimum.at(earliest_of, j, order)
+        earliest = (earliest_of[i] == order) & (earliest_of[j] == order)
+        i, j = i[earliest], j[earliest]
+        delta_pos = contact_points(delta[earliest], displacement[earliest], times[earliest])
+
+        delta_vel = flat_velocities[i] - flat_velocities[j]
+        distance_squared = np.einsum("ij,ij->i", delta_pos, delta_pos)
+        approach = np.einsum("ij,ij->i", delta_vel, delta_pos)
+        valid = (distance_squared > 0) & (approach < 0)
+        impulse = (approach[valid] / distance_squared[valid])[:, None] * delta_pos[valid]
+        np.subtract.at(flat_velocities, i[valid], impulse)
+        np.add.at(flat_velocities, j[valid], impulse)
+
+    def _door_impact(
+        self, scenes: np.ndarray, positions: np.ndarray, displacements: np.ndarray, radii: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # CircleBoundaryWithDoor.time_of_impact_many with the ring of each ball's scene, also returns
+        # which balls reach the opening before anything else
+        ring_radii = self.ring_radii[scenes]
+        thickness = self.thickness[scenes]
+        door_start = self.door_angle_start[scenes]
+        offsets = positions - self.centers[scenes]
+        times = exit_time(offsets, displacements, ring_radii - radii, ring_radii)
+        contacts = contact_points(offsets, displacements, times)
+
+        angle_degrees = 360 - np.degrees(np.arctan2(contacts[:, 1], contacts[:, 0])) % 360
+        escaping = np.isfinite(times) & _in_door(angle_degrees, door_start, self.door_angle_size[scenes])
+        escape_times = np.where(escaping, times, np.inf)
+        times[escaping] = np.inf
+        normals = unit(contacts)
+
+        middle = ring_radii - thickness / 2
+        for angle in (door_start, door_start + self.door_angle_size[scenes]):
+            radians = np.radians(angle)
+            edges = np.column_stack([middle * np.cos(radians), -middle * np.sin(radians)])
+            edge_times = entry_time(offsets - edges, displacements, radii + thickness / 2)
+            earlier = edge_times < times
+            if earlier.any():
+                times[earlier] = edge_times[earlier]
+                normals[earlier] = unit(contact_points(offsets - edges, displacements, edge_times)[earlier])
+        return times, normals, escape_times < times
+
+    def _sweep(
+        self,
+        index: np.ndarray,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        dt: np.ndarray,
+        kicks: np.ndarray,
+    ):
+        # World._sweep against the ring of each scene, balls numbered across the stepped scenes
+        balls = radii.shape[1]
+        flat_positions, flat_velocities = positions.reshape(-1, 2), velocities.reshape(-1, 2)
+        flat_radii = radii.ravel()
+        scene_of = np.repeat(index, balls)
+        active = np.arange(len(flat_radii))
+        remaining = np.repeat(dt, balls)
+        for impact in range(MAX_IMPACTS):
+            times, normals, escaping = self._door_impact(
+                scene_of[active],
+                flat_positions[active],
+                flat_velocities[active] * remaining[active, None],
+                flat_radii[active],
+            )
+            self.escaped[scene_of[active[escaping]]] = True
+
+            hit = np.isfinite(times)
+            moved = np.where(hit, times, 1.0) * remaining[active]
+            flat_positions[active] += flat_velocities[active] * moved[:, None]
+            remaining[active] -= moved
+            active = active[hit]
+            if len(active) == 0:
+                return
+            self._reflect(active, normals[hit], flat_velocities, kicks[impact, active])
+            self.bounce_counts.reshape(-1)[index[active // balls] * balls + active % balls] += 1
+
+    def _reflect(self, hit: np.ndarray, normals: np.ndarray, velocities: np.ndarray, kicks: np.ndarray):
+        # Same bounce as World._reflect, the rings do not move
+        bounce = velocities[hit]
+        dot_product = np.einsum("ij,ij->i", bounce, normals)
+        bounce -= 2 * dot_product[:, None] * normals
+        bounce *= BOUNCE_DAMPENING
+        velocities[hit] = bounce + kicks
+
+
+def _in_door(angle_degrees: np.ndarray, door_angle_start: np.ndarray, door_angle_size: np.ndarray) -> np.ndarray:
+    # CircleBoundaryWithDoor._is_in_door_angle with a door per angle
+    door_start = door_angle_start % 360
+    door_end = (door_start + door_angle_size) % 360
+    angle = angle_degrees % 360
+    return np.where(
+        door_start <= door_end,
+        (door_start <= angle) & (angle <= door_end),
+        (angle >= door_start) | (angle <= door_end),
+    )
@@ -0,0 +1,228 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pydantic import BaseModel
+
+# Keep stdout clean for the JSON lines output
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import kernels
+from Animation import AnimationManger
+from bootstrap import BOUNDARY_COLOR, FPS, HEIGHT, TICK_RATE, WIDTH
+from BouncingObject import BouncingCircle
+from CircleBoundaryWithDoor import CircleBoundaryWithDoor
+from WorldBatch import WorldBatch
+
+
+class Scenario(BaseModel):
+    door_angle_start: float = 90
+    door_angle_size: float = 20
+    rotation_speed: float = 1
+    boundary_radius: float = 200
+    object_radius: float = 20
+    positions: list[tuple[float, float]] = [(WIDTH / 2 + 30, HEIGHT / 2), (WIDTH / 2 - 30, HEIGHT / 2)]
+    velocities: list[tuple[float, float]] | None = None
+    max_frames: int = 60 * FPS
+    fps: int = FPS
+    substeps: int = 1
+    seed: int | None = None
+
+
+class ScenarioResult(BaseModel):
+    index: int
+    scenario: Scenario
+    escaped: bool
+    escape_frame: int | None
+    frames: int
+    bounce_count: int
+    final_positions: list[tuple[float, float]]
+    final_velocities: list[tuple[float, float]]
+
+
+def build_scene(scenario: Scenario, **kwargs) -> AnimationManger:
+    anim = AnimationManger(
+        width=WIDTH,
+        height=HEIGHT,
+        fps=scenario.fps,
+        substeps=scenario.substeps,
+        seed=scenario.seed,
+        use_world=True,
+        # Swept like WorldBatch, so a scenario plays out the same in both
+        continuous=True,
+        **kwargs,
+    )
+    anim.add_boundary(
+        CircleBoundaryWithDoor(
+            center=(WIDTH / 2, HEIGHT / 2),
+            radius=scenario.boundary_radius,
+            color=BOUNDARY_COLOR,
+            thickness=6,
+            door_angle_start=scenario.door_angle_start,
+            door_angle_size=scenario.door_angle_size,
+            rotation_speed=scenario.rotation_speed,
+        )
+    )
+    velocities = scenario.velocities or [(0, 0)] * len(scenario.positions)
+    for position, velocity in zip(scenario.positions, velocities):
+        anim.add_object(BouncingCircle(None, scenario.object_radius, position, velocity))
+    return anim
+
+
+def run_scenario(scenario: Scenario, index: int = 0) -> ScenarioResult:
+    anim = build_scene(scenario, headless=True, render=False)
+    # run() stops on its own as soon as a boundary reports an escape
+    result = anim.run(max_frames=scenario.max_frames)
+    world = anim.world
+    return ScenarioResult(
+        index=index,
+        scenario=scenario,
+        escaped=result.escaped,
+        escape_frame=result.frames if result.escaped else None,
+        frames=result.frames,
+        bounce_count=int(world.bounce_counts.sum()),
+        final_positions=[tuple(row) for row in world.positions.tolist()],
+        final_velocities=[tuple(row) for row in world.velocities.tolist()],
+    )
+
+
+def _run_indexed(item: tuple[int, Scenario]) -> ScenarioResult:
+    index, scenario = item
+    return run_scenario(scenario, index)
+
+
+def run_batch(scenarios: list[Scenario], max_workers: int | None = None) -> list[ScenarioResult]:
+    max_workers = max_workers or os.cpu_count()
+    chunksize = max(1, len(scenarios) // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run_indexed, enumerate(scenarios), chunksize=chunksize))
+
+
+def build_batch(scenarios: list[Scenario], seed: int | None = None, backend: str | None = None) -> WorldBatch:
+    # All scenarios need the same number of balls, the rings are placed like build_scene does
+    velocities = [scenario.velocities or [(0, 0)] * len(scenario.positions) for scenario in scenarios]
+    return WorldBatch(
+        positions=[scenario.positions for scenario in scenarios],
+        velocities=velocities,
+        radii=np.array([scenario.object_radius for scenario in scenarios])[:, None],
+        centers=(WIDTH / 2, HEIGHT / 2),
+        ring_radii=[scenario.boundary_radius for scenario in scenarios],
+        thickness=6,
+        door_angle_start=[scenario.door_angle_start for scenario in scenarios],
+        door_angle_size=[scenario.door_angle_size for scenario in scenarios],
+        rotation_speed=[scenario.rotation_speed for scenario in scenarios],
+        dt=[TICK_RATE / (scenario.fps * scenario.substeps) for scenario in scenarios],
+        seed=seed,
+        backend=backend,
+    )
+
+
+def _run_group(
+    scenarios: list[Scenario], indices: list[int], seed: int | None, backend: str | None
+) -> list[ScenarioResult]:
+    batch = build_batch(scenarios, seed, backend)
+    substeps = np.array([scenario.substeps for scenario in scenarios])
+    max_frames = np.array([scenario.max_frames for scenario in scenarios])
+    frames = np.zeros(len(scenarios), dtype=np.int64)
+    # Frame by frame like AnimationManger.run, a scene stops within the frame its door is passed in
+    while True:
+        running = ~batch.escaped & (frames < max_frames)
+        if not running.any():
+            break
+        for substep in range(substeps[running].max()):
+            stepping = np.flatnonzero(running & (substeps > substep) & ~batch.escaped)
+            if len(stepping) == 0:
+                break
+            batch.step(stepping)
+        frames[running] += 1
+    return [
+        ScenarioResult(
+            index=index,
+            scenario=scenario,
+            escaped=bool(batch.escaped[scene]),
+            escape_frame=int(frames[scene]) if batch.escaped[scene] else None,
+            frames=int(frames[scene]),
+            bounce_count=int(batch.bounce_counts[scene].sum()),
+            final_positions=[tuple(row) for row in batch.positions[scene].tolist()],
+            final_velocities=[tuple(row) for row in batch.velocities[scene].tolist()],
+        )
+        for scene, (index, scenario) in enumerate(zip(indices, scenarios))
+    ]
+
+
+def run_vectorized(
+    scenarios: list[Scenario], seed: int | None = None, backend: str | None = None
+) -> list[ScenarioResult]:
+    """Runs all scenarios in one process as WorldBatch steps, one batch per number of balls
+
+    The random bounce kicks come from one generator seeded with seed, not from the scenario seeds.
+    """
+    groups: dict[int, list[int]] = {}
+    for index, scenario in enumerate(scenarios):
+        groups.setdefault(len(scenario.positions), []).append(index)
+    results = []
+    for indices in groups.values():
+        results.extend(_run_group([scenarios[index] for index in indices], indices, seed, backend))
+    return sorted(results, key=lambda result: result.index)
+
+
+def grid(base: Scenario | None = None, **axes: list) -> list[Scenario]:
+    # Cartesian product of the given field values, e.g. grid(door_angle_start=[0, 90], rotation_speed=[1, 2])
+    base = base or Scenario()
+    names = list(axes)
+    return [
+        Scenario.model_validate({**base.model_dump(), **dict(zip(names, values))})
+        for values in itertools.product(*axes.values())
+    ]
+
+
+def _parse_values(text: str) -> list[float]:
+    # Either a comma separated list "1,2,5" or a range "start:stop:step"
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        count = int(round((stop - start) / step))
+        return [start + i * step for i in range(count)]
+    return [float(part) for part in text.split(",")]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Simulate a grid of door scenes headless and report escapes")
+    parser.add_argument("--door-angle-start", type=_parse_values, default=[90])
+    parser.add_argument("--door-angle-size", type=_parse_values, default=[20])
+    parser.add_argument("--rotation-speed", type=_parse_values, default=[1])
+    parser.add_argument("--seed", type=_parse_values, default=[None])
+    parser.add_argument("--max-frames", type=int, default=Scenario().max_frames)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--vectorized", action="store_true", help="Step all scenes together in this process instead of a pool"
+    )
+    parser.add_argument(
+        "--backend", choices=kernels.BACKENDS, default=None, help="Kernels of --vectorized, by default the fastest"
+    )
+    parser.add_argument("--escaped-only", action="store_true")
+    parser.add_argument("--out", default="-", help="JSON lines output file, - for stdout")
+    args = parser.parse_args(argv)
+
+    scenarios = grid(
+        Scenario(max_frames=args.max_frames),
+        door_angle_start=args.door_angle_start,
+        door_angle_size=args.door_angle_size,
+        rotation_speed=args.rotation_speed,
+        seed=args.seed,
+    )
+    results = run_vectorized(scenarios, backend=args.backend) if args.vectorized else run_batch(scenarios, args.workers)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w")
+    for result in results:
+        if result.escaped or not args.escaped_only:
+            out.write(json.dumps(result.model_dump()) + "\n")
+    if out is not sys.stdout:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# Keep stdout clean for the JSON output
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from benchmarks.suite import BenchmarkCase, BenchmarkResult, build_scene, compare, default_cases, run_case
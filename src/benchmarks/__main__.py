@@ -0,0 +1,136 @@
+import argparse
+import fnmatch
+import json
+import sys
+
+from benchmarks.parity import TOLERANCE, check_parity
+from benchmarks.settle import check_settle
+from benchmarks.suite import BenchmarkResult, compare, default_cases, environment, run_case
+
+
+def _load(path: str) -> list[BenchmarkResult]:
+    with open(path) as file:
+        return [BenchmarkResult.model_validate(result) for result in json.load(file)["results"]]
+
+
+def _report(rows: list[tuple[str, float, float, float, bool]]) -> bool:
+    regressed = False
+    for name, before, after, change, regression in rows:
+        regressed |= regression
+        flag = "REGRESSION" if regression else ""
+        print(f"{name:55} {before:12.1f} {after:12.1f} {change:+8.1%} {flag}", file=sys.stderr)
+    return regressed
+
+
+def run(args) -> int:
+    cases = [
+        case
+        for case in default_cases(args.balls)
+        if not args.filter or any(fnmatch.fnmatch(case.name, pattern) for pattern in args.filter)
+    ]
+    results = []
+    for case in cases:
+        if args.steps:
+            case.steps = args.steps
+        case.repeats = args.repeats
+        case.batched = args.batched
+        case.pipelined = args.pipelined
+        case.continuous = args.continuous
+        result = run_case(case)
+        print(f"{result.name:55} {result.steps_per_sec:12.1f} steps/s", file=sys.stderr)
+        results.append(result)
+
+    report = {"environment": environment(), "results": [result.model_dump() for result in results]}
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        return int(_report(compare(_load(args.baseline), results, args.threshold)))
+    return 0
+
+
+def parity(args) -> int:
+    results = check_parity(args.backend, args.scenes, args.balls, args.steps, args.seed, args.tolerance)
+    mismatched = False
+    for result in results:
+        mismatched |= result.first_mismatch is not None
+        flag = "" if result.first_mismatch is None else f"MISMATCH from step {result.first_mismatch}"
+        steps_per_sec = args.scenes * result.steps / result.seconds
+        print(
+            f"{result.backend:10} {steps_per_sec:12.1f} scene-steps/s {result.max_error:10.2e} {flag}", file=sys.stderr
+        )
+    return int(mismatched)
+
+
+def settle(args) -> int:
+    result = check_settle(args.balls, args.radius, args.steps, args.continuous, args.seed)
+    flag = "NOT SETTLED" if result.settled_step is None else f"settled from step {result.settled_step}"
+    print(
+        f"{result.balls}balls {'continuous' if result.continuous else 'discrete':10} {result.asleep:6} asleep "
+        f"p90 {result.speed_p90:6.2f} overlap {result.max_overlap:5.2f} "
+        f"{result.seconds / result.steps * 1e3:8.2f} ms/step {flag}",
+        file=sys.stderr,
+    )
+    return int(result.settled_step is None)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Simulation and rendering benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark cases and write the results as JSON")
+    run_parser.add_argument("--balls", type=lambda text: [int(part) for part in text.split(",")], default=None)
+    run_parser.add_argument("--filter", action="append", help="Glob on case names, e.g. '*-door-*', repeatable")
+    run_parser.add_argument("--steps", type=int, default=None, help="Steps per case, scaled by ball count if unset")
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--batched", action="store_true", help="Draw objects with the batched renderer")
+    run_parser.add_argument("--continuous", action="store_true", help="Sweep balls over each step against tunnelling")
+    run_parser.add_argument(
+        "--pipelined", action="store_true", help="Simulate on a thread of its own while the last frame is drawn"
+    )
+    run_parser.add_argument("--out", default="-", help="JSON output file, - for stdout")
+    run_parser.add_argument("--baseline", help="Also compare against this earlier output")
+    run_parser.add_argument("--threshold", type=float, default=0.1, help="Allowed drop in steps/sec")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two earlier outputs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Allowed drop in steps/sec")
+    compare_parser.set_defaults(
+        handler=lambda args: int(_report(compare(_load(args.baseline), _load(args.current), args.threshold)))
+    )
+
+    parity_parser = commands.add_parser("parity", help="Check that the kernel backends step WorldBatch alike")
+    parity_parser.add_argument(
+        "--backend",
+        action="append",
+        help="Backend to check, repeatable, the first is the " "reference, all installed ones if unset",
+    )
+    parity_parser.add_argument("--scenes", type=int, default=64)
+    parity_parser.add_argument("--balls", type=int, default=8)
+    parity_parser.add_argument("--steps", type=int, default=200)
+    parity_parser.add_argument("--seed", type=int, default=0)
+    parity_parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed difference after a step")
+    parity_parser.set_defaults(handler=parity)
+
+    settle_parser = commands.add_parser("settle", help="Check that a pile of balls on the contact solver comes to rest")
+    settle_parser.add_argument("--balls", type=int, default=200)
+    settle_parser.add_argument("--radius", type=float, default=5.0)
+    settle_parser.add_argument("--steps", type=int, default=1600)
+    settle_parser.add_argument(
+        "--continuous", action="store_true", help="Sweep balls over each step against tunnelling"
+    )
+    settle_parser.add_argument("--seed", type=int, default=0)
+    settle_parser.set_defaults(handler=settle)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
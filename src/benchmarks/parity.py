@@ -0,0 +1,103 @@
+import time
+
+import numpy as np
+from pydantic import BaseModel
+
+import kernels
+from bootstrap import HEIGHT, WIDTH
+from WorldBatch import WorldBatch
+
+# Largest difference in position or velocity allowed after one step, the scalar kernels round differently from the
+# array code
+TOLERANCE = 1e-9
+# Everything a step changes, copied from the reference after every step so the rounding differences do
+# not grow over a chaotic run
+STATE = ("positions", "velocities", "previous_positions", "bounce_counts", "door_angle_start", "escaped", "steps")
+
+
+class ParityResult(BaseModel):
+    backend: str
+    reference: str
+    steps: int
+    seconds: float
+    max_error: float
+    # First step whose escapes, bounce counts or positions differ from the reference
+    first_mismatch: int | None
+
+
+def random_batch(scenes: int, balls: int, seed: int, backend: str) -> WorldBatch:
+    """Scenes of balls spread over the inner half of a ring, with random velocities, doors and rotation"""
+    rng = np.random.default_rng(seed)
+    ring_radius = 200.0
+    radius = min(20.0, ring_radius / (4 * np.sqrt(balls)))
+    # Balls on a jittered grid so they start apart
+    side = int(np.ceil(np.sqrt(balls)))
+    spacing = ring_radius / side
+    cells = np.stack(np.meshgrid(np.arange(side), np.arange(side)), axis=-1).reshape(-1, 2)[:balls]
+    grid = (cells - (side - 1) / 2) * spacing
+    jitter = rng.uniform(-1, 1, (scenes, balls, 2)) * max(0.0, spacing / 2 - radius)
+    return WorldBatch(
+        positions=grid + jitter + (WIDTH / 2, HEIGHT / 2),
+        velocities=rng.uniform(-5, 5, (scenes, balls, 2)),
+        radii=radius,
+        centers=(WIDTH / 2, HEIGHT / 2),
+        ring_radii=ring_radius,
+        thickness=6,
+        door_angle_start=rng.uniform(0, 360, scenes),
+        door_angle_size=rng.uniform(10, 60, scenes),
+        rotation_speed=rng.uniform(-3, 3, scenes),
+        dt=0.5,
+        seed=seed,
+        backend=backend,
+    )
+
+
+def check_parity(
+    backends: list[str] | None = None,
+    scenes: int = 64,
+    balls: int = 8,
+    steps: int = 200,
+    seed: int = 0,
+    tolerance: float = TOLERANCE,
+) -> list[ParityResult]:
+    """Steps the same random batch under every backend and compares each one with the first after every step
+
+    The batches start every step from the state of the first one, so each step is checked on its own.
+    """
+    backends = backends or kernels.available_backends()
+    batches = [random_batch(scenes, balls, seed, kernels.check_backend(backend)) for backend in backends]
+    seconds = [0.0] * len(batches)
+    errors = [0.0] * len(batches)
+    mismatches: list[int | None] = [None] * len(batches)
+    for step in range(steps):
+        for n, batch in enumerate(batches):
+            start = time.perf_counter()
+            batch.step()
+            seconds[n] += time.perf_counter() - start
+        reference = batches[0]
+        for n, batch in enumerate(batches[1:], 1):
+            error = max(
+                float(np.abs(batch.positions - reference.positions).max()),
+                float(np.abs(batch.velocities - reference.velocities).max()),
+            )
+            errors[n] = max(errors[n], error)
+            matches = (
+                np.array_equal(batch.escaped, reference.escaped)
+                and np.array_equal(batch.bounce_counts, reference.bounce_counts)
+                and error <= tolerance
+            )
+            if mismatches[n] is None and not matches:
+                mismatches[n] = step
+            for name in STATE:
+                getattr(batch, name)[...] = getattr(reference, name)
+    return [
+        ParityResult(
+            backend=backend,
+            reference=backends[0],
+            steps=steps,
+            seconds=seconds[n],
+            max_error=errors[n],
+            first_mismatch=mismatches[n],
+        )
+        for n, backend in enumerate(backends)
+    ]
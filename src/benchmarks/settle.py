@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+from pydantic import BaseModel
+
+from bootstrap import BOUNDARY_COLOR, HEIGHT, WIDTH
+from BouncingObject import BouncingCircle
+from CircleBoundary import CircleBoundary
+from ContactSolver import MAX_CORRECTION, ContactSolver
+from World import World
+
+# Share of the balls that must sleep for the pile to count as settled
+ASLEEP_SHARE = 0.95
+# Deepest overlap a settled pile may keep, anything deeper would wake the sleeping balls again
+MAX_OVERLAP = MAX_CORRECTION
+
+
+class SettleResult(BaseModel):
+    balls: int
+    continuous: bool
+    steps: int
+    seconds: float
+    # First step from which the pile stayed settled to the end, None if it never did
+    settled_step: int | None
+    asleep: int
+    speed_p90: float
+    max_overlap: float
+
+
+def pile(balls: int, radius: float, continuous: bool, seed: int) -> tuple[World, list[CircleBoundary]]:
+    """Balls dropped at random into a closed ring, solved with the ContactSolver and put to sleep at rest"""
+    world = World(capacity=balls, seed=seed, continuous=continuous, sleep=True, solver=ContactSolver())
+    center = (WIDTH / 2, HEIGHT / 2)
+    ring_radius = 200.0
+    boundary = CircleBoundary(center=center, radius=ring_radius, color=BOUNDARY_COLOR, thicnkess=6)
+    rng = np.random.default_rng(seed)
+    distance = (ring_radius - 50) * np.sqrt(rng.uniform(0, 1, balls))
+    angle = rng.uniform(0, 2 * np.pi, balls)
+    positions = np.column_stack([center[0] + distance * np.cos(angle), center[1] + distance * np.sin(angle)])
+    for position, velocity in zip(positions.tolist(), rng.uniform(-3, 3, (balls, 2)).tolist()):
+        world.add_object(BouncingCircle(None, radius, position, velocity))
+    return world, [boundary]
+
+
+def max_overlap(world: World) -> float:
+    positions, radii = world.positions, world.radii
+    deepest = 0.0
+    for n in range(1, world.count):
+        distances = np.hypot(*(positions[n:] - positions[:-n]).T)
+        deepest = max(deepest, float((radii[n:] + radii[:-n] - distances).max()))
+    return deepest
+
+
+def check_settle(
+    balls: int = 200, radius: float = 5.0, steps: int = 1600, continuous: bool = False, seed: int = 0
+) -> SettleResult:
+    """Steps a pile of balls until steps and reports when it came to rest
+
+    The pile is settled while at least ASLEEP_SHARE of the balls sleep and no two overlap deeper than
+    MAX_OVERLAP.
+    """
+    world, boundaries = pile(balls, radius, continuous, seed)
+    seconds = 0.0
+    settled_step = None
+    for step in range(1, steps + 1):
+        start = time.perf_counter()
+        world.step(boundaries)
+        seconds += time.perf_counter() - start
+        settled = world.sleeping.sum() >= ASLEEP_SHARE * balls and max_overlap(world) <= MAX_OVERLAP
+        if not settled:
+            settled_step = None
+        elif settled_step is None:
+            settled_step = step
+    return SettleResult(
+        balls=balls,
+        continuous=continuous,
+        steps=steps,
+        seconds=seconds,
+        settled_step=settled_step,
+        asleep=int(world.sleeping.sum()),
+        speed_p90=float(np.percentile(np.hypot(*world.velocities.T), 90)),
+        max_overlap=max_overlap(world),
+    )
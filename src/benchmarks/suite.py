@@ -0,0 +1,240 @@
+import gc
+import itertools
+import math
+import platform
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+from pydantic import BaseModel
+
+from Animation import AnimationManger
+from bootstrap import BOUNDARY_COLOR, HEIGHT, WIDTH
+from BouncingObject import BouncingCircle
+from CircleBoundary import CircleBoundary
+from CircleBoundaryWithDoor import CircleBoundaryWithDoor
+from Renderer import Renderer
+from SegmentBoundary import SegmentBoundary
+
+BALL_COUNTS = [2, 100, 1_000, 10_000, 100_000]
+# The object by object engine is far too slow beyond this
+MAX_OBJECT_ENGINE_BALLS = 1_000
+# Share of the boundary area covered by balls, the ball radius shrinks as the count grows
+FILL_RATIO = 0.3
+# Grid spacing and radius of the pegs inside the ring of the pegboard cases
+PEG_SPACING = 40
+PEG_RADIUS = 4
+# Batched cases set the pixels of circles up to this radius instead of blitting them
+BATCH_PIXEL_RADIUS = 2.0
+
+
+class BenchmarkCase(BaseModel):
+    balls: int
+    collisions: bool = True
+    continuous: bool = False
+    boundary: str = "circle"  # circle, door or pegboard
+    render: bool = False
+    # Objects drawn together from the position arrays, the tiniest circles straight into the pixels
+    batched: bool = False
+    # Physics on its own thread while the previous frame is drawn, timed through AnimationManger.run
+    pipelined: bool = False
+    use_world: bool = True
+    steps: int | None = None
+    warmup: int = 5
+    repeats: int = 3
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return "-".join(
+            [
+                f"{self.balls}balls",
+                "world" if self.use_world else "objects",
+                self.boundary,
+                "collide" if self.collisions else "nocollide",
+                "render" if self.render else "physics",
+            ]
+            # Earlier outputs were all discrete and carry no suffix, swept cases are named apart so their
+            # numbers are never compared with those
+            + (["continuous"] if self.continuous else [])
+            + (["batched"] if self.batched else [])
+            + (["pipelined"] if self.pipelined else [])
+        )
+
+    def step_count(self) -> int:
+        # Roughly the same amount of work per case, bounded so small cases still get a stable timing
+        return self.steps or max(10, min(500, 100_000 // self.balls))
+
+
+class BenchmarkResult(BaseModel):
+    name: str
+    case: BenchmarkCase
+    steps: int
+    seconds: float
+    steps_per_sec: float
+    frames_per_sec: float | None
+    alloc_bytes_per_step: float
+    retained_blocks_per_step: float
+
+
+def default_cases(balls: list[int] | None = None) -> list[BenchmarkCase]:
+    cases = []
+    for count, collisions, boundary, render, use_world in itertools.product(
+        balls or BALL_COUNTS, [True, False], ["circle", "door", "pegboard"], [False, True], [True, False]
+    ):
+        if not use_world and count > MAX_OBJECT_ENGINE_BALLS:
+            continue
+        cases.append(
+            BenchmarkCase(balls=count, collisions=collisions, boundary=boundary, render=render, use_world=use_world)
+        )
+    return cases
+
+
+def build_scene(case: BenchmarkCase) -> AnimationManger:
+    anim = AnimationManger(
+        width=WIDTH,
+        height=HEIGHT,
+        headless=True,
+        render=case.render,
+        use_world=case.use_world,
+        seed=case.seed,
+        collisions=case.collisions,
+        continuous=case.continuous,
+        renderer=Renderer(batched=case.batched, pixel_radius=BATCH_PIXEL_RADIUS),
+        pipelined=case.pipelined,
+    )
+    center = (WIDTH / 2, HEIGHT / 2)
+    radius = min(WIDTH, HEIGHT) / 2 - 20
+    if case.boundary == "door":
+        boundary = CircleBoundaryWithDoor(
+            center=center,
+            radius=radius,
+            color=BOUNDARY_COLOR,
+            thickness=6,
+            door_angle_start=90,
+            door_angle_size=20,
+            rotation_speed=1,
+        )
+    else:
+        boundary = CircleBoundary(center=center, radius=radius, color=BOUNDARY_COLOR, thicnkess=6)
+    anim.add_boundary(boundary)
+    if case.boundary == "pegboard":
+        pegs = SegmentBoundary(BOUNDARY_COLOR)
+        offsets = np.arange(-radius, radius + 1, PEG_SPACING)
+        for x, y in itertools.product(offsets, offsets):
+            if math.hypot(x, y) < radius - 2 * PEG_SPACING:
+                pegs.add_peg((center[0] + x, center[1] + y), PEG_RADIUS)
+        anim.add_boundary(pegs)
+
+    ball_radius = min(20.0, max(1.0, radius * math.sqrt(FILL_RATIO / case.balls)))
+    rng = np.random.default_rng(case.seed)
+    # Uniform in the disc the balls can move in, velocities of a few pixels per tick
+    distance = (radius - ball_radius - 15) * np.sqrt(rng.uniform(0, 1, case.balls))
+    angle = rng.uniform(0, 2 * np.pi, case.balls)
+    positions = np.column_stack([center[0] + distance * np.cos(angle), center[1] + distance * np.sin(angle)])
+    velocities = rng.uniform(-5, 5, (case.balls, 2))
+    for position, velocity in zip(positions.tolist(), velocities.tolist()):
+        anim.add_object(BouncingCircle(None, ball_radius, position, velocity))
+    return anim
+
+
+def _step(anim: AnimationManger, render: bool):
+    # An escape through the door does not end a benchmark, the remaining balls keep being simulated
+    anim.update()
+    if render:
+        anim.draw()
+
+
+def _run_frames(anim: AnimationManger, frames: int):
+    # Pipelined cases go through run, which stops at an escape, so it is started again until all frames ran
+    done = 0
+    while done < frames:
+        before = anim.frame_count
+        anim.run(max_frames=before + frames - done)
+        done += anim.frame_count - before
+        for boundary in anim.boundaries:
+            boundary.out_of_boundaries = False
+
+
+def _time_steps(case: BenchmarkCase, steps: int) -> float:
+    anim = build_scene(case)
+    if case.pipelined:
+        _run_frames(anim, case.warmup)
+        gc.collect()
+        start = time.perf_counter()
+        _run_frames(anim, steps)
+        return time.perf_counter() - start
+    for _ in range(case.warmup):
+        _step(anim, case.render)
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(steps):
+        _step(anim, case.render)
+    return time.perf_counter() - start
+
+
+def _measure_allocations(case: BenchmarkCase, steps: int) -> tuple[float, float]:
+    # Separate run, tracing slows everything down too much to be timed
+    anim = build_scene(case)
+    for _ in range(case.warmup):
+        _step(anim, case.render)
+    steps = min(steps, 20)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = []
+        blocks = tracemalloc.take_snapshot()
+        for _ in range(steps):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _step(anim, case.render)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.take_snapshot().compare_to(blocks, "filename")
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sum(stat.count_diff for stat in retained)
+    return statistics.fmean(peaks), retained_blocks / steps
+
+
+def run_case(case: BenchmarkCase) -> BenchmarkResult:
+    steps = case.step_count()
+    seconds = min(_time_steps(case, steps) for _ in range(case.repeats))
+    alloc_bytes, retained_blocks = _measure_allocations(case, steps)
+    rate = steps / seconds
+    return BenchmarkResult(
+        name=case.name,
+        case=case,
+        steps=steps,
+        seconds=seconds,
+        steps_per_sec=rate,
+        frames_per_sec=rate if case.render else None,
+        alloc_bytes_per_step=alloc_bytes,
+        retained_blocks_per_step=retained_blocks,
+    )
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(
+    baseline: list[BenchmarkResult], current: list[BenchmarkResult], threshold: float = 0.1
+) -> list[tuple[str, float, float, float, bool]]:
+    """Pairs results by name, a case regressed when its steps/sec dropped by more than threshold"""
+    previous = {result.name: result for result in baseline}
+    rows = []
+    for result in current:
+        if result.name not in previous:
+            continue
+        before = previous[result.name].steps_per_sec
+        change = result.steps_per_sec / before - 1
+        rows.append((result.name, before, result.steps_per_sec, change, change < -threshold))
+    return rows
@@ -1,7 +1,12 @@
 WIDTH, HEIGHT = 800, 600  # Vertical video format for TikTok/Instagram
 FPS = 120
+TICK_RATE = 60  # GRAVITY, velocities and rotation speeds are expressed per tick of this rate
 GRAVITY = 0.5
 BG_COLOR = (0, 0, 0)  # Dark blue background
 BOUNDARY_COLOR = (255, 255, 255)
 OBJECT_COLOR = (123, 123, 5)
 BOUNCE_DAMPENING = 1
+# Objects slower than SLEEP_SPEED pixels per tick for SLEEP_TICKS ticks are put to sleep, when sleeping is enabled
+SLEEP_SPEED = 1.0
+SLEEP_TICKS = 30
+GLOW_COLORS = [(230, 0, 115), (252, 185, 0), (64, 224, 208)]  # Pink, gold, turquoise
@@ -1,49 +1,93 @@
 import math
 
-from pydantic import BaseModel, field_validator, validator
+from pydantic import BaseModel
 
 
-class Vector(BaseModel):
-    x: float
-    y: float
+class Vector:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: float = 0.0, y: float = 0.0):
+        self.x = x
+        self.y = y
+
+    @classmethod
+    def parse(cls, value) -> "Vector":
+        # Validation happens here, at scene construction, and never in the simulation loop
+        if isinstance(value, Vector):
+            return cls(float(value.x), float(value.y))
+        if isinstance(value, (tuple, list)):
+            value = dict(zip(("x", "y"), value))
+        model = VectorModel.model_validate(value, from_attributes=True)
+        return cls(model.x, model.y)
 
     def distance(self, other: "Vector"):
         return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
 
-    def __sub__(self, other):
-        return Vector(x=self.x - other.x, y=self.y - other.y)
+    def dot(self, other: "Vector") -> float:
+        return self.x * other.x + self.y * other.y
 
+    def length(self) -> float:
+        return math.sqrt(self.x * self.x + self.y * self.y)
 
-class Position(Vector):
-    x: int | float  # todo make it only float
-    y: int | float
+    def normalized(self) -> "Vector":
+        length = self.length()
+        if length == 0:
+            return Vector(0.0, 0.0)
+        return Vector(self.x / length, self.y / length)
 
-    def __add__(self, other):
-        if isinstance(other, Velocity):
-            return Position(x=int(self.x + other.x), y=int(self.y + other.y))
-        if isinstance(other, Position):
-            return Position(x=int(self.x + other.x), y=int(self.y + other.y))
+    def scale(self, factor: float):
+        self.x *= factor
+        self.y *= factor
+        return self
+
+    def copy(self):
+        return self.__class__(self.x, self.y)
 
     def to_tuple(self):
         return self.x, self.y
 
-    @field_validator("x", mode="before")
-    def convert_to_int(cls, value):
-        return int(value)
+    def __add__(self, other):
+        return self.__class__(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other):
+        return Vector(self.x - other.x, self.y - other.y)
+
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __mul__(self, factor: float):
+        return self.__class__(self.x * factor, self.y * factor)
+
+    __rmul__ = __mul__
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __eq__(self, other):
+        if not isinstance(other, Vector):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
 
-    @field_validator("y", mode="before")
-    def convert_to_int_2(cls, value):
-        return int(value)
+    def __repr__(self):
+        return f"{self.__class__.__name__}(x={self.x}, y={self.y})"
+
+
+class Position(Vector):
+    __slots__ = ()
 
 
 class Velocity(Vector):
-    x: int | float
-    y: int | float
+    __slots__ = ()
 
-    @field_validator("x", mode="before")
-    def convert_to_int(cls, value):
-        return int(value)
 
-    @field_validator("y", mode="before")
-    def convert_to_int_2(cls, value):
-        return int(value)
+class VectorModel(BaseModel):
+    x: float
+    y: float
@@ -0,0 +1,242 @@
+import math
+import os
+
+import numpy as np
+
+from bootstrap import BOUNCE_DAMPENING, GRAVITY
+from sweep import MAX_IMPACTS
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Scalar kernels for WorldBatch, one scene and one ball at a time like the per-object code, but written
+# for Numba: only floats, ints and arrays. Without Numba they still run as plain Python, far too slow
+# for real work but enough to check them against the array code.
+
+# numpy steps with the array code in WorldBatch, numba with the compiled kernels below and python with
+# the same kernels uncompiled
+BACKENDS = ("numpy", "numba", "python")
+# Overrides the backend picked at startup
+BACKEND_VARIABLE = "BOUNCING_BALLS_KERNELS"
+
+
+def available_backends() -> list[str]:
+    return [backend for backend in BACKENDS if backend != "numba" or numba is not None]
+
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == "numba" and numba is None:
+        raise ValueError("The numba kernel backend needs Numba, pip install numba")
+    return backend
+
+
+def default_backend() -> str:
+    """The backend named by BOUNCING_BALLS_KERNELS, otherwise numba when it is installed and numpy if not"""
+    chosen = os.environ.get(BACKEND_VARIABLE)
+    if chosen:
+        return check_backend(chosen)
+    return "numba" if numba is not None else "numpy"
+
+
+def _compiled(function):
+    # Compiled code can only call compiled functions, the helpers below are compiled whenever Numba is there
+    return numba.njit(cache=True)(function) if numba is not None else function
+
+
+@_compiled
+def _entry_time(ox: float, oy: float, dx: float, dy: float, reach: float) -> float:
+    # sweep.entry_time for one offset
+    a = dx * dx + dy * dy
+    b = ox * dx + oy * dy
+    c = ox * ox + oy * oy - reach * reach
+    if b >= 0:
+        return math.inf
+    if c <= 0:
+        return 0.0
+    discriminant = b * b - a * c
+    if discriminant < 0:
+        return math.inf
+    root = (-b - math.sqrt(discriminant)) / a
+    return root if root <= 1 else math.inf
+
+
+@_compiled
+def _exit_time(ox: float, oy: float, dx: float, dy: float, reach: float, outer: float) -> float:
+    # sweep.exit_time for one offset
+    a = dx * dx + dy * dy
+    b = ox * dx + oy * dy
+    distance_squared = ox * ox + oy * oy
+    c = distance_squared - reach * reach
+    within = distance_squared <= outer * outer
+    time = 0.0 if c >= 0 and within and b > 0 else math.inf
+    discriminant = b * b - a * c
+    if a > 0 and discriminant >= 0 and (c < 0 or (within and b <= 0)):
+        root = (-b + math.sqrt(discriminant)) / a
+        time = root if root <= 1 else math.inf
+    return time
+
+
+@_compiled
+def _unit(x: float, y: float) -> tuple[float, float]:
+    length = math.hypot(x, y)
+    if length == 0:
+        return 0.0, -1.0
+    return x / length, y / length
+
+
+@_compiled
+def _in_door(angle_degrees: float, door_angle_start: float, door_angle_size: float) -> bool:
+    door_start = door_angle_start % 360
+    door_end = (door_start + door_angle_size) % 360
+    angle = angle_degrees % 360
+    if door_start <= door_end:
+        return door_start <= angle <= door_end
+    return angle >= door_start or angle <= door_end
+
+
+@_compiled
+def _door_impact(
+    ox: float,
+    oy: float,
+    dx: float,
+    dy: float,
+    radius: float,
+    ring_radius: float,
+    thickness: float,
+    door_start: float,
+    door_size: float,
+) -> tuple[float, float, float, bool]:
+    # CircleBoundaryWithDoor.time_of_impact_many for one ball, with whether it reaches the opening first
+    time = _exit_time(ox, oy, dx, dy, ring_radius - radius, ring_radius)
+    touch = time if math.isfinite(time) else 0.0
+    cx, cy = ox + touch * dx, oy + touch * dy
+    escape_time = math.inf
+    if math.isfinite(time) and _in_door(360 - math.degrees(math.atan2(cy, cx)) % 360, door_start, door_size):
+        escape_time, time = time, math.inf
+    nx, ny = _unit(cx, cy)
+
+    middle = ring_radius - thickness / 2
+    for angle in (door_start, door_start + door_size):
+        radians = math.radians(angle)
+        ex, ey = ox - middle * math.cos(radians), oy + middle * math.sin(radians)
+        edge_time = _entry_time(ex, ey, dx, dy, radius + thickness / 2)
+        if edge_time < time:
+            time = edge_time
+            nx, ny = _unit(ex + edge_time * dx, ey + edge_time * dy)
+    return time, nx, ny, escape_time < time
+
+
+@_compiled
+def _collide_scene(positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float):
+    # World._collide for one scene, every ball only in its earliest contact of the step
+    balls = len(radii)
+    pairs = balls * (balls - 1) // 2
+    first = np.empty(pairs, dtype=np.int64)
+    second = np.empty(pairs, dtype=np.int64)
+    times = np.empty(pairs)
+    count = 0
+    for i in range(balls):
+        for j in range(i + 1, balls):
+            time = _entry_time(
+                positions[i, 0] - positions[j, 0],
+                positions[i, 1] - positions[j, 1],
+                (velocities[i, 0] - velocities[j, 0]) * dt,
+                (velocities[i, 1] - velocities[j, 1]) * dt,
+                radii[i] + radii[j],
+            )
+            if math.isfinite(time):
+                first[count], second[count], times[count] = i, j, time
+                count += 1
+    order = np.argsort(times[:count], kind="mergesort")
+    seen = np.zeros(balls, dtype=np.bool_)
+    for k in order:
+        i, j, time = first[k], second[k], times[k]
+        earliest = not seen[i] and not seen[j]
+        seen[i] = seen[j] = True
+        if not earliest:
+            continue
+        # The contacts taken are disjoint, so applying them one by one is the same as all at once
+        dvx, dvy = velocities[i, 0] - velocities[j, 0], velocities[i, 1] - velocities[j, 1]
+        px = positions[i, 0] - positions[j, 0] + time * dvx * dt
+        py = positions[i, 1] - positions[j, 1] + time * dvy * dt
+        distance_squared = px * px + py * py
+        approach = dvx * px + dvy * py
+        if distance_squared > 0 and approach < 0:
+            scale = approach / distance_squared
+            velocities[i, 0] -= scale * px
+            velocities[i, 1] -= scale * py
+            velocities[j, 0] += scale * px
+            velocities[j, 1] += scale * py
+
+
+def _step_scenes(
+    index: np.ndarray,
+    positions: np.ndarray,
+    velocities: np.ndarray,
+    radii: np.ndarray,
+    previous_positions: np.ndarray,
+    bounce_counts: np.ndarray,
+    centers: np.ndarray,
+    ring_radii: np.ndarray,
+    thickness: np.ndarray,
+    door_angle_start: np.ndarray,
+    door_angle_size: np.ndarray,
+    rotation_speed: np.ndarray,
+    dt: np.ndarray,
+    escaped: np.ndarray,
+    steps: np.ndarray,
+    kicks: np.ndarray,
+):
+    """WorldBatch.step for the scenes in index, in place, kicks[impact, n, ball] is the random kick of the
+    ball's impact-th bounce within the step in the n-th scene of index"""
+    balls = positions.shape[1]
+    for n in range(len(index)):
+        scene = index[n]
+        step = dt[scene]
+        previous_positions[scene] = positions[scene]
+        for ball in range(balls):
+            velocities[scene, ball, 1] += GRAVITY * step
+        _collide_scene(positions[scene], velocities[scene], radii[scene], step)
+
+        for ball in range(balls):
+            remaining = step
+            for impact in range(MAX_IMPACTS):
+                vx, vy = velocities[scene, ball, 0], velocities[scene, ball, 1]
+                time, nx, ny, escaping = _door_impact(
+                    positions[scene, ball, 0] - centers[scene, 0],
+                    positions[scene, ball, 1] - centers[scene, 1],
+                    vx * remaining,
+                    vy * remaining,
+                    radii[scene, ball],
+                    ring_radii[scene],
+                    thickness[scene],
+                    door_angle_start[scene],
+                    door_angle_size[scene],
+                )
+                if escaping:
+                    escaped[scene] = True
+                hit = math.isfinite(time)
+                moved = (time if hit else 1.0) * remaining
+                positions[scene, ball, 0] += vx * moved
+                positions[scene, ball, 1] += vy * moved
+                remaining -= moved
+                if not hit:
+                    break
+                # World._reflect
+                dot_product = vx * nx + vy * ny
+                vx = (vx - 2 * dot_product * nx) * BOUNCE_DAMPENING + kicks[impact, n, ball, 0]
+                vy = (vy - 2 * dot_product * ny) * BOUNCE_DAMPENING + kicks[impact, n, ball, 1]
+                velocities[scene, ball, 0], velocities[scene, ball, 1] = vx, vy
+                bounce_counts[scene, ball] += 1
+
+        door_angle_start[scene] = (door_angle_start[scene] - rotation_speed[scene] * step) % 360
+        steps[scene] += 1
+
+
+# The python backend runs this uncompiled, with the compiled helpers when Numba is there
+step_scenes_python = _step_scenes
+step_scenes = _compiled(_step_scenes) if numba is not None else None
@@ -0,0 +1,189 @@
+import struct
+
+import numpy as np
+
+from helpers import Position, Velocity
+
+MAGIC = b"BBSN"
+VERSION = 4
+RNG_PYTHON = 0
+RNG_NUMPY = 1
+
+# magic, version, rng kind, frame count, step count, accumulator, object count, boundary count
+_HEADER = struct.Struct("<4sHHqqdII")
+_PYTHON_GAUSS = struct.Struct("<?d")
+_NUMPY_TAIL = struct.Struct("<II")
+
+
+def _pack_rng(rng) -> tuple[int, bytes]:
+    if isinstance(rng, np.random.Generator):
+        state = rng.bit_generator.state
+        if state["bit_generator"] != "PCG64":
+            raise ValueError(f"Unsupported bit generator {state['bit_generator']}")
+        return RNG_NUMPY, (
+            state["state"]["state"].to_bytes(16, "little")
+            + state["state"]["inc"].to_bytes(16, "little")
+            + _NUMPY_TAIL.pack(state["has_uint32"], state["uinteger"])
+        )
+    version, internal, gauss = rng.getstate()
+    return RNG_PYTHON, np.array(internal, dtype=np.uint32).tobytes() + _PYTHON_GAUSS.pack(
+        gauss is not None, gauss or 0.0
+    )
+
+
+def _unpack_rng(rng, kind: int, data: memoryview):
+    if kind == RNG_NUMPY:
+        has_uint32, uinteger = _NUMPY_TAIL.unpack(data[32:])
+        rng.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": int.from_bytes(data[:16], "little"), "inc": int.from_bytes(data[16:32], "little")},
+            "has_uint32": has_uint32,
+            "uinteger": uinteger,
+        }
+    else:
+        internal = tuple(int(value) for value in np.frombuffer(data[: -_PYTHON_GAUSS.size], dtype=np.uint32))
+        has_gauss, gauss = _PYTHON_GAUSS.unpack(data[-_PYTHON_GAUSS.size :])
+        rng.setstate((3, internal, gauss if has_gauss else None))
+
+
+def _object_state(anim) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    if anim.world is not None:
+        world = anim.world
+        return world.positions, world.velocities, world.bounce_counts, world.rotations, world.rest_times
+    positions = np.array([obj.position.to_tuple() for obj in anim.objects], dtype=np.float64).reshape(-1, 2)
+    velocities = np.array([obj.velocity.to_tuple() for obj in anim.objects], dtype=np.float64).reshape(-1, 2)
+    bounce_counts = np.array([obj.bounce_count for obj in anim.objects], dtype=np.int64)
+    rotations = np.array([getattr(obj, "rotation", 0.0) for obj in anim.objects], dtype=np.float64)
+    rest_times = np.array([getattr(obj, "rest_time", 0.0) for obj in anim.objects], dtype=np.float64)
+    return positions, velocities, bounce_counts, rotations, rest_times
+
+
+def _solver_state(anim) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    solver = getattr(anim, "solver", None)
+    if solver is None:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.intp),
+        )
+    return solver.keys, solver.impulses, solver.separated, solver.crowded
+
+
+def _pack_indices(values: np.ndarray) -> bytes:
+    return struct.pack("<I", len(values)) + np.ascontiguousarray(values, dtype="<i8").tobytes()
+
+
+def _unpack_indices(view: memoryview, offset: int) -> tuple[np.ndarray, int]:
+    (count,) = struct.unpack_from("<I", view, offset)
+    values = np.frombuffer(view, dtype="<i8", count=count, offset=offset + 4).astype(np.int64)
+    return values, offset + 4 + values.nbytes
+
+
+def dump(anim) -> bytes:
+    """Binary snapshot of everything that changes while an AnimationManger runs"""
+    rng = anim.world.rng if anim.world is not None else anim.rng
+    rng_kind, rng_state = _pack_rng(rng)
+    positions, velocities, bounce_counts, rotations, rest_times = _object_state(anim)
+
+    parts = [
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            rng_kind,
+            anim.frame_count,
+            anim.step_count,
+            anim._accumulator,
+            len(anim.objects),
+            len(anim.boundaries),
+        ),
+        np.ascontiguousarray(positions, dtype="<f8").tobytes(),
+        np.ascontiguousarray(velocities, dtype="<f8").tobytes(),
+        np.ascontiguousarray(bounce_counts, dtype="<i8").tobytes(),
+        np.ascontiguousarray(rotations, dtype="<f8").tobytes(),
+        np.ascontiguousarray(rest_times, dtype="<f8").tobytes(),
+    ]
+    for boundary in anim.boundaries:
+        state = boundary.get_state()
+        parts.append(struct.pack(f"<I{len(state)}d", len(state), *state))
+    # Warm start impulses of the contact solver, so a restored run solves its contacts exactly like the original
+    keys, impulses, separated, crowded = _solver_state(anim)
+    parts.append(struct.pack("<I", len(keys)))
+    parts.append(np.ascontiguousarray(keys, dtype="<i8").tobytes())
+    parts.append(np.ascontiguousarray(impulses, dtype="<f8").tobytes())
+    # Pairs kept from bouncing and balls kept awake in the next step by the positional correction of the last one
+    parts.append(_pack_indices(separated))
+    parts.append(_pack_indices(crowded))
+    parts.append(rng_state)
+    return b"".join(parts)
+
+
+def load(anim, data: bytes):
+    """Restores a snapshot into a scene built the same way as the one it was taken from"""
+    view = memoryview(data)
+    header = _HEADER.unpack_from(view)
+    magic, version, rng_kind, frame_count, step_count, accumulator, object_count, boundary_count = header
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a snapshot or written by an incompatible version")
+    if object_count != len(anim.objects) or boundary_count != len(anim.boundaries):
+        raise ValueError("Snapshot was taken from a different scene")
+
+    offset = _HEADER.size
+    arrays = []
+    layout = (
+        ("<f8", (object_count, 2)),
+        ("<f8", (object_count, 2)),
+        ("<i8", (object_count,)),
+        ("<f8", (object_count,)),
+        ("<f8", (object_count,)),
+    )
+    for dtype, shape in layout:
+        array = np.frombuffer(view, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        offset += array.nbytes
+        arrays.append(array)
+    positions, velocities, bounce_counts, rotations, rest_times = arrays
+
+    for boundary in anim.boundaries:
+        (count,) = struct.unpack_from("<I", view, offset)
+        boundary.set_state(struct.unpack_from(f"<{count}d", view, offset + 4))
+        offset += 4 + 8 * count
+
+    (contact_count,) = struct.unpack_from("<I", view, offset)
+    offset += 4
+    keys = np.frombuffer(view, dtype="<i8", count=contact_count, offset=offset).astype(np.int64)
+    offset += keys.nbytes
+    impulses = np.frombuffer(view, dtype="<f8", count=contact_count, offset=offset).astype(np.float64)
+    offset += impulses.nbytes
+    separated, offset = _unpack_indices(view, offset)
+    crowded, offset = _unpack_indices(view, offset)
+    solver = getattr(anim, "solver", None)
+    if solver is not None:
+        solver.count = object_count
+        solver.keys, solver.impulses = keys, impulses
+        solver.separated, solver.crowded = separated, crowded.astype(np.intp)
+
+    if anim.world is not None:
+        anim.world.positions[:] = positions
+        anim.world.previous_positions[:] = positions
+        anim.world.velocities[:] = velocities
+        anim.world.bounce_counts[:] = bounce_counts
+        anim.world.rotations[:] = rotations
+        anim.world.rest_times[:] = rest_times
+        _unpack_rng(anim.world.rng, rng_kind, view[offset:])
+    else:
+        for obj, position, velocity, bounce_count, rotation, rest_time in zip(
+            anim.objects, positions, velocities, bounce_counts, rotations, rest_times
+        ):
+            obj.position = Position(*position.tolist())
+            obj.velocity = Velocity(*velocity.tolist())
+            obj.bounce_count = int(bounce_count)
+            obj.rotation = float(rotation)
+            obj.rest_time = float(rest_time)
+        anim._previous_positions = []
+        _unpack_rng(anim.rng, rng_kind, view[offset:])
+
+    if anim.trails is not None:
+        anim.trails.clear()
+    anim.frame_count = frame_count
+    anim.step_count = step_count
+    anim._accumulator = accumulator
@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+
+from helpers import Vector
+
+# Bounces handled for one ball within a single step before the rest of its step is dropped
+MAX_IMPACTS = 4
+
+# Swept circle tests. A circle moving by a displacement over one step is reduced to its center point
+# moving against a shape grown by the circle's radius. Times are fractions of the step, inf for no contact.
+
+
+def entry_time(offsets: np.ndarray, displacements: np.ndarray, reach: np.ndarray | float) -> np.ndarray:
+    """First time the distance |offset + t * displacement| drops to reach, 0 when already within and approaching"""
+    a = np.einsum("ij,ij->i", displacements, displacements)
+    b = np.einsum("ij,ij->i", offsets, displacements)
+    c = np.einsum("ij,ij->i", offsets, offsets) - reach * reach
+    times = np.full(len(offsets), np.inf)
+    times[(c <= 0) & (b < 0)] = 0.0
+
+    discriminant = b * b - a * c
+    hit = (c > 0) & (b < 0) & (discriminant >= 0)
+    roots = (-b[hit] - np.sqrt(discriminant[hit])) / a[hit]
+    times[hit] = np.where(roots <= 1, roots, np.inf)
+    return times
+
+
+def exit_time(offsets: np.ndarray, displacements: np.ndarray, reach: np.ndarray | float, outer: float) -> np.ndarray:
+    """First time the distance |offset + t * displacement| grows to reach, coming from inside
+
+    Points already between reach and outer and still moving out are in contact right away, points beyond
+    outer are on the other side of the wall and never touch it.
+    """
+    a = np.einsum("ij,ij->i", displacements, displacements)
+    b = np.einsum("ij,ij->i", offsets, displacements)
+    distance_squared = np.einsum("ij,ij->i", offsets, offsets)
+    c = distance_squared - reach * reach
+    within = distance_squared <= outer * outer
+    times = np.full(len(offsets), np.inf)
+    times[(c >= 0) & within & (b > 0)] = 0.0
+
+    # Points on or just past reach moving inwards, like a ball that has just bounced, leave on the far side
+    discriminant = b * b - a * c
+    hit = (a > 0) & (discriminant >= 0) & ((c < 0) | (within & (b <= 0)))
+    roots = (-b[hit] + np.sqrt(discriminant[hit])) / a[hit]
+    times[hit] = np.where(roots <= 1, roots, np.inf)
+    return times
+
+
+def segment_entry_time(
+    positions: np.ndarray, displacements: np.ndarray, starts: np.ndarray, ends: np.ndarray, reach: np.ndarray | float
+) -> np.ndarray:
+    """entry_time against segments grown by reach into capsules, one segment per point"""
+    times = np.minimum(
+        entry_time(positions - starts, displacements, reach), entry_time(positions - ends, displacements, reach)
+    )
+    # The straight sides, segments of zero length are only their round caps
+    edges = ends - starts
+    length_squared = np.einsum("ij,ij->i", edges, edges)
+    long = length_squared > 0
+    length = np.sqrt(np.where(long, length_squared, 1.0))
+    normals = np.column_stack([-edges[:, 1], edges[:, 0]]) / length[:, None]
+    distance = np.einsum("ij,ij->i", positions - starts, normals)
+    side = np.where(distance < 0, -1.0, 1.0)
+    gap = side * distance - reach
+    closing = -side * np.einsum("ij,ij->i", displacements, normals)
+    approaching = long & (closing > 0)
+    side_times = np.where(gap > 0, gap / np.where(approaching, closing, 1.0), 0.0)
+    along = np.einsum("ij,ij->i", positions + side_times[:, None] * displacements - starts, edges) / length**2
+    hit = approaching & (side_times <= 1) & (along >= 0) & (along <= 1)
+    times[hit] = np.minimum(times[hit], side_times[hit])
+    return times
+
+
+def nearest_points(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # Closest point on each segment to each point
+    edges = ends - starts
+    length_squared = np.einsum("ij,ij->i", edges, edges)
+    along = np.einsum("ij,ij->i", points - starts, edges) / np.where(length_squared > 0, length_squared, 1.0)
+    return starts + np.clip(along, 0.0, 1.0)[:, None] * edges
+
+
+def swept_bounds(
+    positions: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float
+) -> tuple[np.ndarray, np.ndarray]:
+    # Smallest circles around the path of each circle over the step, for the broad phase
+    displacements = velocities * dt
+    return positions + displacements / 2, radii + np.hypot(displacements[:, 0], displacements[:, 1]) / 2
+
+
+def contact_points(offsets: np.ndarray, displacements: np.ndarray, times: np.ndarray) -> np.ndarray:
+    # Where each point is at its time of contact, or where it starts when there is none
+    return offsets + np.where(np.isfinite(times), times, 0.0)[:, None] * displacements
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    length = np.hypot(vectors[:, 0], vectors[:, 1])
+    units = np.empty_like(vectors)
+    np.divide(vectors, length[:, None], out=units, where=length[:, None] > 0)
+    units[length == 0] = 0, -1  # Default normal if at center
+    return units
+
+
+def first_contact(offset: Vector, velocity: Vector, reach: float, dt: float) -> float | None:
+    """Scalar entry_time for one pair, velocity in pixels per tick over dt ticks, None for no contact"""
+    b = offset.dot(velocity)
+    if b >= 0:
+        return None
+    c = offset.dot(offset) - reach * reach
+    if c <= 0:
+        return 0.0
+    a = velocity.dot(velocity) * dt * dt
+    discriminant = b * b * dt * dt - a * c
+    if a == 0 or discriminant < 0:
+        return None
+    time = (-b * dt - math.sqrt(discriminant)) / a
+    return time if time <= 1 else None
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# The modules in src import each other by their plain names, like when they are run from there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
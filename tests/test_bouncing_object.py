@@ -0,0 +1,53 @@
+import numpy as np
+
+from BouncingObject import BouncingCircle
+from helpers import Position, Velocity
+from World import World
+
+
+def attached(count: int = 1) -> tuple[World, list[BouncingCircle]]:
+    world = World(capacity=1)
+    balls = [BouncingCircle(None, 5, (10.0 * n, 20.0), (1.0, 2.0)) for n in range(count)]
+    for ball in balls:
+        world.add_object(ball)
+    return world, balls
+
+
+def test_component_edits_reach_the_world():
+    world, (ball, other) = attached(2)
+    ball.velocity.x += 5
+    ball.position.y -= 1
+    other.velocity.scale(2)
+    np.testing.assert_array_equal(world.velocities, [[6.0, 2.0], [2.0, 4.0]])
+    np.testing.assert_array_equal(world.positions, [[0.0, 19.0], [10.0, 20.0]])
+    assert ball.velocity == Velocity(6.0, 2.0)
+
+
+def test_collide_and_update_change_the_world():
+    world, (ball, other) = attached(2)
+    ball.position = Position(0.0, 0.0)
+    other.position = Position(8.0, 0.0)
+    ball.velocity, other.velocity = Velocity(1.0, 0.0), Velocity(-1.0, 0.0)
+    ball.collide(other)
+    # Equal balls meeting head on swap their velocities
+    np.testing.assert_allclose(world.velocities, [[-1.0, 0.0], [1.0, 0.0]])
+
+    ball.update([], [])
+    assert world.velocities[0, 1] > 0.0
+
+
+def test_views_survive_the_world_growing():
+    world, (ball,) = attached()
+    velocity = ball.velocity
+    world.add_object(BouncingCircle(None, 5, (0.0, 0.0), (0.0, 0.0)))
+    velocity.y = 7.0
+    assert world.velocities[0, 1] == 7.0
+
+
+def test_arithmetic_gives_plain_vectors():
+    world, (ball,) = attached()
+    moved = ball.position + Position(1.0, 1.0)
+    copied = ball.velocity.copy()
+    copied.x = 100.0
+    assert type(moved) is Position and type(copied) is Velocity
+    assert world.velocities[0, 0] == 1.0
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from SharedState import SharedStateReader, SharedStateWriter
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, timeout=60)
+
+
+def test_reader_in_the_writers_process():
+    # The resource tracker reports problems with the registrations on stderr when the process exits
+    result = run_python("""
+import numpy as np
+from SharedState import SharedStateReader, SharedStateWriter
+writer = SharedStateWriter(pixels=False)
+writer.publish(1, 1, np.ones((3, 2)), np.zeros((3, 2)), [(1.0, 2.0)])
+reader = SharedStateReader(writer.name)
+assert reader.read().frame == 1
+reader.close()
+writer.close()
+""")
+    assert result.returncode == 0, result.stderr
+    assert "KeyError" not in result.stderr and "leaked" not in result.stderr, result.stderr
+
+
+def test_reader_in_another_process_leaves_the_block_alone():
+    writer = SharedStateWriter(pixels=False)
+    try:
+        writer.publish(1, 1, np.ones((3, 2)), np.zeros((3, 2)), [(1.0, 2.0)])
+        result = run_python(f"""
+from SharedState import SharedStateReader
+reader = SharedStateReader({writer.name!r})
+assert reader.read().frame == 1
+reader.close()
+""")
+        assert result.returncode == 0, result.stderr
+        # Still there after the reader's process exited
+        reader = SharedStateReader(writer.name)
+        np.testing.assert_array_equal(reader.read().positions, np.ones((3, 2)))
+        reader.close()
+    finally:
+        writer.close()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from Animation import AnimationManger
+from bootstrap import BOUNDARY_COLOR
+from BouncingObject import BouncingCircle
+from CircleBoundary import CircleBoundary
+from ContactSolver import ContactSolver
+
+
+def scene(use_world: bool, keyframe_interval: int = 0) -> AnimationManger:
+    anim = AnimationManger(
+        headless=True,
+        use_world=use_world,
+        seed=1,
+        solver=ContactSolver(),
+        keyframe_interval=keyframe_interval,
+    )
+    anim.add_boundary(CircleBoundary(center=(400, 300), radius=200, color=BOUNDARY_COLOR, thicnkess=6))
+    rng = np.random.default_rng(0)
+    distance = 150 * np.sqrt(rng.uniform(0, 1, 40))
+    angle = rng.uniform(0, 2 * np.pi, 40)
+    for x, y, vx, vy in zip(
+        400 + distance * np.cos(angle), 300 + distance * np.sin(angle), *rng.uniform(-3, 3, (2, 40))
+    ):
+        anim.add_object(BouncingCircle(None, 5, (x, y), (vx, vy)))
+    return anim
+
+
+@pytest.mark.parametrize("use_world", [True, False])
+def test_restore_with_solver_matches_uninterrupted_run(use_world):
+    anim = scene(use_world)
+    anim.seek(50)
+    snapshot = anim.snapshot()
+    anim.seek(150)
+    expected = anim.object_positions().copy()
+
+    # Restored into the same manager, whose broad phase has since seen other frames, and into a new one
+    anim.restore(snapshot)
+    anim.seek(150)
+    np.testing.assert_array_equal(anim.object_positions(), expected)
+    restored = scene(use_world)
+    restored.restore(snapshot)
+    restored.seek(150)
+    np.testing.assert_array_equal(restored.object_positions(), expected)
+
+
+@pytest.mark.parametrize("use_world", [True, False])
+def test_seek_back_with_solver_matches_uninterrupted_run(use_world):
+    anim = scene(use_world, keyframe_interval=50)
+    anim.seek(150)
+    expected = anim.object_positions().copy()
+    anim.seek(70)
+    anim.seek(150)
+    np.testing.assert_array_equal(anim.object_positions(), expected)